@@ -0,0 +1,73 @@
+"""
+Alembic migration environment for the models in app/models.py
+
+The database URL is the application's DATABASE_URL, so migrations always run
+against the same database as the API.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import engine, Base
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+
+# The API runs migrations in-process (DB_SCHEMA_MODE=migrate) with its own logging setup
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Leave the notes full-text index structures (not part of the models) out of autogenerate
+    """
+    if type_ == "table" and name.startswith("consultations_fts"):
+        return False
+    if type_ == "column" and name == "notes_tsv":
+        return False
+    if type_ == "index" and name == "ix_consultations_notes_tsv":
+        return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit SQL for the migrations without connecting (alembic upgrade head --sql)
+    """
+    context.configure(
+        url=engine.url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=engine.dialect.name == "sqlite",
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    Run the migrations on a connection from the application's engine
+    """
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot ALTER most constraints; batch mode rebuilds the table instead
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_object=include_object,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
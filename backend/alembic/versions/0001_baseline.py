@@ -0,0 +1,98 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+Tables as created by Base.metadata.create_all before migrations were
+introduced. Tables that already exist are left alone, so databases created by
+create_all are adopted by running `alembic upgrade head` (no stamping needed).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _missing(table_name: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def upgrade() -> None:
+    if _missing('doctors'):
+        op.create_table(
+            'doctors',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=50), nullable=False),
+            sa.Column('email', sa.String(length=255), nullable=False),
+            sa.Column('full_name', sa.String(length=255), nullable=False),
+            sa.Column('hashed_password', sa.String(length=255), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_doctors_id', 'doctors', ['id'])
+        op.create_index('ix_doctors_username', 'doctors', ['username'], unique=True)
+        op.create_index('ix_doctors_email', 'doctors', ['email'], unique=True)
+
+    if _missing('diagnosis_codes'):
+        op.create_table(
+            'diagnosis_codes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(length=10), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_diagnosis_codes_id', 'diagnosis_codes', ['id'])
+        op.create_index('ix_diagnosis_codes_code', 'diagnosis_codes', ['code'], unique=True)
+
+    if _missing('consultations'):
+        op.create_table(
+            'consultations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('patient_name', sa.String(length=255), nullable=False),
+            sa.Column('consultation_date', sa.DateTime(), nullable=False),
+            sa.Column('notes', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_consultations_id', 'consultations', ['id'])
+
+    if _missing('consultation_diagnoses'):
+        op.create_table(
+            'consultation_diagnoses',
+            sa.Column('consultation_id', sa.Integer(), nullable=True),
+            sa.Column('diagnosis_code_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['consultation_id'], ['consultations.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['diagnosis_code_id'], ['diagnosis_codes.id'], ondelete='CASCADE')
+        )
+
+    if _missing('catalog_state'):
+        op.create_table(
+            'catalog_state',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('revision', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_state')
+    op.drop_table('consultation_diagnoses')
+    op.drop_index('ix_consultations_id', table_name='consultations')
+    op.drop_table('consultations')
+    op.drop_index('ix_diagnosis_codes_code', table_name='diagnosis_codes')
+    op.drop_index('ix_diagnosis_codes_id', table_name='diagnosis_codes')
+    op.drop_table('diagnosis_codes')
+    op.drop_index('ix_doctors_email', table_name='doctors')
+    op.drop_index('ix_doctors_username', table_name='doctors')
+    op.drop_index('ix_doctors_id', table_name='doctors')
+    op.drop_table('doctors')
@@ -0,0 +1,44 @@
+"""consultation date and patient name indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+- ix_consultations_date_id: newest-first listing, keyset pagination and date ranges
+- ix_consultations_patient_name_lower_date: case-insensitive patient name prefix
+  filters (text_pattern_ops on PostgreSQL, see crud.consultation_filter_conditions)
+
+On PostgreSQL the indexes are built CONCURRENTLY, so writes are not blocked.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    name_key = 'lower(patient_name) text_pattern_ops' if is_postgresql else 'lower(patient_name)'
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_consultations_date_id', 'consultations', ['consultation_date', 'id'],
+            if_not_exists=True, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_consultations_patient_name_lower_date', 'consultations',
+            [sa.text(name_key), 'consultation_date'],
+            if_not_exists=True, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_consultations_patient_name_lower_date', table_name='consultations', if_exists=True)
+    op.drop_index('ix_consultations_date_id', table_name='consultations', if_exists=True)
@@ -0,0 +1,75 @@
+"""consultation notes full-text index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+SQLite: FTS5 table plus sync triggers, filled from the existing notes.
+PostgreSQL: GIN index on to_tsvector(notes), built CONCURRENTLY.
+The DDL is the one app/fulltext.py used at this revision.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLE = 'consultations_fts'
+POSTGRES_INDEX = 'ix_consultations_notes_fts'
+
+SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        notes,
+        content='consultations',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF notes ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {POSTGRES_INDEX} ON consultations "
+                "USING gin (to_tsvector('english', notes))"
+            )
+    elif bind.dialect.name == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        # Fill from the existing notes (also correct when create_all already built the table)
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(f"DROP INDEX IF EXISTS {POSTGRES_INDEX}")
+    elif bind.dialect.name == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
@@ -0,0 +1,87 @@
+"""diagnosis usage counts
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:40:00.000000
+
+- diagnosis_usage: all-time consultations per diagnosis code
+- diagnosis_usage_monthly: consultations per diagnosis code per month
+
+Both are filled from the existing consultation_diagnoses rows and then kept
+up to date on consultation insert. See app/diagnosis_usage.py. Tables and
+indexes that create_all already built are kept; the counts are rebuilt either way.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# First day of the consultation's month, per dialect
+MONTH_EXPRESSIONS = {
+    'sqlite': "date(c.consultation_date, 'start of month')",
+    'postgresql': "CAST(date_trunc('month', c.consultation_date) AS DATE)",
+}
+
+
+def _rebuild_usage(month: str) -> None:
+    """
+    Recompute both usage tables from consultation_diagnoses
+    """
+    op.execute("DELETE FROM diagnosis_usage_monthly")
+    op.execute("DELETE FROM diagnosis_usage")
+    op.execute(
+        "INSERT INTO diagnosis_usage (diagnosis_code_id, consultation_count) "
+        "SELECT diagnosis_code_id, count(*) FROM consultation_diagnoses "
+        "WHERE diagnosis_code_id IS NOT NULL GROUP BY diagnosis_code_id"
+    )
+    op.execute(
+        "INSERT INTO diagnosis_usage_monthly (month, diagnosis_code_id, consultation_count) "
+        f"SELECT {month}, cd.diagnosis_code_id, count(*) FROM consultation_diagnoses cd "
+        "JOIN consultations c ON c.id = cd.consultation_id "
+        f"WHERE cd.diagnosis_code_id IS NOT NULL GROUP BY {month}, cd.diagnosis_code_id"
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        'diagnosis_usage',
+        sa.Column('diagnosis_code_id', sa.Integer(), nullable=False),
+        sa.Column('consultation_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['diagnosis_code_id'], ['diagnosis_codes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('diagnosis_code_id'),
+        if_not_exists=True,
+    )
+    op.create_index(
+        'ix_diagnosis_usage_consultation_count', 'diagnosis_usage', ['consultation_count'], if_not_exists=True
+    )
+    op.create_table(
+        'diagnosis_usage_monthly',
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('diagnosis_code_id', sa.Integer(), nullable=False),
+        sa.Column('consultation_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['diagnosis_code_id'], ['diagnosis_codes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('month', 'diagnosis_code_id'),
+        if_not_exists=True,
+    )
+    op.create_index(
+        'ix_diagnosis_usage_monthly_month_count', 'diagnosis_usage_monthly', ['month', 'consultation_count'],
+        if_not_exists=True
+    )
+
+    month = MONTH_EXPRESSIONS.get(op.get_context().dialect.name)
+    if month is not None:
+        _rebuild_usage(month)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_diagnosis_usage_monthly_month_count', table_name='diagnosis_usage_monthly')
+    op.drop_table('diagnosis_usage_monthly')
+    op.drop_index('ix_diagnosis_usage_consultation_count', table_name='diagnosis_usage')
+    op.drop_table('diagnosis_usage')
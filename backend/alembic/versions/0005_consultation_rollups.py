@@ -0,0 +1,177 @@
+"""consultation doctor and daily rollups
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:20:00.000000
+
+- consultations.doctor_id: doctor who recorded the consultation (NULL for existing rows)
+- consultation_daily_stats: consultations per day
+- consultation_daily_doctor_stats: consultations per day per doctor
+- consultation_daily_chapter_stats: consultations and diagnoses per day per ICD-10 chapter
+
+The rollups are filled from the existing consultations and then kept up to
+date on consultation insert. On large databases, create them empty here and
+run `python -m app.analytics backfill` afterwards. See app/analytics.py.
+
+On SQLite the foreign key needs a batch copy of consultations, after which the
+full-text triggers and the lower(patient_name) index are recreated. A column,
+index or table that create_all already built is kept; the rollups are rebuilt
+either way.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLE = 'consultations_fts'
+
+# Full-text sync triggers as created by 0003
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF notes ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+]
+
+# Calendar day of the consultation date, per dialect
+DAY_EXPRESSIONS = {
+    'sqlite': "date(c.consultation_date)",
+    'postgresql': "CAST(c.consultation_date AS DATE)",
+}
+
+# ICD-10-CM chapter ranges at this revision (app/icd10.py); codes in none of them are chapter 0
+CHAPTERS = [
+    (1, 'A00', 'B99'), (2, 'C00', 'D49'), (3, 'D50', 'D89'), (4, 'E00', 'E89'), (5, 'F01', 'F99'),
+    (6, 'G00', 'G99'), (7, 'H00', 'H59'), (8, 'H60', 'H95'), (9, 'I00', 'I99'), (10, 'J00', 'J99'),
+    (11, 'K00', 'K95'), (12, 'L00', 'L99'), (13, 'M00', 'M99'), (14, 'N00', 'N99'), (15, 'O00', 'O9A'),
+    (16, 'P00', 'P96'), (17, 'Q00', 'Q99'), (18, 'R00', 'R99'), (19, 'S00', 'T88'), (22, 'U00', 'U85'),
+    (20, 'V00', 'Y99'), (21, 'Z00', 'Z99'),
+]
+CHAPTER_EXPRESSION = "CASE {} ELSE 0 END".format(" ".join(
+    f"WHEN upper(substr(dc.code, 1, 3)) BETWEEN '{first}' AND '{last}' THEN {number}"
+    for number, first, last in CHAPTERS
+))
+
+
+def _rebuild_rollups(day: str) -> None:
+    """
+    Recompute the three rollup tables from the consultations
+    """
+    for table in ('consultation_daily_chapter_stats', 'consultation_daily_doctor_stats', 'consultation_daily_stats'):
+        op.execute(f"DELETE FROM {table}")
+    op.execute(
+        "INSERT INTO consultation_daily_stats (day, consultation_count) "
+        f"SELECT {day}, count(*) FROM consultations c GROUP BY {day}"
+    )
+    op.execute(
+        "INSERT INTO consultation_daily_doctor_stats (day, doctor_id, consultation_count) "
+        f"SELECT {day}, c.doctor_id, count(*) FROM consultations c "
+        f"WHERE c.doctor_id IS NOT NULL GROUP BY {day}, c.doctor_id"
+    )
+    # One row per consultation and chapter first, so a consultation counts once per chapter
+    op.execute(
+        "INSERT INTO consultation_daily_chapter_stats (day, chapter, consultation_count, diagnosis_count) "
+        "SELECT day, chapter, count(*), sum(diagnoses) FROM ("
+        f"SELECT {day} AS day, {CHAPTER_EXPRESSION} AS chapter, count(*) AS diagnoses "
+        "FROM consultations c "
+        "JOIN consultation_diagnoses cd ON cd.consultation_id = c.id "
+        "JOIN diagnosis_codes dc ON dc.id = cd.diagnosis_code_id "
+        f"GROUP BY c.id, {day}, {CHAPTER_EXPRESSION}"
+        ") per_consultation GROUP BY day, chapter"
+    )
+
+
+def _has_column(table_name: str, column_name: str) -> bool:
+    # Offline (--sql) there is no database to inspect: emit the full upgrade
+    if context.is_offline_mode():
+        return False
+    return column_name in {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+
+
+def _restore_consultation_extras() -> None:
+    """
+    Recreate what a SQLite batch copy of consultations loses: the full-text
+    triggers and the expression index on lower(patient_name)
+
+    The copy keeps the ids, so the notes index contents stay valid.
+    """
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    for statement in FTS_TRIGGERS:
+        op.execute(statement)
+    op.create_index(
+        'ix_consultations_patient_name_lower_date', 'consultations',
+        [sa.text('lower(patient_name)'), 'consultation_date'],
+        if_not_exists=True
+    )
+
+
+def upgrade() -> None:
+    if not _has_column('consultations', 'doctor_id'):
+        with op.batch_alter_table('consultations') as batch_op:
+            batch_op.add_column(sa.Column('doctor_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                'consultations_doctor_id_fkey', 'doctors', ['doctor_id'], ['id'], ondelete='SET NULL'
+            )
+        _restore_consultation_extras()
+    op.create_index('ix_consultations_doctor_id', 'consultations', ['doctor_id'], if_not_exists=True)
+
+    op.create_table(
+        'consultation_daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('consultation_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'consultation_daily_doctor_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('consultation_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('day', 'doctor_id'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'consultation_daily_chapter_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('chapter', sa.Integer(), nullable=False),
+        sa.Column('consultation_count', sa.Integer(), nullable=False),
+        sa.Column('diagnosis_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'chapter'),
+        if_not_exists=True,
+    )
+
+    day = DAY_EXPRESSIONS.get(op.get_context().dialect.name)
+    if day is not None:
+        _rebuild_rollups(day)
+
+
+def downgrade() -> None:
+    op.drop_table('consultation_daily_chapter_stats')
+    op.drop_table('consultation_daily_doctor_stats')
+    op.drop_table('consultation_daily_stats')
+    op.drop_index('ix_consultations_doctor_id', table_name='consultations')
+    with op.batch_alter_table('consultations') as batch_op:
+        batch_op.drop_constraint('consultations_doctor_id_fkey', type_='foreignkey')
+        batch_op.drop_column('doctor_id')
+    _restore_consultation_extras()
@@ -0,0 +1,40 @@
+"""consultation_diagnoses indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 16:30:00.000000
+
+- ix_consultation_diagnoses_consultation_id: loading the codes of a page of
+  consultations (list, detail, export) without scanning the association table
+- ix_consultation_diagnoses_diagnosis_code_id: per-code lookups (usage and
+  rollup rebuilds, ON DELETE CASCADE from diagnosis_codes)
+
+On PostgreSQL the indexes are built CONCURRENTLY, so writes are not blocked.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_consultation_diagnoses_consultation_id', 'consultation_diagnoses', ['consultation_id'],
+            if_not_exists=True, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_consultation_diagnoses_diagnosis_code_id', 'consultation_diagnoses', ['diagnosis_code_id'],
+            if_not_exists=True, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_consultation_diagnoses_diagnosis_code_id', table_name='consultation_diagnoses', if_exists=True)
+    op.drop_index('ix_consultation_diagnoses_consultation_id', table_name='consultation_diagnoses', if_exists=True)
@@ -0,0 +1,48 @@
+"""consultation notes tsvector column
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 18:10:00.000000
+
+PostgreSQL only: a stored generated column notes_tsv = to_tsvector('english',
+notes) with a GIN index, replacing the expression index from 0003. Ranking
+reads the stored vectors instead of recomputing to_tsvector for every match.
+
+Adding a stored generated column rewrites consultations under an exclusive
+lock (PostgreSQL 12+); run it in a maintenance window on large tables. The
+GIN index is built CONCURRENTLY. SQLite keeps its FTS5 table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute(
+        "ALTER TABLE consultations ADD COLUMN IF NOT EXISTS notes_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', notes)) STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_consultations_notes_tsv ON consultations USING gin (notes_tsv)")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_consultations_notes_fts")
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_consultations_notes_fts ON consultations "
+            "USING gin (to_tsvector('english', notes))"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_consultations_notes_tsv")
+    op.execute("ALTER TABLE consultations DROP COLUMN IF EXISTS notes_tsv")
@@ -0,0 +1,94 @@
+"""sharded daily rollups
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 20:30:00.000000
+
+consultation_daily_stats and consultation_daily_chapter_stats get a shard
+column in their primary key. Each inserting transaction adds to one of a few
+rows per day instead of all of them updating the same row, so concurrent
+writers no longer wait on its lock until commit; readers sum the shards.
+Existing rows become shard 0. See app/analytics.py.
+
+On SQLite the primary key change needs a batch copy of both tables (a few
+rows per day). A table that create_all already built with the column is kept.
+The downgrade folds the shards back into one row per key.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sharded rollups: key columns and counter columns
+SHARDED = {
+    'consultation_daily_stats': (['day'], ['consultation_count']),
+    'consultation_daily_chapter_stats': (['day', 'chapter'], ['consultation_count', 'diagnosis_count']),
+}
+COLUMN_TYPES = {
+    'day': sa.Date, 'chapter': sa.Integer, 'shard': sa.SmallInteger,
+    'consultation_count': sa.Integer, 'diagnosis_count': sa.Integer,
+}
+
+
+def _has_column(table_name: str, column_name: str) -> bool:
+    # Offline (--sql) there is no database to inspect: emit the full upgrade
+    if context.is_offline_mode():
+        return False
+    return column_name in {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+
+
+def _batch(table: str, columns: list):
+    # SQLite copies the table; describing it without its primary key lets the
+    # copy be created with just the new one
+    return op.batch_alter_table(table, copy_from=sa.Table(
+        table, sa.MetaData(), *[sa.Column(column, COLUMN_TYPES[column](), nullable=False) for column in columns]
+    ))
+
+
+def _replace_primary_key(batch_op, table: str, columns: list) -> None:
+    if op.get_context().dialect.name != 'sqlite':
+        batch_op.drop_constraint(f'{table}_pkey', type_='primary')
+    batch_op.create_primary_key(f'{table}_pkey', columns)
+
+
+def _fold_shards(table: str, keys: list, counts: list) -> None:
+    """
+    Add every shard into shard 0 and delete the rest
+    """
+    key_list = ", ".join(keys)
+    matches = " AND ".join(f"s.{key} = {table}.{key}" for key in keys)
+    op.execute(
+        f"INSERT INTO {table} ({key_list}, shard, {', '.join(counts)}) "
+        f"SELECT {key_list}, 0, {', '.join('0' for _ in counts)} FROM {table} "
+        f"GROUP BY {key_list} HAVING min(shard) > 0"
+    )
+    op.execute(
+        f"UPDATE {table} SET " + ", ".join(
+            f"{count} = (SELECT sum(s.{count}) FROM {table} s WHERE {matches})" for count in counts
+        ) + " WHERE shard = 0"
+    )
+    op.execute(f"DELETE FROM {table} WHERE shard <> 0")
+
+
+def upgrade() -> None:
+    for table, (keys, counts) in SHARDED.items():
+        if _has_column(table, 'shard'):
+            continue
+        with _batch(table, keys + counts) as batch_op:
+            batch_op.add_column(sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+            _replace_primary_key(batch_op, table, keys + ['shard'])
+
+
+def downgrade() -> None:
+    for table, (keys, counts) in SHARDED.items():
+        _fold_shards(table, keys, counts)
+        with _batch(table, keys + counts + ['shard']) as batch_op:
+            _replace_primary_key(batch_op, table, keys)
+            batch_op.drop_column('shard')
@@ -0,0 +1,280 @@
+"""
+Daily consultation rollups for the analytics endpoints
+
+- consultation_daily_stats: consultations per day
+- consultation_daily_doctor_stats: consultations per day per recording doctor
+- consultation_daily_chapter_stats: consultations and diagnoses per day per ICD-10 chapter
+
+Days are calendar days of the consultation date. The rollups are incremented
+in the same transaction as the consultations they count (like the diagnosis
+usage counts), so analytics queries read a few rows per day instead of
+scanning consultations and consultation_diagnoses.
+
+Every insert of the day touches the same daily rows, and an upsert holds its
+row lock until commit, so on PostgreSQL concurrent writers would queue on them.
+The daily and chapter rollups are therefore sharded: each transaction adds to
+one of ROLLUP_SHARDS rows per key, chosen at random, and readers sum the
+shards. The doctor rollup is keyed by the recording doctor and left unsharded.
+
+The backfill recomputes a date range from the base tables, one chunk of days
+per transaction, so it can run over tens of millions of consultations:
+
+    python -m app.analytics backfill
+    python -m app.analytics backfill --from 2024-01-01 --to 2024-02-01
+
+The backfill writes one row per key (shard 0), folding the shards back
+together. Consultations written into a chunk while it is being rebuilt may be
+counted twice or not at all; backfill that range again once writes have settled.
+
+Configuration:
+- ROLLUP_SHARDS: rows per day (and per day and chapter) spreading concurrent increments (default 8)
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+import argparse
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import Date, cast, delete, func, insert, literal, select
+from sqlalchemy.engine import Connection, Engine
+
+from . import icd10, models
+from .database import engine
+from .diagnosis_usage import increment_upsert, is_supported
+
+load_dotenv()
+
+DEFAULT_CHUNK_DAYS = 31
+ROLLUP_SHARDS = max(1, int(os.getenv("ROLLUP_SHARDS", "8")))
+
+# (consultation date, recording doctor id, diagnosis codes) for one consultation
+RollupItem = Tuple[datetime, Optional[int], Iterable[str]]
+
+
+class RollupIncrements:
+    """
+    Rollup counts of consultations not yet added to the rollup tables
+
+    Bulk loaders add batch after batch and write the totals once.
+    """
+
+    def __init__(self):
+        self.daily: Counter = Counter()
+        self.doctors: Counter = Counter()
+        self.chapter_consultations: Counter = Counter()
+        self.chapter_diagnoses: Counter = Counter()
+
+    def add(self, items: Iterable[RollupItem]) -> None:
+        daily = self.daily
+        doctors = self.doctors
+        chapter_consultations = self.chapter_consultations
+        chapter_diagnoses = self.chapter_diagnoses
+        for consultation_date, doctor_id, codes in items:
+            day = consultation_date.date()
+            daily[day] += 1
+            if doctor_id is not None:
+                doctors[(day, doctor_id)] += 1
+            chapters: Dict[int, int] = {}
+            for code in codes:
+                chapter = icd10.chapter_for_code(code)
+                chapters[chapter] = chapters.get(chapter, 0) + 1
+            for chapter, count in chapters.items():
+                chapter_consultations[(day, chapter)] += 1
+                chapter_diagnoses[(day, chapter)] += count
+
+    def statements(self, dialect_name: str, shard: Optional[int] = None) -> List[Tuple[object, List[dict]]]:
+        """
+        Upsert statements and parameters adding the counts to the daily rollups
+
+        The daily and chapter counts go to one shard, random unless given. Keys
+        are sorted so concurrent writers lock rows in the same order. Returns an
+        empty list on databases without ON CONFLICT support.
+        """
+        if not is_supported(dialect_name) or not self.daily:
+            return []
+        if shard is None:
+            shard = random.randrange(ROLLUP_SHARDS)
+
+        statements = [(
+            increment_upsert(dialect_name, models.ConsultationDailyStats.__table__, ["day", "shard"]),
+            [{"day": day, "shard": shard, "consultation_count": count} for day, count in sorted(self.daily.items())]
+        )]
+        if self.doctors:
+            statements.append((
+                increment_upsert(dialect_name, models.ConsultationDailyDoctorStats.__table__, ["day", "doctor_id"]),
+                [
+                    {"day": day, "doctor_id": doctor_id, "consultation_count": count}
+                    for (day, doctor_id), count in sorted(self.doctors.items())
+                ]
+            ))
+        if self.chapter_consultations:
+            statements.append((
+                increment_upsert(
+                    dialect_name, models.ConsultationDailyChapterStats.__table__, ["day", "chapter", "shard"],
+                    count_columns=("consultation_count", "diagnosis_count")
+                ),
+                [
+                    {
+                        "day": day,
+                        "chapter": chapter,
+                        "shard": shard,
+                        "consultation_count": count,
+                        "diagnosis_count": self.chapter_diagnoses[(day, chapter)],
+                    }
+                    for (day, chapter), count in sorted(self.chapter_consultations.items())
+                ]
+            ))
+        return statements
+
+
+def increment_statements(dialect_name: str, items: Iterable[RollupItem]) -> List[Tuple[object, List[dict]]]:
+    """
+    Upsert statements and parameters adding items to the daily rollups
+    """
+    if not is_supported(dialect_name):
+        return []
+    increments = RollupIncrements()
+    increments.add(items)
+    return increments.statements(dialect_name)
+
+
+def record_rollups(connection: Connection, items: Iterable[RollupItem]) -> None:
+    """
+    Add consultations to the daily rollups within the caller's transaction
+    """
+    for statement, params in increment_statements(connection.dialect.name, items):
+        connection.execute(statement, params)
+
+
+def _day_expression(dialect_name: str, column):
+    if dialect_name == "sqlite":
+        return func.date(column)
+    if dialect_name == "postgresql":
+        return cast(column, Date)
+    raise NotImplementedError(f"Consultation rollups are not supported on {dialect_name}")
+
+
+def rebuild_rollups(connection: Connection, date_from: Optional[date] = None, date_to: Optional[date] = None) -> None:
+    """
+    Recompute the rollups for days in [date_from, date_to) (all days when unbounded)
+    """
+    consultations = models.Consultation.__table__
+    links = models.consultation_diagnoses
+    codes = models.DiagnosisCode.__table__
+    day = _day_expression(connection.dialect.name, consultations.c.consultation_date)
+
+    conditions = []
+    if date_from is not None:
+        conditions.append(consultations.c.consultation_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        conditions.append(consultations.c.consultation_date < datetime.combine(date_to, datetime.min.time()))
+
+    rollups = (
+        models.ConsultationDailyStats.__table__,
+        models.ConsultationDailyDoctorStats.__table__,
+        models.ConsultationDailyChapterStats.__table__,
+    )
+    for table in rollups:
+        day_conditions = []
+        if date_from is not None:
+            day_conditions.append(table.c.day >= date_from)
+        if date_to is not None:
+            day_conditions.append(table.c.day < date_to)
+        connection.execute(delete(table).where(*day_conditions))
+
+    connection.execute(insert(models.ConsultationDailyStats.__table__).from_select(
+        ["day", "shard", "consultation_count"],
+        select(day, literal(0), func.count()).where(*conditions).group_by(day)
+    ))
+    connection.execute(insert(models.ConsultationDailyDoctorStats.__table__).from_select(
+        ["day", "doctor_id", "consultation_count"],
+        select(day, consultations.c.doctor_id, func.count())
+        .where(consultations.c.doctor_id.is_not(None), *conditions)
+        .group_by(day, consultations.c.doctor_id)
+    ))
+
+    # One row per consultation and chapter first, so a consultation counts once per chapter
+    chapter = icd10.chapter_expression(codes.c.code)
+    per_consultation = (
+        select(day.label("day"), chapter.label("chapter"), func.count().label("diagnoses"))
+        .select_from(consultations)
+        .join(links, links.c.consultation_id == consultations.c.id)
+        .join(codes, codes.c.id == links.c.diagnosis_code_id)
+        .where(*conditions)
+        .group_by(consultations.c.id, day, chapter)
+        .subquery()
+    )
+    connection.execute(insert(models.ConsultationDailyChapterStats.__table__).from_select(
+        ["day", "chapter", "shard", "consultation_count", "diagnosis_count"],
+        select(per_consultation.c.day, per_consultation.c.chapter, literal(0), func.count(), func.sum(per_consultation.c.diagnoses))
+        .group_by(per_consultation.c.day, per_consultation.c.chapter)
+    ))
+
+
+def backfill(
+    bind: Engine = engine,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    chunk_days: int = DEFAULT_CHUNK_DAYS
+) -> Dict[str, float]:
+    """
+    Rebuild the rollups for [date_from, date_to) chunk_days at a time, one transaction per chunk
+
+    Unbounded ends default to the first and last consultation dates.
+    """
+    started = time.perf_counter()
+    if date_from is None or date_to is None:
+        with bind.connect() as connection:
+            first, last = connection.execute(
+                select(func.min(models.Consultation.consultation_date), func.max(models.Consultation.consultation_date))
+            ).one()
+        if first is None:
+            return {"chunks": 0, "days": 0, "seconds": 0.0}
+        date_from = date_from or _as_date(first)
+        date_to = date_to or _as_date(last) + timedelta(days=1)
+
+    chunks = 0
+    chunk_start = date_from
+    while chunk_start < date_to:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), date_to)
+        with bind.begin() as connection:
+            rebuild_rollups(connection, chunk_start, chunk_end)
+        chunks += 1
+        chunk_start = chunk_end
+
+    return {
+        "chunks": chunks,
+        "days": (date_to - date_from).days,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _as_date(value) -> date:
+    # SQLite returns min()/max() of a DateTime column as text
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the daily consultation rollups")
+    parser.add_argument("command", choices=["backfill"], help="recompute the rollups from the consultations")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (default: first consultation)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Day after the last (default: after the last consultation)")
+    parser.add_argument("--chunk-days", type=int, default=DEFAULT_CHUNK_DAYS, help="Days rebuilt per transaction")
+    args = parser.parse_args(argv)
+
+    if args.date_from and args.date_to and args.date_from >= args.date_to:
+        print("Error: --from must be before --to")
+        return 1
+    stats = backfill(date_from=args.date_from, date_to=args.date_to, chunk_days=args.chunk_days)
+    print(f"Consultation rollups backfilled: {stats['days']} days in {stats['chunks']} chunks ({stats['seconds']}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
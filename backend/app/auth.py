@@ -1,17 +1,52 @@
 """
 Authentication utilities for JWT token management and password hashing
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+import time
+
+from .instrumentation import Histogram
 
 load_dotenv()
 
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
 # Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes below the configured cost are reported as needing an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+# Dedicated pool so bcrypt work never occupies the request threadpool
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending_hashes = 0
+_pending_lock = threading.Lock()
+
+# Time spent in bcrypt per operation (excluding queue wait)
+HASH_DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+password_hash_durations = {
+    "hash": Histogram(HASH_DURATION_BUCKETS),
+    "verify": Histogram(HASH_DURATION_BUCKETS)
+}
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when too many password hashing jobs are already queued
+    """
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -33,6 +68,55 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _timed(operation: str, func: Callable, *args):
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        password_hash_durations[operation].observe(time.perf_counter() - started)
+
+
+async def _run_in_hash_pool(operation: str, func: Callable, *args):
+    """
+    Run a bcrypt operation on the hashing pool, refusing work beyond the queue limit
+    """
+    global _pending_hashes
+    with _pending_lock:
+        if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHasherBusy("Password hashing queue is full")
+        _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, _timed, operation, func, *args)
+    finally:
+        with _pending_lock:
+            _pending_hashes -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the hashing pool
+
+    Returns (is_valid, new_hash); new_hash is set when the stored hash uses an
+    outdated cost or scheme and should be replaced
+    """
+    return await _run_in_hash_pool("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password on the hashing pool
+    """
+    return await _run_in_hash_pool("hash", pwd_context.hash, password)
+
+
+def pending_password_hashes() -> int:
+    """
+    Number of hashing jobs queued or running
+    """
+    return _pending_hashes
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token
@@ -0,0 +1,219 @@
+"""
+Small caching utilities: an in-process TTL/LRU cache and pluggable async
+result-cache backends (in-process or Redis-compatible)
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import json
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a time-to-live
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default if it is missing or expired
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Cache value under key, evicting the least recently used entry when full
+        """
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + lifetime, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Remove key from the cache if present
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove every entry (counters are kept)
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size and hit/miss counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class CacheBackend:
+    """
+    Interface for result-cache storage; values must be JSON-serializable
+    """
+    name = "none"
+
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        return None
+
+    async def clear(self) -> None:
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU backend (per worker)
+    """
+    name = "memory"
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 600.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        self._cache.set(key, value)
+
+    async def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._cache), "maxsize": self._cache.maxsize, "ttl_seconds": self._cache.ttl}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis-compatible backend shared by all workers (requires the redis package)
+
+    Keys carry the caller's version, so entries for an old version are never read
+    again and simply expire after the TTL
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "cache", ttl: float = 600.0):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for the redis cache backend")
+        self._client = redis.from_url(url)
+        self._prefix = prefix
+        self._ttl = int(ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(f"{self._prefix}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any) -> None:
+        await self._client.set(f"{self._prefix}:{key}", json.dumps(value, separators=(",", ":")), ex=self._ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"prefix": self._prefix, "ttl_seconds": self._ttl}
+
+
+class VersionedResultCache:
+    """
+    Read-through result cache whose entries are dropped as a whole when the data version changes
+
+    Tracks hit/miss counts and the time spent on hits and misses (miss time
+    includes computing the value) so the cache can be sized
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self._version: Optional[str] = None
+
+    async def get_or_compute(self, version: str, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key at version, computing and storing it on a miss
+        """
+        started = time.perf_counter()
+        if version != self._version:
+            self._version = version
+            await self.backend.clear()
+
+        versioned_key = f"{version}:{key}"
+        try:
+            value = await self.backend.get(versioned_key)
+        except Exception:
+            # A cache outage must not break the request
+            self.errors += 1
+            value = None
+
+        if value is not None:
+            self.hits += 1
+            self.hit_seconds += time.perf_counter() - started
+            return value
+
+        value = await compute()
+        try:
+            await self.backend.set(versioned_key, value)
+        except Exception:
+            self.errors += 1
+        self.misses += 1
+        self.miss_seconds += time.perf_counter() - started
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit ratio and average latency of hits and misses
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_ms": round(1000 * self.hit_seconds / self.hits, 4) if self.hits else None,
+            "avg_miss_ms": round(1000 * self.miss_seconds / self.misses, 4) if self.misses else None,
+            **self.backend.stats()
+        }
@@ -0,0 +1,482 @@
+"""
+Compact ICD-10 catalog with hierarchy and chapter indexes
+
+The catalog is a snapshot file holding every diagnosis code sorted by code, as
+int32 arrays plus two UTF-8 string blobs:
+- ids (-1 for category nodes added below), parent positions (-1 for categories),
+  subtree ends and chapter numbers, one entry per code
+- code and description offsets into the blobs
+- positions ordered by id, for lookups by id
+
+Sorted by code, a code's descendants directly follow it (E11, E11.6, E11.65,
+E11.9) and every chapter is a contiguous range of categories, so "all codes
+under E11", the children of a code and the categories of a chapter are a
+bisect plus a slice: O(log n + result). A code whose three-character category
+is not in the catalog gets a category node (no id, empty description), so every
+code sits under a category and every category under its chapter (app/icd10.py).
+Codes are normalized (E119 -> E11.9); of two codes with the same normalized
+form, the one with the lower id is kept. Malformed codes shorter than a
+category (E1) are left out: they have no place in the hierarchy, and search
+still finds them.
+
+The snapshot is written once per catalog version, to a temporary name that is
+then renamed, so workers starting together can race safely. It is then
+memory-mapped read-only: all workers share the same page-cache pages and
+each holds only the records built for a response as Python objects. Only the
+hierarchy and chapter lookups are served from it; search still runs on each
+worker's own DiagnosisSearchIndex (app/search_index.py).
+
+Snapshots live in a directory only the app's user can access (created with
+mode 0700). The header carries a SHA-256 of the contents, checked before an
+existing file is served. File names include a key derived from DATABASE_URL,
+so deployments sharing a directory only replace their own snapshots.
+
+Configuration:
+- ICD10_CATALOG_DIR: directory for snapshot files (default: $XDG_CACHE_HOME/cliniccare or ~/.cache/cliniccare)
+"""
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import glob
+import hashlib
+import logging
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+import threading
+
+from . import icd10
+from .database import DATABASE_URL
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DIR = os.getenv("ICD10_CATALOG_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "cliniccare"
+)
+# Snapshots written by this deployment (one per database) start with this key
+DEPLOYMENT_KEY = hashlib.sha256(DATABASE_URL.encode("utf-8")).hexdigest()[:12]
+
+_MAGIC = b"ICD10CT3"
+# magic, catalog version, codes, codes with an id, SHA-256 of everything after the header
+_HEADER = struct.Struct("<8s16sII32s")
+_HEADER_SIZE = 64
+_INT = "i"
+_INT_SIZE = array(_INT).itemsize
+_NO_PARENT = -1
+_NO_ID = -1
+
+# Sorts after every character a code can contain, for range ends
+_RANGE_END = "\uffff"
+
+
+def normalize_code(code: str) -> str:
+    """
+    Canonical form used for ordering and lookups: upper case, dot after the category (e119 -> E11.9)
+    """
+    compact = code.strip().upper().replace(".", "").replace(" ", "")
+    return f"{compact[:3]}.{compact[3:]}" if len(compact) > 3 else compact
+
+
+def ensure_private_directory(directory: str) -> None:
+    """
+    Create directory with mode 0700, or check that an existing one is ours and private
+
+    Raises PermissionError for a directory owned by another user; a directory of
+    ours that others can access is restricted to 0700.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"Catalog directory {directory} is owned by another user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(directory, 0o700)
+
+
+def _is_ancestor(ancestor: str, code: str) -> bool:
+    return code.startswith(ancestor)
+
+
+class CatalogCode:
+    """
+    Catalog entry returned by lookups (built on demand from the mapped snapshot)
+
+    Hierarchy lookups on an entry read the snapshot it came from, even after a newer one is mapped.
+    """
+    __slots__ = ("snapshot", "position", "id", "code", "description", "chapter", "descendants")
+
+    def __init__(
+        self,
+        snapshot: "_MappedSnapshot",
+        position: int,
+        id: Optional[int],
+        code: str,
+        description: str,
+        chapter: int,
+        descendants: int
+    ):
+        self.snapshot = snapshot
+        self.position = position
+        self.id = id
+        self.code = code
+        self.description = description
+        self.chapter = chapter
+        self.descendants = descendants
+
+    @property
+    def is_category(self) -> bool:
+        return len(self.code) == 3
+
+
+class ChapterSummary(NamedTuple):
+    chapter: icd10.Chapter
+    categories: int
+    codes: int
+
+
+def write_snapshot(path: str, version: str, rows: Iterable[Tuple[int, str, str]]) -> None:
+    """
+    Write a snapshot of (id, code, description) rows to path, atomically
+    """
+    entries: Dict[str, Tuple[int, str]] = {}
+    for code_id, code, description in sorted(rows, key=lambda row: row[0]):
+        key = normalize_code(code)
+        if len(key) >= 3 and key not in entries:
+            entries[key] = (code_id, description)
+    for key in list(entries):
+        category = key[:3]
+        if category not in entries:
+            entries[category] = (_NO_ID, "")
+
+    codes = sorted(entries)
+    count = len(codes)
+    ids = array(_INT, (entries[code][0] for code in codes))
+    parents = array(_INT, [_NO_PARENT]) * count
+    ends = array(_INT, [count]) * count
+    chapters = array(_INT, (icd10.chapter_for_code(code) for code in codes))
+
+    # Codes arrive in order, so the open ancestors of the current code form a stack
+    stack: List[int] = []
+    for position, code in enumerate(codes):
+        while stack and not _is_ancestor(codes[stack[-1]], code):
+            ends[stack.pop()] = position
+        if stack:
+            parents[position] = stack[-1]
+        stack.append(position)
+
+    by_id = array(_INT, sorted((position for position in range(count) if ids[position] != _NO_ID), key=ids.__getitem__))
+
+    code_blob, code_offsets = _blob(codes)
+    description_blob, description_offsets = _blob(entries[code][1] for code in codes)
+
+    directory = os.path.dirname(path) or "."
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".icd10-catalog-")
+    try:
+        body = [values.tobytes() for values in (ids, parents, ends, chapters, code_offsets, description_offsets, by_id)]
+        body += [code_blob, description_blob]
+        digest = hashlib.sha256()
+        for part in body:
+            digest.update(part)
+        with os.fdopen(descriptor, "wb") as output:
+            output.write(_HEADER.pack(_MAGIC, version.encode("ascii")[:16].ljust(16), count, len(by_id), digest.digest()))
+            for part in body:
+                output.write(part)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+
+
+def _blob(strings: Iterable[str]) -> Tuple[bytes, array]:
+    """
+    Concatenated UTF-8 strings and the n + 1 offsets delimiting them
+    """
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = array(_INT, [0])
+    total = 0
+    for value in encoded:
+        total += len(value)
+        offsets.append(total)
+    return b"".join(encoded), offsets
+
+
+class _Codes:
+    """
+    Sequence view of the sorted codes for bisect (decodes only the probed entries)
+    """
+    __slots__ = ("snapshot",)
+
+    def __init__(self, snapshot: "_MappedSnapshot"):
+        self.snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self.snapshot.count
+
+    def __getitem__(self, position: int) -> str:
+        return self.snapshot.code(position)
+
+
+class _MappedSnapshot:
+    """
+    Read-only view over a memory-mapped snapshot file
+    """
+    __slots__ = (
+        "version", "count", "ids", "parents", "ends", "chapters", "by_id",
+        "_buffer", "_code_offsets", "_description_offsets", "_codes_start", "_descriptions_start",
+        "codes", "chapter_ranges", "chapter_summaries"
+    )
+
+    def __init__(self, path: str):
+        with open(path, "rb") as source:
+            self._buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, with_id, digest = _HEADER.unpack_from(self._buffer)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not an ICD-10 catalog snapshot")
+        if hashlib.sha256(memoryview(self._buffer)[_HEADER_SIZE:]).digest() != digest:
+            raise ValueError(f"{path} does not match its checksum")
+        self.version = version.rstrip(b" ").decode("ascii")
+        self.count = count
+
+        view = memoryview(self._buffer)
+        offset = _HEADER_SIZE
+
+        def ints(length: int) -> memoryview:
+            nonlocal offset
+            values = view[offset:offset + length * _INT_SIZE].cast(_INT)
+            offset += length * _INT_SIZE
+            return values
+
+        self.ids = ints(count)
+        self.parents = ints(count)
+        self.ends = ints(count)
+        self.chapters = ints(count)
+        self._code_offsets = ints(count + 1)
+        self._description_offsets = ints(count + 1)
+        self.by_id = ints(with_id)
+        self._codes_start = offset
+        self._descriptions_start = offset + self._code_offsets[count]
+        if self._descriptions_start + self._description_offsets[count] != len(self._buffer):
+            raise ValueError(f"{path} is truncated")
+
+        self.codes = _Codes(self)
+        self.chapter_ranges: Dict[int, Tuple[int, int]] = {
+            chapter.number: (
+                bisect_left(self.codes, chapter.first),
+                bisect_left(self.codes, chapter.last + _RANGE_END)
+            )
+            for chapter in icd10.CHAPTERS
+        }
+        self.chapter_summaries = [self._summarize(chapter) for chapter in icd10.CHAPTERS]
+
+    def _summarize(self, chapter: icd10.Chapter) -> "ChapterSummary":
+        start, end = self.chapter_ranges[chapter.number]
+        categories = 0
+        added = 0
+        for position in self.top_level(start, end):
+            categories += 1
+            added += self.ids[position] == _NO_ID
+        return ChapterSummary(chapter, categories, end - start - added)
+
+    def code(self, position: int) -> str:
+        start = self._codes_start + self._code_offsets[position]
+        return self._buffer[start:self._codes_start + self._code_offsets[position + 1]].decode("utf-8")
+
+    def description(self, position: int) -> str:
+        start = self._descriptions_start + self._description_offsets[position]
+        return self._buffer[start:self._descriptions_start + self._description_offsets[position + 1]].decode("utf-8")
+
+    def record(self, position: int) -> CatalogCode:
+        code_id = self.ids[position]
+        return CatalogCode(
+            self,
+            position,
+            None if code_id == _NO_ID else code_id,
+            sys.intern(self.code(position)),
+            self.description(position),
+            self.chapters[position],
+            self.ends[position] - position - 1
+        )
+
+    def top_level(self, start: int, end: int) -> Iterable[int]:
+        """
+        Positions of the outermost entries in [start, end), skipping their subtrees
+        """
+        position = start
+        while position < end:
+            yield position
+            position = self.ends[position]
+
+
+class Icd10Catalog:
+    """
+    Process-local handle on the current catalog snapshot
+    """
+
+    def __init__(self, directory: str = CATALOG_DIR, deployment: str = DEPLOYMENT_KEY):
+        self.directory = directory
+        self.deployment = deployment
+        self._snapshot: Optional[_MappedSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> Optional[str]:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.count if snapshot else 0
+
+    def snapshot_path(self, version: str) -> str:
+        return os.path.join(self.directory, f"icd10-catalog-{self.deployment}-{version}.bin")
+
+    def ensure_current(self, index) -> None:
+        """
+        Map the snapshot matching the diagnosis index's catalog version, writing it if missing
+
+        Rows come from the already loaded index, so no database query is needed.
+        """
+        version = index.catalog_version
+        if version is None or self.version == version:
+            return
+        with self._lock:
+            if self.version == version:
+                return
+            ensure_private_directory(self.directory)
+            path = self.snapshot_path(version)
+            snapshot = None
+            if os.path.exists(path):
+                try:
+                    snapshot = _MappedSnapshot(path)
+                except (ValueError, struct.error):
+                    snapshot = None
+            if snapshot is None or snapshot.version != version:
+                write_snapshot(path, version, ((entry.id, entry.code, entry.description) for entry in index.all_codes()))
+                snapshot = _MappedSnapshot(path)
+                self._remove_stale_snapshots(path)
+            self._snapshot = snapshot
+
+    async def refresh(self, index) -> None:
+        """
+        ensure_current in a worker thread, for request handlers
+
+        Writing and checksumming a snapshot takes a while, so it never runs on the
+        event loop. Callers only wait when nothing is mapped yet; otherwise they keep
+        reading the current snapshot until the new one is swapped in.
+        """
+        version = index.catalog_version
+        if version is None or self.version == version:
+            return
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._refresh_task = asyncio.create_task(self._refresh(index))
+        if self._snapshot is None:
+            await asyncio.shield(task)
+
+    async def _refresh(self, index) -> None:
+        try:
+            await asyncio.to_thread(self.ensure_current, index)
+        except Exception:
+            logger.exception("ICD-10 catalog snapshot update failed; still serving the previous one")
+            if self._snapshot is None:
+                raise
+
+    def _remove_stale_snapshots(self, current: str) -> None:
+        # Only this deployment's files; processes still mapping an old one keep reading it after the unlink
+        for path in glob.glob(os.path.join(self.directory, f"icd10-catalog-{self.deployment}-*.bin")):
+            if path != current:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def get(self, code: str) -> Optional[CatalogCode]:
+        """
+        Look up a code (any spelling normalize_code accepts)
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        key = normalize_code(code)
+        position = bisect_left(snapshot.codes, key)
+        if position < snapshot.count and snapshot.code(position) == key:
+            return snapshot.record(position)
+        return None
+
+    def get_by_id(self, code_id: int) -> Optional[CatalogCode]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        ids = snapshot.ids
+        by_id = snapshot.by_id
+        low, high = 0, len(by_id)
+        while low < high:
+            middle = (low + high) // 2
+            if ids[by_id[middle]] < code_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(by_id) and ids[by_id[low]] == code_id:
+            return snapshot.record(by_id[low])
+        return None
+
+    def ancestors(self, entry: CatalogCode) -> List[CatalogCode]:
+        """
+        Parent, grandparent, ... up to the category
+        """
+        snapshot = entry.snapshot
+        found = []
+        position = snapshot.parents[entry.position]
+        while position != _NO_PARENT:
+            found.append(snapshot.record(position))
+            position = snapshot.parents[position]
+        return found
+
+    def children(self, entry: CatalogCode) -> List[CatalogCode]:
+        """
+        Direct children in code order
+        """
+        snapshot = entry.snapshot
+        end = snapshot.ends[entry.position]
+        return [snapshot.record(position) for position in snapshot.top_level(entry.position + 1, end)]
+
+    def descendants(self, entry: CatalogCode, offset: int = 0, limit: int = 100) -> Tuple[List[CatalogCode], int]:
+        """
+        A page of all codes under entry, in code order, and their total number
+        """
+        snapshot = entry.snapshot
+        start = entry.position + 1
+        end = snapshot.ends[entry.position]
+        page = range(start + offset, min(start + offset + limit, end))
+        return [snapshot.record(position) for position in page], end - start
+
+    def chapters(self) -> List[ChapterSummary]:
+        """
+        Every chapter with its number of categories and of catalog codes (added category nodes excluded)
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [ChapterSummary(chapter, 0, 0) for chapter in icd10.CHAPTERS]
+        return snapshot.chapter_summaries
+
+    def categories(self, chapter: int) -> List[CatalogCode]:
+        """
+        Categories of a chapter in code order (empty for unknown chapters)
+        """
+        snapshot = self._snapshot
+        if snapshot is None or chapter not in snapshot.chapter_ranges:
+            return []
+        start, end = snapshot.chapter_ranges[chapter]
+        return [snapshot.record(position) for position in snapshot.top_level(start, end)]
+
+
+# Shared catalog for this process
+icd10_catalog = Icd10Catalog()
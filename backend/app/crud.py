@@ -1,74 +1,107 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from . import models, schemas
-from typing import List, Optional
+from sqlalchemy import func
+from . import models
+from typing import List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
 
-# Diagnosis Code CRUD operations
-def search_diagnosis_codes(db: Session, search_term: Optional[str] = None, limit: int = 50) -> List[models.DiagnosisCode]:
+class InvalidDiagnosisCodes(ValueError):
     """
-    Search diagnosis codes by code or description
+    Raised when a consultation references unknown or repeated diagnosis code IDs
     """
-    query = db.query(models.DiagnosisCode)
-    
-    if search_term:
-        search_pattern = f"%{search_term}%"
-        query = query.filter(
-            or_(
-                models.DiagnosisCode.code.ilike(search_pattern),
-                models.DiagnosisCode.description.ilike(search_pattern)
-            )
-        )
-    
-    return query.limit(limit).all()
+    def __init__(self, missing: List[int], duplicates: List[int]):
+        self.missing = missing
+        self.duplicates = duplicates
+        problems = []
+        if missing:
+            problems.append(f"Diagnosis code IDs not found: {missing}")
+        if duplicates:
+            problems.append(f"Duplicate diagnosis code IDs: {duplicates}")
+        super().__init__("; ".join(problems))
 
-def get_diagnosis_code_by_id(db: Session, code_id: int) -> Optional[models.DiagnosisCode]:
+def find_invalid_diagnosis_codes(requested_ids: List[int], known_ids) -> Optional[InvalidDiagnosisCodes]:
     """
-    Get a single diagnosis code by ID
+    Return the InvalidDiagnosisCodes error for requested_ids, or None when all are known and unique
     """
-    return db.query(models.DiagnosisCode).filter(models.DiagnosisCode.id == code_id).first()
+    seen = set()
+    duplicates = []
+    for code_id in requested_ids:
+        if code_id in seen and code_id not in duplicates:
+            duplicates.append(code_id)
+        seen.add(code_id)
+    missing = [code_id for code_id in dict.fromkeys(requested_ids) if code_id not in known_ids]
+    if missing or duplicates:
+        return InvalidDiagnosisCodes(missing, duplicates)
+    return None
 
-# Consultation CRUD operations
-def create_consultation(db: Session, consultation: schemas.ConsultationCreate) -> models.Consultation:
+def check_diagnosis_codes(requested_ids: List[int], diagnosis_codes: List[models.DiagnosisCode]) -> List[models.DiagnosisCode]:
     """
-    Create a new consultation with associated diagnosis codes
+    Validate fetched codes against the requested IDs, returning them in request order
+
+    Raises InvalidDiagnosisCodes listing every missing and duplicated ID at once
+    """
+    by_id = {code.id: code for code in diagnosis_codes}
+    error = find_invalid_diagnosis_codes(requested_ids, by_id)
+    if error:
+        raise error
+    return [by_id[code_id] for code_id in requested_ids]
+
+def encode_consultation_cursor(consultation_date: datetime, consultation_id: int) -> str:
     """
-    # Get diagnosis codes
-    diagnosis_codes = db.query(models.DiagnosisCode).filter(
-        models.DiagnosisCode.id.in_(consultation.diagnosis_code_ids)
-    ).all()
-    
-    # Create consultation
-    db_consultation = models.Consultation(
-        patient_name=consultation.patient_name,
-        consultation_date=consultation.consultation_date,
-        notes=consultation.notes,
-        diagnosis_codes=diagnosis_codes
-    )
-    
-    db.add(db_consultation)
-    db.commit()
-    db.refresh(db_consultation)
-    
-    return db_consultation
+    Build an opaque pagination cursor pointing just after the given (consultation_date, id)
+    """
+    raw = json.dumps([consultation_date.isoformat(), consultation_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-def get_consultations(db: Session, skip: int = 0, limit: int = 100) -> List[models.Consultation]:
+def decode_consultation_cursor(cursor: str) -> Tuple[datetime, int]:
     """
-    Get all consultations, ordered by consultation date (newest first)
+    Parse a cursor produced by encode_consultation_cursor
+
+    Raises ValueError if the cursor is malformed
     """
-    return db.query(models.Consultation)\
-        .order_by(models.Consultation.consultation_date.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_value, consultation_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date_value), int(consultation_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
 
-def get_consultation_by_id(db: Session, consultation_id: int) -> Optional[models.Consultation]:
+def normalize_patient_name(name: str) -> str:
     """
-    Get a single consultation by ID
+    Case-fold and collapse whitespace for patient name matching
     """
-    return db.query(models.Consultation).filter(models.Consultation.id == consultation_id).first()
+    return " ".join(name.split()).lower()
 
-def get_consultations_count(db: Session) -> int:
+def consultation_filter_conditions(
+    dialect_name: str,
+    patient_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> list:
     """
-    Get total count of consultations
+    WHERE conditions for the consultation list filters
+
+    patient_name matches as a normalized prefix of lower(patient_name), written
+    as a range so it is served by ix_consultations_patient_name_lower_date
+    (LIKE cannot use an expression index on SQLite, and a bound LIKE pattern
+    cannot use one in a generic plan on PostgreSQL). date_from is inclusive,
+    date_to exclusive.
     """
-    return db.query(models.Consultation).count()
+    conditions = []
+    if patient_name:
+        prefix = normalize_patient_name(patient_name)
+        if prefix:
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            name_key = func.lower(models.Consultation.patient_name)
+            if dialect_name == "postgresql":
+                # text_pattern_ops operators: byte-order comparison, like the index
+                conditions.append(name_key.op("~>=~")(prefix))
+                conditions.append(name_key.op("~<~")(upper))
+            else:
+                conditions.append(name_key >= prefix)
+                conditions.append(name_key < upper)
+    if date_from is not None:
+        conditions.append(models.Consultation.consultation_date >= date_from)
+    if date_to is not None:
+        conditions.append(models.Consultation.consultation_date < date_to)
+    return conditions
@@ -0,0 +1,466 @@
+"""
+CRUD operations used by the API routers (shared validation and cursor helpers live in crud.py)
+"""
+from sqlalchemy import and_, func, insert, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime
+from http import HTTPStatus
+
+from . import analytics, diagnosis_usage, fulltext, models, schemas
+from .crud import check_diagnosis_codes, consultation_filter_conditions, find_invalid_diagnosis_codes
+from .search_cache import search_cache, search_cache_key
+from .search_index import diagnosis_index
+
+
+async def _record_diagnosis_usage(db: AsyncSession, items: Iterable[diagnosis_usage.UsageItem]) -> None:
+    """
+    Add new consultations to the precomputed usage counts in the current transaction
+    """
+    for statement, params in diagnosis_usage.increment_statements(db.get_bind().dialect.name, items):
+        await db.execute(statement, params)
+
+async def _record_rollups(db: AsyncSession, items: Iterable[analytics.RollupItem]) -> None:
+    """
+    Add new consultations to the daily analytics rollups in the current transaction
+    """
+    for statement, params in analytics.increment_statements(db.get_bind().dialect.name, items):
+        await db.execute(statement, params)
+
+# Diagnosis Code CRUD operations
+async def search_diagnosis_codes(
+    db: AsyncSession,
+    search_term: Optional[str] = None,
+    limit: int = 50,
+    ranked: bool = False,
+    popular: bool = False
+) -> Tuple[List[Dict], int]:
+    """
+    Search diagnosis codes by code or description
+
+    Served from the in-memory diagnosis index, which is (re)loaded from the
+    database only when the catalog has changed. Returns the matching codes
+    (best first when ranked, each with a score) and the total number of matches.
+
+    With popular, results are ranked and frequently used codes are boosted
+    within their relevance tier. Results go through the search result cache,
+    keyed on the catalog version and the normalized term (plus the usage counts
+    version when boosted), and are returned as plain dicts
+    """
+    await diagnosis_index.refresh()
+    boosts = None
+    if popular:
+        await db.run_sync(diagnosis_usage.usage_counts.ensure_fresh)
+        boosts = diagnosis_usage.usage_counts.boosts
+        ranked = True
+    
+    async def compute() -> Dict:
+        if ranked:
+            hits, total = diagnosis_index.rank(search_term, limit=limit, boosts=boosts)
+            results = [
+                {"id": hit.id, "code": hit.code, "description": hit.description, "score": hit.score}
+                for hit in hits
+            ]
+        else:
+            entries, total = diagnosis_index.search(search_term, limit=limit)
+            results = [
+                {"id": entry.id, "code": entry.code, "description": entry.description}
+                for entry in entries
+            ]
+        return {"results": results, "total": total}
+    
+    cached = await search_cache.get_or_compute(
+        diagnosis_index.catalog_version or "empty",
+        search_cache_key(search_term, limit, ranked, usage_version=(diagnosis_usage.usage_counts.version or "none") if popular else None),
+        compute
+    )
+    return cached["results"], cached["total"]
+
+async def get_diagnosis_code_strings(db: AsyncSession, code_ids: Iterable[int], chunk_size: int = 5000) -> Dict[int, str]:
+    """
+    Map the given diagnosis code IDs that exist to their codes, using one IN query per chunk
+    """
+    wanted = sorted(set(code_ids))
+    existing: Dict[int, str] = {}
+    for start in range(0, len(wanted), chunk_size):
+        result = await db.execute(
+            select(models.DiagnosisCode.id, models.DiagnosisCode.code)
+            .where(models.DiagnosisCode.id.in_(wanted[start:start + chunk_size]))
+        )
+        existing.update(result.tuples().all())
+    return existing
+
+async def get_popular_diagnosis_codes(db: AsyncSession, month: Optional[date] = None, limit: int = 20) -> List[Dict]:
+    """
+    Most used diagnosis codes, all-time or for one month, from the precomputed usage counts
+    """
+    if month is None:
+        usage = models.DiagnosisUsage.__table__
+        conditions = []
+    else:
+        usage = models.DiagnosisUsageMonthly.__table__
+        conditions = [usage.c.month == month]
+    codes = models.DiagnosisCode.__table__
+    result = await db.execute(
+        select(codes.c.id, codes.c.code, codes.c.description, usage.c.consultation_count)
+        .join(codes, codes.c.id == usage.c.diagnosis_code_id)
+        .where(*conditions, usage.c.consultation_count > 0)
+        .order_by(usage.c.consultation_count.desc(), codes.c.code)
+        .limit(limit)
+    )
+    return [dict(row) for row in result.mappings()]
+
+# Consultation CRUD operations
+async def create_consultation(
+    db: AsyncSession,
+    consultation: schemas.ConsultationCreate,
+    doctor_id: Optional[int] = None
+) -> models.Consultation:
+    """
+    Create a new consultation with associated diagnosis codes, recorded by doctor_id
+
+    Runs a fixed number of statements however many codes are attached: one
+    SELECT to fetch and validate the codes, the consultation INSERT, one
+    multi-row INSERT for the associations, two usage count upserts and up to
+    three rollup upserts. Raises crud.InvalidDiagnosisCodes if any ID is
+    unknown or repeated.
+    """
+    # Get and validate diagnosis codes
+    result = await db.execute(
+        select(models.DiagnosisCode).where(models.DiagnosisCode.id.in_(consultation.diagnosis_code_ids))
+    )
+    diagnosis_codes = check_diagnosis_codes(consultation.diagnosis_code_ids, list(result.scalars().all()))
+    
+    # Create consultation
+    db_consultation = models.Consultation(
+        patient_name=consultation.patient_name,
+        consultation_date=consultation.consultation_date,
+        notes=consultation.notes,
+        doctor_id=doctor_id,
+        diagnosis_codes=diagnosis_codes
+    )
+    
+    db.add(db_consultation)
+    await _record_diagnosis_usage(db, [(consultation.consultation_date, consultation.diagnosis_code_ids)])
+    await _record_rollups(db, [(consultation.consultation_date, doctor_id, [code.code for code in diagnosis_codes])])
+    await db.commit()
+    
+    # The session does not expire on commit, so the new row and its codes are
+    # already loaded for the response
+    return db_consultation
+
+async def create_consultations_batch(
+    db: AsyncSession,
+    consultations: List[schemas.ConsultationCreate],
+    atomic: bool = False,
+    chunk_size: int = 1000,
+    doctor_id: Optional[int] = None
+) -> List[Dict]:
+    """
+    Create many consultations at once, all recorded by doctor_id
+
+    All diagnosis code IDs are validated with a single set lookup. Valid items
+    are written with multi-row INSERTs, chunk by chunk; each chunk is committed
+    on its own unless atomic is set, in which case nothing is written when any
+    item is invalid and everything is committed together. Returns one result per
+    item, in input order.
+    """
+    consultation_table = models.Consultation.__table__
+    association_table = models.consultation_diagnoses
+    
+    existing = await get_diagnosis_code_strings(
+        db, (code_id for item in consultations for code_id in item.diagnosis_code_ids)
+    )
+    
+    results: List[Dict] = []
+    valid: List[Tuple[int, schemas.ConsultationCreate, List[int]]] = []
+    for index, item in enumerate(consultations):
+        code_ids = item.diagnosis_code_ids
+        error = find_invalid_diagnosis_codes(code_ids, existing)
+        if error:
+            # Same message and status code as a single create would return
+            results.append({
+                "index": index,
+                "status": "error",
+                "status_code": int(HTTPStatus.NOT_FOUND if error.missing else HTTPStatus.UNPROCESSABLE_ENTITY),
+                "error": str(error)
+            })
+        else:
+            results.append({"index": index, "status": "created"})
+            valid.append((index, item, code_ids))
+    
+    if atomic and len(valid) != len(consultations):
+        for result in results:
+            if result["status"] == "created":
+                result.update(status="error", error="Not created: batch is atomic and other items failed")
+        return results
+    
+    insert_consultations = insert(consultation_table).returning(
+        consultation_table.c.id, sort_by_parameter_order=True
+    )
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        inserted = await db.execute(insert_consultations, [
+            {
+                "patient_name": item.patient_name,
+                "consultation_date": item.consultation_date,
+                "notes": item.notes,
+                "doctor_id": doctor_id
+            }
+            for _, item, _ in chunk
+        ])
+        new_ids = inserted.scalars().all()
+        
+        links = []
+        for (index, _, code_ids), consultation_id in zip(chunk, new_ids):
+            results[index]["id"] = consultation_id
+            links.extend({"consultation_id": consultation_id, "diagnosis_code_id": code_id} for code_id in code_ids)
+        await db.execute(insert(association_table), links)
+        await _record_diagnosis_usage(db, [(item.consultation_date, code_ids) for _, item, code_ids in chunk])
+        await _record_rollups(db, [
+            (item.consultation_date, doctor_id, [existing[code_id] for code_id in code_ids])
+            for _, item, code_ids in chunk
+        ])
+        
+        if not atomic:
+            await db.commit()
+    
+    await db.commit()
+    return results
+
+def _page_filter(query, skip: int, after: Optional[Tuple[datetime, int]]):
+    """
+    Apply keyset (after) or offset (skip) pagination to a newest-first consultation query
+    """
+    if after is not None:
+        after_date, after_id = after
+        return query.where(
+            or_(
+                models.Consultation.consultation_date < after_date,
+                and_(
+                    models.Consultation.consultation_date == after_date,
+                    models.Consultation.id < after_id
+                )
+            )
+        )
+    return query.offset(skip)
+
+async def _attach_diagnosis_codes(db: AsyncSession, consultations: List[Dict]) -> List[Dict]:
+    """
+    Add a diagnosis_codes list to each consultation dict with one joined query
+    """
+    by_id = {consultation["id"]: consultation for consultation in consultations}
+    for consultation in consultations:
+        consultation["diagnosis_codes"] = []
+    if not by_id:
+        return consultations
+    
+    association = models.consultation_diagnoses
+    result = await db.execute(
+        select(
+            association.c.consultation_id,
+            models.DiagnosisCode.id,
+            models.DiagnosisCode.code,
+            models.DiagnosisCode.description
+        )
+        .join(models.DiagnosisCode, models.DiagnosisCode.id == association.c.diagnosis_code_id)
+        .where(association.c.consultation_id.in_(list(by_id)))
+    )
+    for consultation_id, code_id, code, description in result:
+        by_id[consultation_id]["diagnosis_codes"].append({"id": code_id, "code": code, "description": description})
+    return consultations
+
+_CONSULTATION_COLUMNS = (
+    models.Consultation.id,
+    models.Consultation.patient_name,
+    models.Consultation.consultation_date,
+    models.Consultation.notes,
+    models.Consultation.doctor_id,
+    models.Consultation.created_at
+)
+
+async def get_consultation_rows(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    patient_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    Get a page of consultations, ordered by consultation date (newest first),
+    as plain dicts (no ORM objects) ready to be serialized straight to JSON
+
+    When `after` (a decoded cursor) is given, the page starts right after that
+    (consultation_date, id) position using the composite index instead of an
+    OFFSET scan, and `skip` is ignored.
+
+    Optionally filtered by patient name prefix and date range
+    (see crud.consultation_filter_conditions)
+    """
+    query = select(*_CONSULTATION_COLUMNS)\
+        .where(*consultation_filter_conditions(db.get_bind().dialect.name, patient_name, date_from, date_to))\
+        .order_by(models.Consultation.consultation_date.desc(), models.Consultation.id.desc())
+    result = await db.execute(_page_filter(query, skip, after).limit(limit))
+    return await _attach_diagnosis_codes(db, [dict(row._mapping) for row in result])
+
+async def get_consultation_row_by_id(db: AsyncSession, consultation_id: int) -> Optional[Dict]:
+    """
+    Get a single consultation as a plain dict
+    """
+    result = await db.execute(select(*_CONSULTATION_COLUMNS).where(models.Consultation.id == consultation_id))
+    row = result.first()
+    if row is None:
+        return None
+    return (await _attach_diagnosis_codes(db, [dict(row._mapping)]))[0]
+
+async def search_consultation_notes(db: AsyncSession, search_term: str, limit: int = 20) -> List[Dict]:
+    """
+    Full-text search over consultation notes, best match first
+    
+    Each consultation dict also carries a relevance score and a snippet with
+    the matched terms highlighted
+    """
+    statement = fulltext.search_statement(db.get_bind().dialect.name, search_term, limit)
+    if statement is None:
+        return []
+    
+    hits = (await db.execute(*statement)).all()
+    if not hits:
+        return []
+    
+    result = await db.execute(
+        select(*_CONSULTATION_COLUMNS).where(models.Consultation.id.in_([hit.id for hit in hits]))
+    )
+    by_id = {row.id: dict(row._mapping) for row in result}
+    consultations = []
+    for hit in hits:
+        consultation = by_id.get(hit.id)
+        if consultation is not None:
+            consultation["score"] = round(float(hit.score), 4)
+            consultation["snippet"] = hit.snippet
+            consultations.append(consultation)
+    return await _attach_diagnosis_codes(db, consultations)
+
+async def stream_consultation_rows(
+    db: AsyncSession,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    chunk_size: int = 1000
+) -> AsyncIterator[List[Dict]]:
+    """
+    Stream every consultation (oldest first) as chunks of plain dicts
+    
+    Rows are read through a server-side cursor chunk_size at a time, and each
+    chunk gets its diagnosis codes in one query, so memory use does not grow
+    with the table. date_from is inclusive, date_to exclusive.
+    """
+    query = select(*_CONSULTATION_COLUMNS)\
+        .where(*consultation_filter_conditions(db.get_bind().dialect.name, date_from=date_from, date_to=date_to))\
+        .order_by(models.Consultation.consultation_date, models.Consultation.id)\
+        .execution_options(yield_per=chunk_size)
+    
+    result = await db.stream(query)
+    try:
+        async for partition in result.partitions():
+            yield await _attach_diagnosis_codes(db, [dict(row._mapping) for row in partition])
+    finally:
+        await result.close()
+
+async def get_consultations_count(
+    db: AsyncSession,
+    patient_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> int:
+    """
+    Get total count of consultations (matching the optional filters)
+    """
+    conditions = consultation_filter_conditions(db.get_bind().dialect.name, patient_name, date_from, date_to)
+    return await db.scalar(select(func.count(models.Consultation.id)).where(*conditions))
+
+async def estimate_consultations_count(db: AsyncSession) -> int:
+    """
+    Get an approximate count of consultations without scanning the table
+
+    Uses planner statistics on PostgreSQL and the highest rowid on SQLite,
+    falling back to an exact count when no estimate is available
+    """
+    dialect = db.get_bind().dialect.name
+    estimate = None
+    
+    if dialect == "postgresql":
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'consultations'")
+        )
+    elif dialect == "sqlite":
+        estimate = await db.scalar(select(func.max(models.Consultation.id))) or 0
+    
+    if estimate is None or estimate < 0:
+        return await get_consultations_count(db)
+    return int(estimate)
+
+# Analytics (served from the daily rollups, see analytics.py)
+async def get_daily_consultation_counts(db: AsyncSession, date_from: date, date_to: date) -> Dict[date, int]:
+    """
+    Consultations per day for days in [date_from, date_to); days without consultations are absent
+    """
+    stats = models.ConsultationDailyStats.__table__
+    result = await db.execute(
+        select(stats.c.day, func.sum(stats.c.consultation_count))
+        .where(stats.c.day >= date_from, stats.c.day < date_to)
+        .group_by(stats.c.day)
+    )
+    return dict(result.tuples().all())
+
+async def get_doctor_consultation_counts(db: AsyncSession, date_from: date, date_to: date) -> List[Dict]:
+    """
+    Consultations per recording doctor for days in [date_from, date_to), most first
+    """
+    stats = models.ConsultationDailyDoctorStats.__table__
+    doctors = models.Doctor.__table__
+    total = func.sum(stats.c.consultation_count)
+    result = await db.execute(
+        select(doctors.c.id.label("doctor_id"), doctors.c.username, doctors.c.full_name, total.label("consultations"))
+        .join(doctors, doctors.c.id == stats.c.doctor_id)
+        .where(stats.c.day >= date_from, stats.c.day < date_to)
+        .group_by(doctors.c.id, doctors.c.username, doctors.c.full_name)
+        .order_by(total.desc(), doctors.c.username)
+    )
+    return [dict(row) for row in result.mappings()]
+
+async def get_chapter_consultation_counts(db: AsyncSession, date_from: date, date_to: date) -> List[Tuple[int, int, int]]:
+    """
+    (chapter, consultations, diagnoses) for days in [date_from, date_to), in chapter order
+    """
+    stats = models.ConsultationDailyChapterStats.__table__
+    result = await db.execute(
+        select(stats.c.chapter, func.sum(stats.c.consultation_count), func.sum(stats.c.diagnosis_count))
+        .where(stats.c.day >= date_from, stats.c.day < date_to)
+        .group_by(stats.c.chapter)
+        .order_by(stats.c.chapter)
+    )
+    return [tuple(row) for row in result.tuples().all()]
+
+# Doctor operations
+async def get_doctor_by_username(db: AsyncSession, username: str) -> Optional[models.Doctor]:
+    """
+    Get a doctor by username
+    """
+    result = await db.execute(select(models.Doctor).where(models.Doctor.username == username))
+    return result.scalars().first()
+
+async def get_doctor_by_email(db: AsyncSession, email: str) -> Optional[models.Doctor]:
+    """
+    Get a doctor by email
+    """
+    result = await db.execute(select(models.Doctor).where(models.Doctor.email == email))
+    return result.scalars().first()
+
+async def get_doctors(db: AsyncSession) -> List[models.Doctor]:
+    """
+    Get all doctors
+    """
+    result = await db.execute(select(models.Doctor))
+    return list(result.scalars().all())
@@ -1,7 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
+import logging
 import os
 
 load_dotenv()
@@ -10,18 +14,164 @@ load_dotenv()
 # Default to SQLite if not specified
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cliniccare.db")
 
+
+def to_async_url(url: str) -> str:
+    """
+    Derive the async driver URL (aiosqlite / asyncpg) from a sync database URL
+    """
+    if url.startswith("sqlite+aiosqlite:") or url.startswith("postgresql+asyncpg:"):
+        return url
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+# Async database URL, derived from DATABASE_URL unless set explicitly
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool configuration
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+}
+
+# SQLite connection tuning, applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-64000")),  # negative = KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or "mode=memory" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Pool options for an engine; in-memory SQLite keeps SQLAlchemy's single-connection pool
+    """
+    if _is_sqlite_memory(url):
+        return {}
+    options = dict(POOL_SETTINGS)
+    if _is_sqlite(url):
+        # File-based SQLite may otherwise default to NullPool (notably under aiosqlite)
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune each new SQLite connection (WAL, relaxed fsync, mmap, cache, busy wait)
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _tune_sqlite(sync_engine: Engine) -> None:
+    # In-memory databases gain nothing from WAL or mmap
+    if not _is_sqlite_memory(str(sync_engine.url)):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+
+
 # Create engine
-if DATABASE_URL.startswith("sqlite"):
+if _is_sqlite(DATABASE_URL):
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        **_engine_options(DATABASE_URL)
     )
+    _tune_sqlite(engine)
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+# Create async engine (used by the API routers)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, is_async=True))
+if _is_sqlite(ASYNC_DATABASE_URL):
+    _tune_sqlite(async_engine.sync_engine)
+
+
+def pool_configuration(sync_engine: Engine) -> dict:
+    """
+    Effective pool (and SQLite pragma) configuration of an engine
+    """
+    pool = sync_engine.pool
+    config = {
+        "url": sync_engine.url.render_as_string(hide_password=True),
+        "pool_class": type(pool).__name__,
+    }
+    if hasattr(pool, "_max_overflow"):
+        config.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "pool_timeout": pool._timeout,
+        })
+    config["pool_recycle"] = pool._recycle
+    config["pool_pre_ping"] = pool._pre_ping
+    if _is_sqlite(str(sync_engine.url)) and not _is_sqlite_memory(str(sync_engine.url)):
+        config["sqlite_pragmas"] = dict(SQLITE_PRAGMAS)
+    return config
+
+
+def pool_status(sync_engine: Engine) -> dict:
+    """
+    Current connection counts of an engine's pool (empty for pools that do not track them)
+    """
+    pool = sync_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    status = {"checked_out": pool.checkedout()}
+    if hasattr(pool, "_max_overflow"):
+        status.update({
+            "checked_in": pool.checkedin(),
+            "size": pool.size(),
+            # Negative until the pool has opened pool_size connections
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    return status
+
+
+def log_pool_configuration() -> None:
+    """
+    Log the effective configuration of the sync and async engines
+    """
+    logger.info("Database engine: %s", pool_configuration(engine))
+    logger.info("Async database engine: %s", pool_configuration(async_engine.sync_engine))
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class
+# Objects stay usable after commit, since async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
@@ -32,3 +182,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
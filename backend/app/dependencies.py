@@ -3,51 +3,124 @@ FastAPI dependencies for authentication
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import models, auth
-from .database import get_db
+from typing import Optional
+from datetime import datetime, timezone
+import os
+
+from . import models, auth, crud_async
+from .cache import TTLCache
+from .database import get_async_db
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Authentication cache configuration
+#
+# The caches are per worker process. ORM updates and deletes of a doctor evict
+# it in the process that made them; other workers (and raw SQL changes) keep
+# serving the cached record until it expires, so a deactivated doctor can stay
+# signed in for up to AUTH_CACHE_TTL_SECONDS. Set it to 0 to disable caching.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Verified token -> username (never outlives the token's own expiry)
+token_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+
+# Username -> detached snapshot of the doctor record
+doctor_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+
+
+def _snapshot_doctor(doctor: models.Doctor) -> models.Doctor:
+    """
+    Copy a doctor into a transient instance that is safe to share between requests
+    """
+    return models.Doctor(
+        id=doctor.id,
+        username=doctor.username,
+        email=doctor.email,
+        full_name=doctor.full_name,
+        hashed_password=doctor.hashed_password,
+        is_active=doctor.is_active,
+        created_at=doctor.created_at
+    )
+
+
+def invalidate_doctor(username: Optional[str] = None) -> None:
+    """
+    Drop a cached doctor record (or all of them) after it was changed or deactivated
+    """
+    if username is None:
+        doctor_cache.clear()
+    else:
+        doctor_cache.delete(username)
+
+
+def auth_cache_stats() -> dict:
+    """
+    Hit/miss counters for the authentication caches
+    """
+    return {
+        "tokens": token_cache.stats(),
+        "doctors": doctor_cache.stats()
+    }
 
-def get_current_doctor(
+
+async def get_current_doctor(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> models.Doctor:
     """
     Get the current authenticated doctor from JWT token
+
+    Verified tokens and doctor records are cached, so repeat requests skip both
+    the JWT signature check and the database lookup
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    # Decode token
-    payload = auth.decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    username: str = payload.get("sub")
+
+    username: Optional[str] = token_cache.get(token)
     if username is None:
-        raise credentials_exception
-    
-    # Get doctor from database
-    doctor = db.query(models.Doctor).filter(models.Doctor.username == username).first()
+        # Decode token
+        payload = auth.decode_access_token(token)
+        if payload is None:
+            raise credentials_exception
+
+        username = payload.get("sub")
+        if username is None:
+            raise credentials_exception
+
+        expires = payload.get("exp")
+        if expires is not None:
+            remaining = expires - datetime.now(timezone.utc).timestamp()
+            token_cache.set(token, username, ttl=remaining)
+        else:
+            token_cache.set(token, username)
+
+    doctor = doctor_cache.get(username)
     if doctor is None:
-        raise credentials_exception
-    
+        # Get doctor from database
+        db_doctor = await crud_async.get_doctor_by_username(db, username)
+        if db_doctor is None:
+            raise credentials_exception
+        doctor = _snapshot_doctor(db_doctor)
+        doctor_cache.set(username, doctor)
+
     if not doctor.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
-    
+
     return doctor
 
 
-def get_current_active_doctor(
+async def get_current_active_doctor(
     current_doctor: models.Doctor = Depends(get_current_doctor)
 ) -> models.Doctor:
     """
@@ -59,3 +132,26 @@ def get_current_active_doctor(
             detail="Inactive doctor account"
         )
     return current_doctor
+
+
+@event.listens_for(models.Doctor, "after_update")
+@event.listens_for(models.Doctor, "after_delete")
+def _invalidate_changed_doctor(mapper, connection, target):
+    """
+    Evict a doctor from the cache when the record is updated or deleted
+    """
+    invalidate_doctor(target.username)
+    # A renamed doctor must not stay reachable under the old username
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        invalidate_doctor(old_username)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_bulk_doctor_changes(orm_execute_state):
+    """
+    Bulk UPDATE/DELETE statements on doctors clear the whole doctor cache
+    """
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is models.Doctor:
+            invalidate_doctor()
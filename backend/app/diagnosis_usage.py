@@ -0,0 +1,241 @@
+"""
+Precomputed diagnosis code usage
+
+- diagnosis_usage: all-time number of consultations per diagnosis code
+- diagnosis_usage_monthly: the same per calendar month of the consultation date
+
+Both are incremented in the same transaction as the consultations they count
+(crud_async.create_consultation, create_consultations_batch and the synthetic
+generator), so "most used codes" and "top diagnoses this month" are index scans
+instead of a GROUP BY over consultation_diagnoses. Counts can be rebuilt from
+consultation_diagnoses at any time:
+
+    python -m app.diagnosis_usage rebuild
+
+usage_counts keeps the all-time counts in memory for popularity-boosted search.
+
+Configuration:
+- DIAGNOSIS_USAGE_REFRESH_SECONDS: how often the in-memory counts are reloaded (default 60)
+- DIAGNOSIS_POPULARITY_BOOST: score added to the most used code in boosted search (default 4.0)
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import cast, Date, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+load_dotenv()
+
+USAGE_REFRESH_SECONDS = float(os.getenv("DIAGNOSIS_USAGE_REFRESH_SECONDS", "60"))
+# Kept below the 5-point margin between relevance tiers (10 apart, less the coverage bonus),
+# so popularity only reorders within a tier
+POPULARITY_BOOST = float(os.getenv("DIAGNOSIS_POPULARITY_BOOST", "4.0"))
+
+_UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# (consultation date, diagnosis code ids) for one consultation
+UsageItem = Tuple[datetime, Iterable[int]]
+
+
+def is_supported(dialect_name: str) -> bool:
+    return dialect_name in _UPSERT_DIALECTS
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def increment_upsert(dialect_name: str, table, key_columns: List[str], count_columns: Sequence[str] = ("consultation_count",)):
+    """
+    INSERT of new counter rows that adds to count_columns when the key already exists
+    """
+    statement = _UPSERT_DIALECTS[dialect_name](table)
+    return statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + statement.excluded[column] for column in count_columns}
+    )
+
+
+class UsageIncrements:
+    """
+    Usage counts of consultations not yet added to the usage tables
+
+    Bulk loaders add batch after batch and write the totals once.
+    """
+
+    def __init__(self):
+        self.totals: Counter = Counter()
+        self.monthly: Counter = Counter()
+
+    def add(self, items: Iterable[UsageItem]) -> None:
+        totals = self.totals
+        monthly = self.monthly
+        for consultation_date, code_ids in items:
+            month = month_start(consultation_date)
+            for code_id in code_ids:
+                totals[code_id] += 1
+                monthly[(month, code_id)] += 1
+
+    def statements(self, dialect_name: str) -> List[Tuple[object, List[dict]]]:
+        """
+        Upsert statements and parameters adding the counts to both usage tables
+
+        Keys are sorted so concurrent writers lock rows in the same order. Returns
+        an empty list on databases without ON CONFLICT support.
+        """
+        if not is_supported(dialect_name) or not self.totals:
+            return []
+
+        usage = models.DiagnosisUsage.__table__
+        usage_monthly = models.DiagnosisUsageMonthly.__table__
+        return [
+            (
+                increment_upsert(dialect_name, usage, ["diagnosis_code_id"]),
+                [{"diagnosis_code_id": code_id, "consultation_count": count} for code_id, count in sorted(self.totals.items())]
+            ),
+            (
+                increment_upsert(dialect_name, usage_monthly, ["month", "diagnosis_code_id"]),
+                [
+                    {"month": month, "diagnosis_code_id": code_id, "consultation_count": count}
+                    for (month, code_id), count in sorted(self.monthly.items())
+                ]
+            ),
+        ]
+
+
+def increment_statements(dialect_name: str, items: Iterable[UsageItem]) -> List[Tuple[object, List[dict]]]:
+    """
+    Upsert statements and parameters adding items to both usage tables
+    """
+    if not is_supported(dialect_name):
+        return []
+    increments = UsageIncrements()
+    increments.add(items)
+    return increments.statements(dialect_name)
+
+
+def record_usage(connection: Connection, items: Iterable[UsageItem]) -> None:
+    """
+    Add consultations to the usage counts within the caller's transaction
+    """
+    for statement, params in increment_statements(connection.dialect.name, items):
+        connection.execute(statement, params)
+
+
+def _month_expression(dialect_name: str, column):
+    if dialect_name == "sqlite":
+        return func.date(column, "start of month")
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc("month", column), Date)
+    raise NotImplementedError(f"Diagnosis usage is not supported on {dialect_name}")
+
+
+def rebuild_usage(connection: Connection) -> None:
+    """
+    Recompute both usage tables from consultation_diagnoses
+    """
+    usage = models.DiagnosisUsage.__table__
+    usage_monthly = models.DiagnosisUsageMonthly.__table__
+    links = models.consultation_diagnoses
+    consultations = models.Consultation.__table__
+    month = _month_expression(connection.dialect.name, consultations.c.consultation_date)
+
+    connection.execute(delete(usage_monthly))
+    connection.execute(delete(usage))
+    connection.execute(insert(usage).from_select(
+        ["diagnosis_code_id", "consultation_count"],
+        select(links.c.diagnosis_code_id, func.count())
+        .where(links.c.diagnosis_code_id.is_not(None))
+        .group_by(links.c.diagnosis_code_id)
+    ))
+    connection.execute(insert(usage_monthly).from_select(
+        ["month", "diagnosis_code_id", "consultation_count"],
+        select(month, links.c.diagnosis_code_id, func.count())
+        .join(consultations, consultations.c.id == links.c.consultation_id)
+        .where(links.c.diagnosis_code_id.is_not(None))
+        .group_by(month, links.c.diagnosis_code_id)
+    ))
+
+
+class UsageCounts:
+    """
+    Process-local copy of the all-time usage counts, reloaded when they change
+    """
+
+    def __init__(self, refresh_seconds: float = USAGE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.boosts: Dict[int, float] = {}
+        self.version: Optional[str] = None
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Reload the counts if never loaded or if they changed since the last check
+
+        Like the diagnosis search index, a caller that finds a reload in progress
+        keeps using the current counts instead of waiting.
+        """
+        if self._signature is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            table = models.DiagnosisUsage.__table__
+            signature = tuple(db.execute(
+                select(func.count(), func.coalesce(func.sum(table.c.consultation_count), 0))
+            ).one())
+            if signature != self._signature:
+                counts = db.execute(select(table.c.diagnosis_code_id, table.c.consultation_count)).all()
+                self.boosts = _boosts(counts)
+                self._signature = signature
+                self.version = f"{signature[0]}-{signature[1]}"
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+
+def _boosts(counts: Iterable[Tuple[int, int]]) -> Dict[int, float]:
+    """
+    Log-scaled boost per code: POPULARITY_BOOST for the most used code, 0 for unused codes
+    """
+    counts = [(code_id, count) for code_id, count in counts if count > 0]
+    if not counts:
+        return {}
+    scale = POPULARITY_BOOST / math.log1p(max(count for _, count in counts))
+    return {code_id: round(scale * math.log1p(count), 3) for code_id, count in counts}
+
+
+# Shared counts for this process
+usage_counts = UsageCounts()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage precomputed diagnosis usage counts")
+    parser.add_argument("command", choices=["rebuild"], help="recompute the counts from consultation_diagnoses")
+    parser.parse_args(argv)
+
+    with engine.begin() as connection:
+        rebuild_usage(connection)
+        codes = connection.execute(select(func.count()).select_from(models.DiagnosisUsage)).scalar()
+        months = connection.execute(select(func.count()).select_from(models.DiagnosisUsageMonthly)).scalar()
+    print(f"Diagnosis usage rebuilt: {codes} codes, {months} code-months")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
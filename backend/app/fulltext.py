@@ -0,0 +1,210 @@
+"""
+Full-text index over consultation notes
+
+- SQLite: an external-content FTS5 table (consultations_fts) kept in sync by
+  insert/update/delete triggers, ranked with bm25() and snippet()
+- PostgreSQL: a stored generated tsvector column (notes_tsv) with a GIN index,
+  queried with websearch_to_tsquery and ranked with ts_rank/ts_headline; the
+  vectors are computed once per write instead of for every ranked row
+
+The index is created alongside the tables (ensure_fulltext_index) and can be
+rebuilt from the notes at any time:
+
+    python -m app.fulltext rebuild
+"""
+from typing import List, Optional
+import argparse
+import re
+import sys
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+
+from .database import Base, engine
+
+FTS_TABLE = "consultations_fts"
+POSTGRES_COLUMN = "notes_tsv"
+POSTGRES_INDEX = "ix_consultations_notes_tsv"
+# Expression index used before the generated column (migration 0007 replaces it)
+_POSTGRES_LEGACY_INDEX = "ix_consultations_notes_fts"
+# The index expression and the queries must use the same configuration
+POSTGRES_TEXT_SEARCH_CONFIG = "english"
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_WORDS = 16
+_POSTGRES_HEADLINE_OPTIONS = f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={SNIPPET_WORDS}, MinWords=5"
+
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        notes,
+        content='consultations',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF notes ON consultations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+]
+
+# The generated column is not in the models: the ORM never reads or writes it
+_POSTGRES_DDL = [
+    f"""
+    ALTER TABLE consultations ADD COLUMN IF NOT EXISTS {POSTGRES_COLUMN} tsvector
+    GENERATED ALWAYS AS (to_tsvector('{POSTGRES_TEXT_SEARCH_CONFIG}', notes)) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON consultations USING gin ({POSTGRES_COLUMN})",
+    f"DROP INDEX IF EXISTS {_POSTGRES_LEGACY_INDEX}",
+]
+
+_SQLITE_SEARCH = text(f"""
+    SELECT {FTS_TABLE}.rowid AS id,
+           -bm25({FTS_TABLE}) AS score,
+           snippet({FTS_TABLE}, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', {SNIPPET_WORDS}) AS snippet
+    FROM {FTS_TABLE}
+    WHERE {FTS_TABLE} MATCH :query
+    ORDER BY bm25({FTS_TABLE}), {FTS_TABLE}.rowid DESC
+    LIMIT :limit
+""")
+
+# Rank every match via the index, but build headlines only for the returned page
+_POSTGRES_SEARCH = text(f"""
+    WITH query AS (
+        SELECT websearch_to_tsquery('{POSTGRES_TEXT_SEARCH_CONFIG}', :query) AS q
+    ),
+    ranked AS (
+        SELECT c.id, c.notes, ts_rank(c.{POSTGRES_COLUMN}, query.q) AS score
+        FROM consultations c, query
+        WHERE c.{POSTGRES_COLUMN} @@ query.q
+        ORDER BY score DESC, c.id DESC
+        LIMIT :limit
+    )
+    SELECT ranked.id,
+           ranked.score,
+           ts_headline('{POSTGRES_TEXT_SEARCH_CONFIG}', ranked.notes, query.q, '{_POSTGRES_HEADLINE_OPTIONS}') AS snippet
+    FROM ranked, query
+    ORDER BY ranked.score DESC, ranked.id DESC
+""")
+
+_FTS5_TOKEN = re.compile(r'"[^"]*"|\S+')
+_FTS5_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported(dialect_name: str) -> bool:
+    return dialect_name in ("sqlite", "postgresql")
+
+
+def to_fts5_query(search: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: every word must match, "quoted
+    phrases" match as phrases and a trailing * matches a prefix. FTS5 operators
+    in the input are treated as plain words, so user input cannot cause syntax errors.
+    """
+    terms: List[str] = []
+    for token in _FTS5_TOKEN.findall(search):
+        if token.startswith('"') and token.endswith('"') and len(token) > 1:
+            words = _FTS5_WORD.findall(token[1:-1])
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        words = [f'"{word}"' for word in _FTS5_WORD.findall(token)]
+        if words and token.endswith("*"):
+            words[-1] += "*"
+        terms.extend(words)
+    return " ".join(terms) or None
+
+
+def search_statement(dialect_name: str, search: str, limit: int):
+    """
+    Statement and parameters returning (id, score, snippet) for the best
+    matches, highest score first; None if the search has no usable terms
+    """
+    params = {"limit": limit}
+    if dialect_name == "sqlite":
+        query = to_fts5_query(search)
+        if query is None:
+            return None
+        return _SQLITE_SEARCH, {**params, "query": query}
+    if dialect_name == "postgresql":
+        if not _FTS5_WORD.search(search):
+            return None
+        return _POSTGRES_SEARCH, {**params, "query": search}
+    raise NotImplementedError(f"Full-text search is not supported on {dialect_name}")
+
+
+def ensure_fulltext_index(connection: Connection) -> None:
+    """
+    Create the full-text index if it is missing (idempotent)
+
+    A newly created SQLite FTS table is filled from the existing notes.
+    """
+    dialect_name = connection.dialect.name
+    if dialect_name == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect_name == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def rebuild_fulltext_index(connection: Connection) -> None:
+    """
+    Recreate the index contents from consultations.notes
+    """
+    ensure_fulltext_index(connection)
+    dialect_name = connection.dialect.name
+    if dialect_name == "sqlite":
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    elif dialect_name == "postgresql":
+        connection.execute(text(f"REINDEX INDEX {POSTGRES_INDEX}"))
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect_name}")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_fulltext_index(target, connection, **kw):
+    """
+    Create the index whenever the tables are created with create_all
+    """
+    if is_supported(connection.dialect.name):
+        ensure_fulltext_index(connection)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the consultation notes full-text index")
+    parser.add_argument("command", choices=["create", "rebuild"], help="create if missing, or rebuild from the notes")
+    args = parser.parse_args(argv)
+
+    with engine.begin() as connection:
+        if args.command == "create":
+            ensure_fulltext_index(connection)
+        else:
+            rebuild_fulltext_index(connection)
+    print(f"Full-text index {'created' if args.command == 'create' else 'rebuilt'} ({engine.url.get_backend_name()})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+ICD-10-CM chapters
+
+Chapters are contiguous ranges of three-character categories (A00-B99,
+C00-D49, ...), so a code's chapter is found by comparing its category with
+the range bounds. Codes outside every range (e.g. malformed or local codes)
+belong to UNCLASSIFIED_CHAPTER.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import case, func
+
+
+class Chapter(NamedTuple):
+    number: int
+    first: str
+    last: str
+    title: str
+
+
+# ICD-10-CM chapters in category order (so chapter 22, U00-U85, sits between 19 and 20)
+CHAPTERS: List[Chapter] = [
+    Chapter(1, "A00", "B99", "Certain infectious and parasitic diseases"),
+    Chapter(2, "C00", "D49", "Neoplasms"),
+    Chapter(3, "D50", "D89", "Diseases of the blood and blood-forming organs and certain disorders involving the immune mechanism"),
+    Chapter(4, "E00", "E89", "Endocrine, nutritional and metabolic diseases"),
+    Chapter(5, "F01", "F99", "Mental, behavioral and neurodevelopmental disorders"),
+    Chapter(6, "G00", "G99", "Diseases of the nervous system"),
+    Chapter(7, "H00", "H59", "Diseases of the eye and adnexa"),
+    Chapter(8, "H60", "H95", "Diseases of the ear and mastoid process"),
+    Chapter(9, "I00", "I99", "Diseases of the circulatory system"),
+    Chapter(10, "J00", "J99", "Diseases of the respiratory system"),
+    Chapter(11, "K00", "K95", "Diseases of the digestive system"),
+    Chapter(12, "L00", "L99", "Diseases of the skin and subcutaneous tissue"),
+    Chapter(13, "M00", "M99", "Diseases of the musculoskeletal system and connective tissue"),
+    Chapter(14, "N00", "N99", "Diseases of the genitourinary system"),
+    Chapter(15, "O00", "O9A", "Pregnancy, childbirth and the puerperium"),
+    Chapter(16, "P00", "P96", "Certain conditions originating in the perinatal period"),
+    Chapter(17, "Q00", "Q99", "Congenital malformations, deformations and chromosomal abnormalities"),
+    Chapter(18, "R00", "R99", "Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified"),
+    Chapter(19, "S00", "T88", "Injury, poisoning and certain other consequences of external causes"),
+    Chapter(22, "U00", "U85", "Codes for special purposes"),
+    Chapter(20, "V00", "Y99", "External causes of morbidity"),
+    Chapter(21, "Z00", "Z99", "Factors influencing health status and contact with health services"),
+]
+
+UNCLASSIFIED_CHAPTER = 0
+UNCLASSIFIED_TITLE = "Unclassified"
+
+_CHAPTER_STARTS = [chapter.first for chapter in CHAPTERS]
+_CHAPTERS_BY_NUMBER: Dict[int, Chapter] = {chapter.number: chapter for chapter in CHAPTERS}
+
+
+def category(code: str) -> str:
+    """
+    Three-character category of a code (E11.9 -> E11)
+    """
+    return code.strip().upper()[:3]
+
+
+@lru_cache(maxsize=16384)
+def chapter_for_code(code: str) -> int:
+    """
+    Chapter number of a diagnosis code, UNCLASSIFIED_CHAPTER if it is in no chapter
+
+    Cached: rollups look up the same popular codes over and over.
+    """
+    code_category = category(code)
+    position = bisect_right(_CHAPTER_STARTS, code_category) - 1
+    if position >= 0 and code_category <= CHAPTERS[position].last:
+        return CHAPTERS[position].number
+    return UNCLASSIFIED_CHAPTER
+
+
+def chapter_title(number: int) -> str:
+    chapter = _CHAPTERS_BY_NUMBER.get(number)
+    return chapter.title if chapter else UNCLASSIFIED_TITLE
+
+
+def chapter_range(number: int) -> Optional[str]:
+    """
+    Category range of a chapter ("A00-B99"), None when unclassified
+    """
+    chapter = _CHAPTERS_BY_NUMBER.get(number)
+    return f"{chapter.first}-{chapter.last}" if chapter else None
+
+
+def chapter_expression(code_column):
+    """
+    SQL CASE expression computing chapter_for_code on a code column (for set-based backfills)
+    """
+    code_category = func.upper(func.substr(func.trim(code_column), 1, 3))
+    return case(
+        *[
+            (code_category.between(chapter.first, chapter.last), chapter.number)
+            for chapter in CHAPTERS
+        ],
+        else_=UNCLASSIFIED_CHAPTER
+    )
@@ -0,0 +1,286 @@
+"""
+Per-request timing and SQL instrumentation
+
+TimingMiddleware measures every HTTP request; SQLAlchemy cursor events on
+both engines count statements and DB time for the request that issued them
+(tracked through a context variable, so it works for sync and async handlers).
+FastJSONResponse reports its serialization time the same way.
+
+Each request produces:
+- a Server-Timing header (total, handler, db with statement count, serialize)
+- a structured log line when it is slow or issues many statements (N+1)
+- an observation in a per-route latency histogram (see route_timings)
+
+Statements slower than SLOW_QUERY_MS are logged on their own.
+
+Configuration:
+- SERVER_TIMING: add the Server-Timing header (default false: it reveals
+  query counts and DB time to any client, so enable it for development only)
+- SLOW_REQUEST_MS: log requests slower than this (default 500)
+- REQUEST_QUERY_WARNING: log requests issuing more statements than this (default 25)
+- SLOW_QUERY_MS: log statements slower than this (default 200)
+"""
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+REQUEST_QUERY_WARNING = int(os.getenv("REQUEST_QUERY_WARNING", "25"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Latency bucket upper bounds in seconds (Prometheus client defaults plus 1ms and 2.5ms)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestTimings:
+    """
+    Timings collected for the current request
+    """
+    __slots__ = ("started", "db_statements", "db_seconds", "serialize_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """
+    Timings of the request being handled, or None outside a request
+    """
+    return _current.get()
+
+
+def record_serialization(seconds: float) -> None:
+    """
+    Add response rendering time to the current request
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.serialize_seconds += seconds
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (cumulative counts are derived on export)
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        (upper bound, observations <= bound) pairs, ending with +Inf
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation inside its bucket
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        # Beyond the last bucket: the best estimate is its bound
+        return self.buckets[-1]
+
+
+class RouteTimings:
+    """
+    Latency histogram and DB/serialization totals for one route
+    """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, timings: RequestTimings, status_code: int) -> None:
+        self.latency.observe(seconds)
+        self.db_statements += timings.db_statements
+        self.db_seconds += timings.db_seconds
+        self.serialize_seconds += timings.serialize_seconds
+        if status_code >= 500:
+            self.errors += 1
+
+    def summary(self) -> Dict:
+        count = self.latency.count
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(1000 * value, 2) if value is not None else None
+
+        return {
+            "count": count,
+            "errors": self.errors,
+            "avg_ms": ms(self.latency.sum / count) if count else None,
+            "p50_ms": ms(self.latency.quantile(0.50)),
+            "p95_ms": ms(self.latency.quantile(0.95)),
+            "p99_ms": ms(self.latency.quantile(0.99)),
+            "avg_db_statements": round(self.db_statements / count, 2) if count else None,
+            "avg_db_ms": ms(self.db_seconds / count) if count else None,
+            "avg_serialize_ms": ms(self.serialize_seconds / count) if count else None,
+        }
+
+
+# (method, route path template) -> timings
+route_timings: Dict[Tuple[str, str], RouteTimings] = {}
+
+
+def route_timings_summary() -> Dict[str, Dict]:
+    """
+    Per-route latency percentiles and average DB work, keyed "METHOD /path"
+    """
+    return {
+        f"{method} {path}": stats.summary()
+        for (method, path), stats in sorted(route_timings.items())
+    }
+
+
+def _route_path(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _server_timing(total: float, timings: RequestTimings) -> str:
+    handler = max(total - timings.serialize_seconds, 0.0)
+    return ", ".join([
+        f"total;dur={1000 * total:.2f}",
+        f"handler;dur={1000 * handler:.2f}",
+        f'db;dur={1000 * timings.db_seconds:.2f};desc="{timings.db_statements} queries"',
+        f"serialize;dur={1000 * timings.serialize_seconds:.2f}",
+    ])
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware (no extra task or body buffering, safe for streaming responses)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    total = time.perf_counter() - timings.started
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(total, timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - timings.started
+            key = (scope["method"], _route_path(scope))
+            stats = route_timings.get(key)
+            if stats is None:
+                stats = route_timings.setdefault(key, RouteTimings())
+            stats.observe(total, timings, status_code)
+
+            if 1000 * total >= SLOW_REQUEST_MS or timings.db_statements > REQUEST_QUERY_WARNING:
+                logger.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": key[0],
+                    "route": key[1],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round(1000 * total, 2),
+                    "db_statements": timings.db_statements,
+                    "db_ms": round(1000 * timings.db_seconds, 2),
+                    "serialize_ms": round(1000 * timings.serialize_seconds, 2),
+                }))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    elapsed = time.perf_counter() - started
+    timings = _current.get()
+    if timings is not None:
+        timings.db_statements += 1
+        timings.db_seconds += elapsed
+    if 1000 * elapsed >= SLOW_QUERY_MS:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(1000 * elapsed, 2),
+            "statement": " ".join(statement.split())[:500],
+            "executemany": executemany,
+        }))
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Count statements and DB time on a (sync) engine; idempotent
+    """
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
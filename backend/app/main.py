@@ -1,16 +1,86 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import hmac
+import logging
 import os
+import time
 
-from .database import engine, Base
-from .routers import diagnosis, consultation, auth_router
+from .database import engine, async_engine, Base, SessionLocal, get_async_db, log_pool_configuration, pool_status
+from . import fulltext  # noqa: F401  (creates the notes full-text index with the tables)
+from .instrumentation import TimingMiddleware, instrument_engine, route_timings_summary
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .routers import diagnosis, consultation, auth_router, analytics
+from .catalog import icd10_catalog
+from .dependencies import get_current_active_doctor
+from .models import Doctor
+from .search_index import diagnosis_index
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Schema handling at startup:
+# - create_all: create missing tables and indexes from the models (development default)
+# - migrate: run `alembic upgrade head` (single-process deployments)
+# - skip: no schema work at all; run `alembic upgrade head` as a deploy step instead
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "create_all").lower()
+ALEMBIC_CONFIG = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# Deep health check: give up on the database after this long
+HEALTH_DB_TIMEOUT_SECONDS = float(os.getenv("HEALTH_DB_TIMEOUT_SECONDS", "2"))
+
+# /metrics access: a bearer token (the scrape job's credentials) and/or client
+# addresses allowed without one. With neither set, /metrics refuses every request.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = {address.strip() for address in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if address.strip()}
+
+def prepare_schema(mode: str = DB_SCHEMA_MODE) -> None:
+    """
+    Bring the database schema up to date according to DB_SCHEMA_MODE
+    """
+    if mode == "skip":
+        return
+    if mode == "migrate":
+        from alembic import command
+        from alembic.config import Config
+        
+        config = Config(str(ALEMBIC_CONFIG))
+        config.set_main_option("script_location", str(ALEMBIC_CONFIG.parent / "alembic"))
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, "head")
+    elif mode == "create_all":
+        Base.metadata.create_all(bind=engine)
+    else:
+        raise ValueError(f"Unknown DB_SCHEMA_MODE {mode!r} (expected create_all, migrate or skip)")
+    logger.info("Database schema prepared (DB_SCHEMA_MODE=%s)", mode)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup/shutdown hooks
+    """
+    log_pool_configuration()
+    prepare_schema()
+    
+    # Load the diagnosis code search index into memory
+    db = SessionLocal()
+    try:
+        diagnosis_index.load(db)
+    finally:
+        db.close()
+    # Map (writing it first if no worker has yet) the ICD-10 catalog snapshot
+    icd10_catalog.ensure_current(diagnosis_index)
+    yield
+    await async_engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -18,7 +88,8 @@ app = FastAPI(
     description="A minimal Electronic Medical Records system for managing patient consultations and ICD-10 diagnosis codes with JWT authentication",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -32,10 +103,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request timing, SQL statement counting and slow request/query logs
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+app.add_middleware(TimingMiddleware)
+
 # Include routers
 app.include_router(auth_router.router, prefix="/api")
 app.include_router(diagnosis.router, prefix="/api")
 app.include_router(consultation.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
 
 @app.get("/")
 def read_root():
@@ -49,8 +126,59 @@ def read_root():
     }
 
 @app.get("/api/health")
-def health_check():
+async def health_check(deep: bool = False, db: AsyncSession = Depends(get_async_db)):
     """
     Health check endpoint
+    
+    - **deep**: Also run a query against the database and report its latency,
+      pool usage and the diagnosis index; answers 503 if the database is unreachable
+    """
+    if not deep:
+        return {"status": "healthy"}
+    
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.execute(text("SELECT 1")), timeout=HEALTH_DB_TIMEOUT_SECONDS)
+        database = {"status": "ok", "latency_ms": round(1000 * (time.perf_counter() - started), 2)}
+    except Exception as e:
+        database = {"status": "error", "error": str(e) or type(e).__name__}
+    
+    healthy = database["status"] == "ok"
+    body = {
+        "status": "healthy" if healthy else "unhealthy",
+        "checks": {
+            "database": {**database, "pool": pool_status(async_engine.sync_engine)},
+            "diagnosis_index": {"codes": len(diagnosis_index), "version": diagnosis_index.catalog_version},
+            "icd10_catalog": {"entries": len(icd10_catalog), "version": icd10_catalog.version}
+        }
+    }
+    return JSONResponse(body, status_code=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@app.get("/api/timings")
+def request_timings(current_doctor: Doctor = Depends(get_current_active_doctor)):
+    """
+    Per-route latency percentiles and average SQL statements / DB time per request (requires authentication)
+    """
+    return route_timings_summary()
+
+def require_metrics_access(request: Request) -> None:
+    """
+    Allow the scrape when the client address is allow-listed or it sends the metrics bearer token
+    """
+    if request.client is not None and request.client.host in METRICS_ALLOWED_IPS:
+        return
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if METRICS_TOKEN and scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Metrics require the metrics bearer token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+def metrics():
+    """
+    Prometheus metrics (text exposition format), for METRICS_TOKEN holders and METRICS_ALLOWED_IPS
     """
-    return {"status": "healthy"}
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
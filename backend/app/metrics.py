@@ -0,0 +1,156 @@
+"""
+Prometheus text exposition (format 0.0.4) for GET /metrics
+
+Everything is rendered from counters the app already keeps in-process
+(instrumentation route timings, pool status, bcrypt durations, cache stats),
+so no client library or outside service is needed. Counters are per worker
+process; Prometheus sums them across scrape targets.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import auth
+from .database import async_engine, engine, pool_status
+from .dependencies import doctor_cache, token_cache
+from .instrumentation import Histogram, route_timings
+from .search_cache import search_cache
+from .search_index import diagnosis_index
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Dict[str, str]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Optional[Labels]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str, samples: Iterable[Tuple[Optional[Labels], float]]) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name: str, help_text: str, histograms: Iterable[Tuple[Labels, Histogram]]) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in histograms:
+            for bound, count in histogram.cumulative():
+                self.lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {count}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            self.lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def router_name(route_path: str) -> str:
+    """
+    Router a route belongs to: /api/diagnosis/chapters -> diagnosis, /api/health -> app
+    """
+    parts = route_path.strip("/").split("/")
+    if len(parts) >= 2 and parts[0] == "api" and parts[1] in ("auth", "diagnosis", "consultation", "analytics"):
+        return parts[1]
+    return "app"
+
+
+def _route_metrics(writer: _Writer) -> None:
+    routes = sorted(route_timings.items())
+
+    def route_labels(method: str, path: str) -> Labels:
+        return {"router": router_name(path), "method": method, "route": path}
+
+    writer.family(
+        "emr_http_requests_total", "counter", "HTTP requests handled, by route",
+        ((route_labels(method, path), stats.latency.count) for (method, path), stats in routes)
+    )
+    writer.family(
+        "emr_http_request_errors_total", "counter", "HTTP requests answered with a 5xx status, by route",
+        ((route_labels(method, path), stats.errors) for (method, path), stats in routes)
+    )
+    writer.histogram(
+        "emr_http_request_duration_seconds", "HTTP request latency, by route",
+        ((route_labels(method, path), stats.latency) for (method, path), stats in routes)
+    )
+    writer.family(
+        "emr_db_statements_total", "counter", "SQL statements issued while handling requests, by route",
+        ((route_labels(method, path), stats.db_statements) for (method, path), stats in routes)
+    )
+    writer.family(
+        "emr_db_seconds_total", "counter", "Time spent in SQL statements while handling requests, by route",
+        ((route_labels(method, path), stats.db_seconds) for (method, path), stats in routes)
+    )
+
+
+def _pool_metrics(writer: _Writer) -> None:
+    pools = [("sync", pool_status(engine)), ("async", pool_status(async_engine.sync_engine))]
+    for field, help_text in (
+        ("checked_out", "Connections currently checked out of the pool"),
+        ("checked_in", "Idle connections held by the pool"),
+        ("overflow", "Connections opened beyond pool_size"),
+        ("size", "Configured pool_size"),
+    ):
+        writer.family(
+            f"emr_db_pool_{field}", "gauge", help_text,
+            (({"engine": name}, status[field]) for name, status in pools if field in status)
+        )
+
+
+def _auth_metrics(writer: _Writer) -> None:
+    writer.histogram(
+        "emr_password_hash_duration_seconds", "Time spent in bcrypt, by operation (excluding queue wait)",
+        (({"operation": operation}, histogram) for operation, histogram in sorted(auth.password_hash_durations.items()))
+    )
+    writer.family(
+        "emr_password_hash_pending", "gauge", "Password hashing jobs queued or running",
+        [(None, auth.pending_password_hashes())]
+    )
+
+
+def _cache_metrics(writer: _Writer) -> None:
+    caches = [
+        ("diagnosis_search", search_cache.stats()),
+        ("auth_tokens", token_cache.stats()),
+        ("auth_doctors", doctor_cache.stats()),
+    ]
+    writer.family("emr_cache_hits_total", "counter", "Cache hits", (({"cache": name}, stats["hits"]) for name, stats in caches))
+    writer.family("emr_cache_misses_total", "counter", "Cache misses", (({"cache": name}, stats["misses"]) for name, stats in caches))
+    writer.family(
+        "emr_cache_hit_ratio", "gauge", "Cache hits / lookups since start",
+        (({"cache": name}, float(stats["hit_ratio"])) for name, stats in caches)
+    )
+    writer.family(
+        "emr_cache_entries", "gauge", "Entries held by in-process caches",
+        (({"cache": name}, stats["size"]) for name, stats in caches if "size" in stats)
+    )
+    writer.family(
+        "emr_diagnosis_index_codes", "gauge", "Diagnosis codes loaded in the in-memory search index",
+        [(None, len(diagnosis_index))]
+    )
+
+
+def render_metrics() -> str:
+    """
+    All metrics in Prometheus text format
+    """
+    writer = _Writer()
+    _route_metrics(writer)
+    _pool_metrics(writer)
+    _auth_metrics(writer)
+    _cache_metrics(writer)
+    return writer.render()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Boolean
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, Date, DateTime, ForeignKey, Table, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -8,7 +8,11 @@ consultation_diagnoses = Table(
     'consultation_diagnoses',
     Base.metadata,
     Column('consultation_id', Integer, ForeignKey('consultations.id', ondelete='CASCADE')),
-    Column('diagnosis_code_id', Integer, ForeignKey('diagnosis_codes.id', ondelete='CASCADE'))
+    Column('diagnosis_code_id', Integer, ForeignKey('diagnosis_codes.id', ondelete='CASCADE')),
+    # Codes of a page of consultations (list, detail, export) without scanning the table
+    Index("ix_consultation_diagnoses_consultation_id", "consultation_id"),
+    # Consultations per code (usage and rollup rebuilds, code deletes)
+    Index("ix_consultation_diagnoses_diagnosis_code_id", "diagnosis_code_id"),
 )
 
 class Doctor(Base):
@@ -44,6 +48,8 @@ class Consultation(Base):
     consultation_date = Column(DateTime, nullable=False, default=datetime.utcnow)
     notes = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Doctor who recorded the consultation (unknown for rows created before it was tracked)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='SET NULL'), nullable=True, index=True)
     
     # Relationship
     diagnosis_codes = relationship(
@@ -51,3 +57,76 @@ class Consultation(Base):
         secondary=consultation_diagnoses,
         back_populates="consultations"
     )
+    
+    __table_args__ = (
+        # Supports newest-first listing and keyset pagination on (consultation_date, id)
+        Index("ix_consultations_date_id", "consultation_date", "id"),
+        # Supports case-insensitive patient name prefix filters (text_pattern_ops:
+        # byte-order range scans on PostgreSQL regardless of the database collation)
+        Index(
+            "ix_consultations_patient_name_lower_date",
+            func.lower(patient_name).label("patient_name_lower"),
+            consultation_date,
+            postgresql_ops={"patient_name_lower": "text_pattern_ops"}
+        ),
+    )
+
+class DiagnosisUsage(Base):
+    __tablename__ = "diagnosis_usage"
+    
+    # All-time number of consultations per diagnosis code (see app/diagnosis_usage.py)
+    diagnosis_code_id = Column(Integer, ForeignKey('diagnosis_codes.id', ondelete='CASCADE'), primary_key=True)
+    consultation_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_diagnosis_usage_consultation_count", "consultation_count"),
+    )
+
+class DiagnosisUsageMonthly(Base):
+    __tablename__ = "diagnosis_usage_monthly"
+    
+    # Consultations per diagnosis code per month (first day) of the consultation date
+    month = Column(Date, primary_key=True)
+    diagnosis_code_id = Column(Integer, ForeignKey('diagnosis_codes.id', ondelete='CASCADE'), primary_key=True)
+    consultation_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Top codes of a month without sorting all of its rows
+        Index("ix_diagnosis_usage_monthly_month_count", "month", "consultation_count"),
+    )
+
+class ConsultationDailyStats(Base):
+    __tablename__ = "consultation_daily_stats"
+    
+    # Consultations per day of the consultation date (see app/analytics.py), split
+    # over a few shard rows per day so concurrent inserts do not queue on one row
+    day = Column(Date, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0, server_default="0")
+    consultation_count = Column(Integer, nullable=False, default=0)
+
+class ConsultationDailyDoctorStats(Base):
+    __tablename__ = "consultation_daily_doctor_stats"
+    
+    # Consultations per day per recording doctor (consultations without a doctor are not counted)
+    day = Column(Date, primary_key=True)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), primary_key=True)
+    consultation_count = Column(Integer, nullable=False, default=0)
+
+class ConsultationDailyChapterStats(Base):
+    __tablename__ = "consultation_daily_chapter_stats"
+    
+    # Per day and ICD-10 chapter (app/icd10.py): consultations with at least one
+    # code in the chapter, and the number of such codes recorded (sharded like the daily stats)
+    day = Column(Date, primary_key=True)
+    chapter = Column(Integer, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0, server_default="0")
+    consultation_count = Column(Integer, nullable=False, default=0)
+    diagnosis_count = Column(Integer, nullable=False, default=0)
+
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+    
+    # One row per reference catalog; revision is bumped by every write to it
+    name = Column(String(50), primary_key=True)
+    revision = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
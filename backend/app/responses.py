@@ -0,0 +1,50 @@
+"""
+Fast JSON responses
+
+Handlers that already hold plain dicts/lists return FastJSONResponse directly,
+which skips FastAPI's response_model validation and jsonable_encoder pass.
+orjson is used when installed, with a compact stdlib json fallback.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+import json
+import time
+
+from fastapi.responses import JSONResponse
+
+from .instrumentation import record_serialization
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to JSON bytes (datetimes as ISO 8601, like pydantic)
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered straight from plain Python data
+    """
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = dumps(content)
+        record_serialization(time.perf_counter() - started)
+        return body
@@ -0,0 +1,139 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import os
+from .. import crud_async, icd10, models, schemas
+from ..database import get_async_db
+from ..dependencies import get_current_active_doctor
+from ..responses import FastJSONResponse
+
+load_dotenv()
+
+# Default and largest date ranges accepted by the analytics endpoints
+ANALYTICS_DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "30"))
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "3660"))
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"]
+)
+
+
+def _date_range(date_from: Optional[date], date_to: Optional[date]) -> Tuple[date, date]:
+    """
+    Resolve [date_from, date_to): date_to defaults to tomorrow, date_from to ANALYTICS_DEFAULT_DAYS before date_to
+    """
+    date_to = date_to or datetime.utcnow().date() + timedelta(days=1)
+    date_from = date_from or date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS)
+    if date_from >= date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must be before date_to")
+    if (date_to - date_from).days > ANALYTICS_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {ANALYTICS_MAX_DAYS} days"
+        )
+    return date_from, date_to
+
+
+@router.get("/daily", response_model=schemas.AnalyticsDailyResponse)
+async def get_daily_consultations(
+    date_from: Optional[date] = Query(None, description="First day (default: 30 days before date_to)"),
+    date_to: Optional[date] = Query(None, description="Day after the last one (default: tomorrow, UTC)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Consultations per day, including days without consultations.
+
+    - **date_from**: Inclusive start day (YYYY-MM-DD)
+    - **date_to**: Exclusive end day (YYYY-MM-DD)
+    """
+    date_from, date_to = _date_range(date_from, date_to)
+    try:
+        counts = await crud_async.get_daily_consultation_counts(db, date_from, date_to)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error loading consultation analytics: {str(e)}"
+        )
+
+    days = [
+        {"day": day, "consultations": counts.get(day, 0)}
+        for day in (date_from + timedelta(days=offset) for offset in range((date_to - date_from).days))
+    ]
+    return FastJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "total": sum(counts.values()),
+        "days": days
+    })
+
+
+@router.get("/doctors", response_model=schemas.AnalyticsDoctorsResponse)
+async def get_consultations_by_doctor(
+    date_from: Optional[date] = Query(None, description="First day (default: 30 days before date_to)"),
+    date_to: Optional[date] = Query(None, description="Day after the last one (default: tomorrow, UTC)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Consultations per recording doctor over the date range, most first.
+
+    Consultations recorded before doctors were tracked are not attributed to anyone.
+    """
+    date_from, date_to = _date_range(date_from, date_to)
+    try:
+        doctors = await crud_async.get_doctor_consultation_counts(db, date_from, date_to)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error loading consultation analytics: {str(e)}"
+        )
+
+    return FastJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "doctors": doctors
+    })
+
+
+@router.get("/chapters", response_model=schemas.AnalyticsChaptersResponse)
+async def get_consultations_by_chapter(
+    date_from: Optional[date] = Query(None, description="First day (default: 30 days before date_to)"),
+    date_to: Optional[date] = Query(None, description="Day after the last one (default: tomorrow, UTC)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Consultations and diagnoses per ICD-10 chapter over the date range.
+
+    - **consultations**: Consultations with at least one diagnosis in the chapter
+    - **diagnoses**: Diagnosis codes from the chapter attached to those consultations
+
+    Chapter 0 collects codes outside every ICD-10 chapter.
+    """
+    date_from, date_to = _date_range(date_from, date_to)
+    try:
+        rows = await crud_async.get_chapter_consultation_counts(db, date_from, date_to)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error loading consultation analytics: {str(e)}"
+        )
+
+    return FastJSONResponse({
+        "date_from": date_from,
+        "date_to": date_to,
+        "chapters": [
+            {
+                "chapter": chapter,
+                "range": icd10.chapter_range(chapter),
+                "title": icd10.chapter_title(chapter),
+                "consultations": consultations,
+                "diagnoses": diagnoses
+            }
+            for chapter, consultations, diagnoses in rows
+        ]
+    })
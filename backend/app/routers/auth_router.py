@@ -3,13 +3,13 @@ Authentication router for login, register, and user management
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import List
 
-from .. import models, schemas, auth
-from ..database import get_db
-from ..dependencies import get_current_active_doctor
+from .. import crud_async, models, schemas, auth
+from ..database import get_async_db
+from ..dependencies import get_current_active_doctor, auth_cache_stats
 
 router = APIRouter(
     prefix="/auth",
@@ -17,16 +17,43 @@ router = APIRouter(
 )
 
 
+def _hashing_unavailable() -> HTTPException:
+    """
+    503 returned when the password hashing pool is saturated
+    """
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _check_password(db: AsyncSession, doctor: models.Doctor, password: str) -> bool:
+    """
+    Verify a doctor's password off the request path, upgrading outdated hashes
+    """
+    try:
+        valid, new_hash = await auth.verify_password_async(password, doctor.hashed_password)
+    except auth.PasswordHasherBusy:
+        raise _hashing_unavailable()
+    
+    if valid and new_hash:
+        doctor.hashed_password = new_hash
+        await db.commit()
+    
+    return valid
+
+
 @router.post("/register", response_model=schemas.DoctorResponse, status_code=status.HTTP_201_CREATED)
-def register_doctor(
+async def register_doctor(
     doctor: schemas.DoctorCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new doctor account
     """
     # Check if username already exists
-    db_doctor = db.query(models.Doctor).filter(models.Doctor.username == doctor.username).first()
+    db_doctor = await crud_async.get_doctor_by_username(db, doctor.username)
     if db_doctor:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -34,7 +61,7 @@ def register_doctor(
         )
     
     # Check if email already exists
-    db_doctor = db.query(models.Doctor).filter(models.Doctor.email == doctor.email).first()
+    db_doctor = await crud_async.get_doctor_by_email(db, doctor.email)
     if db_doctor:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -42,7 +69,10 @@ def register_doctor(
         )
     
     # Create new doctor
-    hashed_password = auth.get_password_hash(doctor.password)
+    try:
+        hashed_password = await auth.get_password_hash_async(doctor.password)
+    except auth.PasswordHasherBusy:
+        raise _hashing_unavailable()
     new_doctor = models.Doctor(
         username=doctor.username,
         email=doctor.email,
@@ -52,8 +82,7 @@ def register_doctor(
     )
     
     db.add(new_doctor)
-    db.commit()
-    db.refresh(new_doctor)
+    await db.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -70,16 +99,16 @@ def register_doctor(
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login with username and password to get JWT token
     OAuth2 compatible endpoint (uses form data)
     """
     # Find doctor by username
-    doctor = db.query(models.Doctor).filter(models.Doctor.username == form_data.username).first()
+    doctor = await crud_async.get_doctor_by_username(db, form_data.username)
     
     if not doctor:
         raise HTTPException(
@@ -89,7 +118,7 @@ def login(
         )
     
     # Verify password
-    if not auth.verify_password(form_data.password, doctor.hashed_password):
+    if not await _check_password(db, doctor, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -117,16 +146,16 @@ def login(
 
 
 @router.post("/login-json", response_model=schemas.DoctorResponse)
-def login_json(
+async def login_json(
     credentials: schemas.DoctorLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login with JSON payload (alternative to form data)
     Returns doctor info along with token
     """
     # Find doctor by username
-    doctor = db.query(models.Doctor).filter(models.Doctor.username == credentials.username).first()
+    doctor = await crud_async.get_doctor_by_username(db, credentials.username)
     
     if not doctor:
         raise HTTPException(
@@ -135,7 +164,7 @@ def login_json(
         )
     
     # Verify password
-    if not auth.verify_password(credentials.password, doctor.hashed_password):
+    if not await _check_password(db, doctor, credentials.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -163,7 +192,7 @@ def login_json(
 
 
 @router.get("/me", response_model=schemas.Doctor)
-def get_current_user(
+async def get_current_user(
     current_doctor: models.Doctor = Depends(get_current_active_doctor)
 ):
     """
@@ -173,12 +202,22 @@ def get_current_user(
 
 
 @router.get("/doctors", response_model=List[schemas.Doctor])
-def list_doctors(
-    db: Session = Depends(get_db),
+async def list_doctors(
+    db: AsyncSession = Depends(get_async_db),
     current_doctor: models.Doctor = Depends(get_current_active_doctor)
 ):
     """
     List all doctors (requires authentication)
     """
-    doctors = db.query(models.Doctor).all()
+    doctors = await crud_async.get_doctors(db)
     return doctors
+
+
+@router.get("/cache-stats")
+async def get_auth_cache_stats(
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Hit/miss counters for the token and doctor caches (requires authentication)
+    """
+    return auth_cache_stats()
@@ -1,9 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, models
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Literal, Optional
+from datetime import datetime
+from dotenv import load_dotenv
+import csv
+import io
+import logging
+import os
+from .. import crud, crud_async, schemas, models
+from ..database import AsyncSessionLocal, get_async_db
 from ..dependencies import get_current_active_doctor
+from ..responses import FastJSONResponse, dumps
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per server-side cursor round trip during exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8"
+}
+EXPORT_CSV_COLUMNS = ["id", "patient_name", "consultation_date", "notes", "created_at", "diagnosis_codes"]
 
 router = APIRouter(
     prefix="/consultation",
@@ -11,9 +32,9 @@ router = APIRouter(
 )
 
 @router.post("", response_model=schemas.Consultation, status_code=status.HTTP_201_CREATED)
-def create_consultation(
+async def create_consultation(
     consultation: schemas.ConsultationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_doctor: models.Doctor = Depends(get_current_active_doctor)
 ):
     """
@@ -22,24 +43,22 @@ def create_consultation(
     - **patient_name**: Patient's full name (required)
     - **consultation_date**: Date and time of consultation (required)
     - **notes**: Consultation notes/observations (required)
-    - **diagnosis_code_ids**: List of diagnosis code IDs (at least one required)
+    - **diagnosis_code_ids**: List of unique diagnosis code IDs (at least one required)
+    
+    Unknown IDs (404) or repeated IDs (422) are all reported in a single error.
     """
     try:
-        # Validate that all diagnosis codes exist
-        for code_id in consultation.diagnosis_code_ids:
-            diagnosis_code = crud.get_diagnosis_code_by_id(db, code_id)
-            if not diagnosis_code:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Diagnosis code with ID {code_id} not found"
-                )
-        
-        # Create the consultation
-        db_consultation = crud.create_consultation(db, consultation)
+        # Create the consultation (diagnosis codes are validated in the same lookup)
+        db_consultation = await crud_async.create_consultation(db, consultation, doctor_id=current_doctor.id)
         return db_consultation
     
     except HTTPException:
         raise
+    except crud.InvalidDiagnosisCodes as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND if e.missing else status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     except Exception as e:
@@ -48,45 +67,225 @@ def create_consultation(
             detail=f"Error creating consultation: {str(e)}"
         )
 
+@router.post("/batch", response_model=schemas.ConsultationBatchResponse, response_model_exclude_none=True, status_code=status.HTTP_201_CREATED)
+async def create_consultations_batch(
+    batch: schemas.ConsultationBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Create many consultation notes in one request (e.g. migrations or offline sync).
+    
+    - **consultations**: List of consultations, same fields as `POST /consultation`
+    - **atomic**: If true, nothing is created unless every item is valid
+    
+    Returns a result per item (by index) with the new ID or the error. Invalid
+    items get the message and `status_code` a single create would return
+    (404 unknown IDs, 422 repeated IDs).
+    """
+    try:
+        results = await crud_async.create_consultations_batch(
+            db, batch.consultations, atomic=batch.atomic, doctor_id=current_doctor.id
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating consultations: {str(e)}"
+        )
+    
+    created = sum(1 for result in results if result["status"] == "created")
+    if batch.atomic and created != len(results):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[result for result in results if result["status"] == "error"]
+        )
+    
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
 @router.get("", response_model=schemas.ConsultationListResponse)
-def get_consultations(
+async def get_consultations(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    count: Literal["exact", "estimate", "none"] = Query("exact", description="How to compute total"),
+    patient_name: Optional[str] = Query(None, max_length=255, description="Case-insensitive patient name prefix"),
+    date_from: Optional[datetime] = Query(None, description="Only consultations on or after this date"),
+    date_to: Optional[datetime] = Query(None, description="Only consultations before this date"),
+    db: AsyncSession = Depends(get_async_db),
     current_doctor: models.Doctor = Depends(get_current_active_doctor)
 ):
     """
     Get all consultation notes, ordered by consultation date (newest first).
     
-    - **skip**: Number of records to skip (for pagination)
+    - **skip**: Number of records to skip (for pagination, ignored when a cursor is given)
     - **limit**: Maximum number of records to return
+    - **cursor**: Continue after the last item of a previous page; stable while rows are inserted.
+      Each page is a range read on ix_consultations_date_id plus a code lookup on
+      ix_consultation_diagnoses_consultation_id, so later pages are no slower than the first
+    - **count**: `exact` counts all rows, `estimate` uses cheap table statistics, `none` omits total
+    - **patient_name**: Only patients whose name starts with this (case and extra spaces ignored)
+    - **date_from** / **date_to**: Inclusive / exclusive bounds on consultation_date
+    
+    Filters combine with both pagination styles and are served by indexes.
+    With a filter, `estimate` is counted exactly (the count uses the same index).
     """
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must be earlier than date_to"
+        )
+    
+    filters = {"patient_name": patient_name, "date_from": date_from, "date_to": date_to}
+    filtered = any(value is not None for value in filters.values())
     try:
-        consultations = crud.get_consultations(db, skip=skip, limit=limit)
-        total = crud.get_consultations_count(db)
-        return {
+        after = crud.decode_consultation_cursor(cursor) if cursor else None
+        # Rows come back as plain dicts and are serialized directly (no ORM objects,
+        # no second validation pass against response_model)
+        consultations = await crud_async.get_consultation_rows(db, skip=skip, limit=limit, after=after, **filters)
+        
+        if count == "exact" or (count == "estimate" and filtered):
+            total = await crud_async.get_consultations_count(db, **filters)
+        elif count == "estimate":
+            total = await crud_async.estimate_consultations_count(db)
+        else:
+            total = None
+        
+        next_cursor = None
+        if consultations and len(consultations) == limit:
+            last = consultations[-1]
+            next_cursor = crud.encode_consultation_cursor(last["consultation_date"], last["id"])
+        
+        return FastJSONResponse({
             "consultations": consultations,
-            "total": total
-        }
+            "total": total,
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving consultations: {str(e)}"
         )
 
+@router.get("/search", response_model=schemas.ConsultationSearchResponse)
+async def search_consultations(
+    q: str = Query(..., min_length=1, description="Words to find in consultation notes"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Full-text search over consultation notes, best match first.
+    
+    - **q**: All words must appear (stemmed, case-insensitive); `"quoted phrases"` match as a phrase, `word*` matches a prefix
+    - **limit**: Maximum number of results
+    
+    Each result includes a relevance `score` and a `snippet` of the note with the
+    matches wrapped in `<mark>` tags (the note text itself is not HTML-escaped).
+    """
+    try:
+        results = await crud_async.search_consultation_notes(db, q, limit=limit)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching consultations: {str(e)}"
+        )
+    return FastJSONResponse({"results": results})
+
+async def _export_chunks(
+    export_format: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime]
+) -> AsyncIterator[bytes]:
+    """
+    Encode consultations chunk by chunk as NDJSON lines or CSV rows
+    
+    Uses its own session: request-scoped dependencies are closed before a
+    streaming body is sent
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_CSV_COLUMNS)
+                yield buffer.getvalue().encode("utf-8")
+            
+            async for rows in crud_async.stream_consultation_rows(
+                db, date_from=date_from, date_to=date_to, chunk_size=EXPORT_CHUNK_SIZE
+            ):
+                if export_format == "ndjson":
+                    yield b"".join(dumps(row) + b"\n" for row in rows)
+                    continue
+                
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(
+                    [
+                        row["id"],
+                        row["patient_name"],
+                        row["consultation_date"].isoformat(),
+                        row["notes"],
+                        row["created_at"].isoformat() if row["created_at"] else "",
+                        ";".join(code["code"] for code in row["diagnosis_codes"])
+                    ]
+                    for row in rows
+                )
+                yield buffer.getvalue().encode("utf-8")
+        except Exception:
+            # Headers are already sent, so the only signal left is a truncated body
+            logger.exception("Consultation export failed")
+            raise
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_consultations(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson (one consultation per line) or csv"),
+    date_from: Optional[datetime] = Query(None, description="Only consultations on or after this date"),
+    date_to: Optional[datetime] = Query(None, description="Only consultations before this date"),
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Stream every consultation with its diagnosis codes, ordered by consultation date (oldest first).
+    
+    - **format**: `ndjson` (same fields as `GET /consultation/{id}`) or `csv` (diagnosis codes joined with `;`)
+    - **date_from**: Inclusive lower bound on consultation_date
+    - **date_to**: Exclusive upper bound on consultation_date
+    
+    Rows are read through a server-side cursor, so memory stays flat regardless of table size.
+    """
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must be earlier than date_to"
+        )
+    
+    return StreamingResponse(
+        _export_chunks(format, date_from, date_to),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="consultations.{format}"'}
+    )
+
 @router.get("/{consultation_id}", response_model=schemas.Consultation)
-def get_consultation(
+async def get_consultation(
     consultation_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_doctor: models.Doctor = Depends(get_current_active_doctor)
 ):
     """
     Get a specific consultation by ID.
     """
-    consultation = crud.get_consultation_by_id(db, consultation_id)
+    consultation = await crud_async.get_consultation_row_by_id(db, consultation_id)
     if not consultation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Consultation with ID {consultation_id} not found"
         )
-    return consultation
+    return FastJSONResponse(consultation)
@@ -1,31 +1,271 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Optional
-from .. import crud, schemas
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Literal, Optional
+from dotenv import load_dotenv
+import os
+from .. import crud_async, icd10, models, schemas
+from ..catalog import CatalogCode, ChapterSummary, icd10_catalog
+from ..database import get_async_db
+from ..dependencies import get_current_active_doctor
+from ..responses import FastJSONResponse
+from ..search_cache import search_cache
+from ..search_index import diagnosis_index
+
+load_dotenv()
+
+# HTTP caching for diagnosis search and the ICD-10 hierarchy (reference data that only changes on reseed)
+DIAGNOSIS_CACHE_MAX_AGE = int(os.getenv("DIAGNOSIS_CACHE_MAX_AGE", "300"))
+DIAGNOSIS_CATALOG_MAX_AGE = int(os.getenv("DIAGNOSIS_CATALOG_MAX_AGE", "3600"))
+# Usage-based responses (popular codes, boosted search) are only briefly cacheable
+DIAGNOSIS_POPULAR_MAX_AGE = int(os.getenv("DIAGNOSIS_POPULAR_MAX_AGE", "60"))
 
 router = APIRouter(
     prefix="/diagnosis",
     tags=["diagnosis"]
 )
 
-@router.get("", response_model=schemas.DiagnosisSearchResponse)
-def search_diagnosis_codes(
+def _etag() -> str:
+    """
+    Strong ETag for catalog-derived responses: identical catalog, identical bytes per URL
+    """
+    return f'"{diagnosis_index.catalog_version}"'
+
+
+def _cache_headers(response: Response, etag: str, max_age: int) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, stale-while-revalidate={max_age}"
+
+
+def _not_modified(request: Request, etag: str, max_age: int) -> Optional[Response]:
+    """
+    Return a 304 response when the client already holds the current representation
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in candidates or etag in candidates:
+        response = Response(status_code=304)
+        _cache_headers(response, etag, max_age)
+        return response
+    return None
+
+
+@router.get("", response_model=schemas.DiagnosisSearchResponse, response_model_exclude_none=True)
+async def search_diagnosis_codes(
+    request: Request,
     search: Optional[str] = Query(None, description="Search term for diagnosis code or description"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    ranked: bool = Query(False, description="Order results by relevance and include scores"),
+    popular: bool = Query(False, description="Boost frequently used codes (implies ranked)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Search for ICD-10 diagnosis codes by code or description.
     
     - **search**: Optional search term (searches both code and description)
     - **limit**: Maximum number of results to return (default: 50, max: 100)
+    - **ranked**: Rank by relevance: exact code, code prefix, whole words, word prefixes, substring, then typo-tolerant matches
+    - **popular**: Ranked, with codes used in more consultations moved up within their relevance tier
+    - **total** in the response is the number of matching codes, not just the ones returned
+    
+    Responses carry an ETag derived from the catalog version; send it back in
+    `If-None-Match` to get `304 Not Modified`.
     """
     try:
-        results = crud.search_diagnosis_codes(db, search_term=search, limit=limit)
-        return {
+        await diagnosis_index.refresh()
+        etag = _etag()
+        not_modified = None if popular else _not_modified(request, etag, DIAGNOSIS_CACHE_MAX_AGE)
+        if not_modified is not None:
+            return not_modified
+        
+        results, total = await crud_async.search_diagnosis_codes(
+            db, search_term=search, limit=limit, ranked=ranked, popular=popular
+        )
+        # Results are already plain dicts: serialize them directly
+        response = FastJSONResponse({
             "results": results,
-            "total": len(results)
-        }
+            "total": total
+        })
+        if popular:
+            # Usage counts change with every consultation: the catalog ETag does not cover them
+            response.headers["Cache-Control"] = f"public, max-age={DIAGNOSIS_POPULAR_MAX_AGE}"
+        else:
+            _cache_headers(response, etag, DIAGNOSIS_CACHE_MAX_AGE)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching diagnosis codes: {str(e)}")
+
+
+@router.get("/popular", response_model=schemas.PopularDiagnosisResponse)
+async def get_popular_diagnosis_codes(
+    period: Literal["all", "month"] = Query("all", description="All-time counts, or counts for one month"),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="YYYY-MM (default: current month)"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of codes"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Most used diagnosis codes by number of consultations.
+    
+    - **period**: `all` for all-time usage, `month` for one calendar month of consultation dates
+    - **month**: Month for `period=month` as YYYY-MM (defaults to the current month)
+    
+    Served from usage counts maintained on every consultation insert.
+    """
+    try:
+        month_start = None
+        if period == "month":
+            month_start = datetime.strptime(month, "%Y-%m").date() if month else datetime.utcnow().date().replace(day=1)
+        results = await crud_async.get_popular_diagnosis_codes(db, month=month_start, limit=limit)
+        response = FastJSONResponse({
+            "period": period,
+            "month": month_start.strftime("%Y-%m") if month_start else None,
+            "results": results
+        })
+        response.headers["Cache-Control"] = f"public, max-age={DIAGNOSIS_POPULAR_MAX_AGE}"
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading popular diagnosis codes: {str(e)}")
+
+
+async def _load_catalog() -> str:
+    """
+    Refresh the index and the mapped catalog, returning the ETag of the catalog being served
+    """
+    await diagnosis_index.refresh()
+    await icd10_catalog.refresh(diagnosis_index)
+    return f'"{icd10_catalog.version}"'
+
+
+def _node(entry: CatalogCode) -> dict:
+    return {"id": entry.id, "code": entry.code, "description": entry.description, "descendants": entry.descendants}
+
+
+def _chapter(number: int) -> dict:
+    return {"chapter": number, "range": icd10.chapter_range(number), "title": icd10.chapter_title(number)}
+
+
+def _chapter_summary(summary: ChapterSummary) -> dict:
+    return {**_chapter(summary.chapter.number), "categories": summary.categories, "codes": summary.codes}
+
+
+def _catalog_response(body: dict, etag: str) -> Response:
+    response = FastJSONResponse(body)
+    _cache_headers(response, etag, DIAGNOSIS_CATALOG_MAX_AGE)
+    return response
+
+
+@router.get("/chapters", response_model=schemas.Icd10ChaptersResponse)
+async def get_icd10_chapters(
+    request: Request
+):
+    """
+    ICD-10 chapters with their number of categories and codes in the catalog.
+    """
+    try:
+        etag = await _load_catalog()
+        not_modified = _not_modified(request, etag, DIAGNOSIS_CATALOG_MAX_AGE)
+        if not_modified is not None:
+            return not_modified
+        return _catalog_response({"chapters": [_chapter_summary(summary) for summary in icd10_catalog.chapters()]}, etag)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading ICD-10 chapters: {str(e)}")
+
+
+@router.get("/chapters/{chapter}", response_model=schemas.Icd10ChapterCategoriesResponse)
+async def get_icd10_chapter(
+    request: Request,
+    chapter: int = Path(..., description="Chapter number (1-22)")
+):
+    """
+    The three-character categories of one ICD-10 chapter, in code order.
+    
+    Categories that only exist through their subcodes have no `id` and an empty description.
+    """
+    try:
+        etag = await _load_catalog()
+        summary = next((summary for summary in icd10_catalog.chapters() if summary.chapter.number == chapter), None)
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"ICD-10 chapter {chapter} not found")
+        not_modified = _not_modified(request, etag, DIAGNOSIS_CATALOG_MAX_AGE)
+        if not_modified is not None:
+            return not_modified
+        return _catalog_response({
+            "chapter": _chapter_summary(summary),
+            "categories": [_node(entry) for entry in icd10_catalog.categories(chapter)]
+        }, etag)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading ICD-10 chapter: {str(e)}")
+
+
+@router.get("/hierarchy/{code}", response_model=schemas.DiagnosisHierarchyResponse)
+async def get_diagnosis_hierarchy(
+    request: Request,
+    code: str = Path(..., description="Diagnosis code, with or without the dot (E11.9, e119) or a category (E11)")
+):
+    """
+    A code with its chapter, ancestors (nearest first) and direct children.
+    """
+    try:
+        etag = await _load_catalog()
+        entry = icd10_catalog.get(code)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Diagnosis code {code} not found")
+        not_modified = _not_modified(request, etag, DIAGNOSIS_CATALOG_MAX_AGE)
+        if not_modified is not None:
+            return not_modified
+        return _catalog_response({
+            "code": _node(entry),
+            "chapter": _chapter(entry.chapter),
+            "ancestors": [_node(ancestor) for ancestor in icd10_catalog.ancestors(entry)],
+            "children": [_node(child) for child in icd10_catalog.children(entry)]
+        }, etag)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading diagnosis hierarchy: {str(e)}")
+
+
+@router.get("/hierarchy/{code}/descendants", response_model=schemas.DiagnosisDescendantsResponse)
+async def get_diagnosis_descendants(
+    request: Request,
+    code: str = Path(..., description="Diagnosis code or category (E11)"),
+    offset: int = Query(0, ge=0, description="Number of codes to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of codes")
+):
+    """
+    All codes under a code or category (e.g. everything under E11), in code order.
+    
+    - **total**: Number of codes under it, not just the ones returned
+    """
+    try:
+        etag = await _load_catalog()
+        entry = icd10_catalog.get(code)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Diagnosis code {code} not found")
+        not_modified = _not_modified(request, etag, DIAGNOSIS_CATALOG_MAX_AGE)
+        if not_modified is not None:
+            return not_modified
+        results, total = icd10_catalog.descendants(entry, offset=offset, limit=limit)
+        return _catalog_response({
+            "code": entry.code,
+            "total": total,
+            "results": [_node(result) for result in results]
+        }, etag)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading diagnosis descendants: {str(e)}")
+
+
+@router.get("/cache-stats")
+async def get_search_cache_stats(
+    current_doctor: models.Doctor = Depends(get_current_active_doctor)
+):
+    """
+    Hit ratio and latency of the diagnosis search result cache (requires authentication)
+    """
+    return search_cache.stats()
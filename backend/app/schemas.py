@@ -1,6 +1,10 @@
 from pydantic import BaseModel, Field, field_validator, EmailStr
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
+import os
+
+# Largest number of consultations accepted by one batch request
+CONSULTATION_BATCH_MAX_ITEMS = int(os.getenv("CONSULTATION_BATCH_MAX_ITEMS", "10000"))
 
 # Doctor/Authentication Schemas
 class DoctorBase(BaseModel):
@@ -61,7 +65,8 @@ class ConsultationBase(BaseModel):
     def patient_name_not_empty(cls, v):
         if not v.strip():
             raise ValueError('Patient name cannot be empty')
-        return v.strip()
+        # Collapse inner whitespace so name prefix filters match consistently
+        return " ".join(v.split())
     
     @field_validator('notes')
     @classmethod
@@ -73,25 +78,127 @@ class ConsultationBase(BaseModel):
 class ConsultationCreate(ConsultationBase):
     pass
 
+class ConsultationBatchCreate(BaseModel):
+    consultations: List[ConsultationCreate] = Field(..., min_length=1, max_length=CONSULTATION_BATCH_MAX_ITEMS)
+    atomic: bool = False
+
 class Consultation(BaseModel):
     id: int
     patient_name: str
     consultation_date: datetime
     notes: str
+    doctor_id: Optional[int] = None
     created_at: datetime
     diagnosis_codes: List[DiagnosisCode]
     
     class Config:
         from_attributes = True
 
+class DiagnosisSearchResult(DiagnosisCode):
+    score: Optional[float] = None
+
 # Response schemas
 class DiagnosisSearchResponse(BaseModel):
-    results: List[DiagnosisCode]
+    results: List[DiagnosisSearchResult]
     total: int
 
+class PopularDiagnosisCode(DiagnosisCode):
+    consultation_count: int
+
+class PopularDiagnosisResponse(BaseModel):
+    period: Literal["all", "month"]
+    month: Optional[str] = None
+    results: List[PopularDiagnosisCode]
+
+class CatalogNode(BaseModel):
+    id: Optional[int] = None
+    code: str
+    description: str
+    descendants: int
+
+class Icd10Chapter(BaseModel):
+    chapter: int
+    range: Optional[str] = None
+    title: str
+
+class Icd10ChapterSummary(Icd10Chapter):
+    categories: int
+    codes: int
+
+class Icd10ChaptersResponse(BaseModel):
+    chapters: List[Icd10ChapterSummary]
+
+class Icd10ChapterCategoriesResponse(BaseModel):
+    chapter: Icd10ChapterSummary
+    categories: List[CatalogNode]
+
+class DiagnosisHierarchyResponse(BaseModel):
+    code: CatalogNode
+    chapter: Icd10Chapter
+    ancestors: List[CatalogNode]
+    children: List[CatalogNode]
+
+class DiagnosisDescendantsResponse(BaseModel):
+    code: str
+    total: int
+    results: List[CatalogNode]
+
 class ConsultationListResponse(BaseModel):
     consultations: List[Consultation]
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+class ConsultationSearchHit(Consultation):
+    score: float
+    snippet: Optional[str] = None
+
+class ConsultationSearchResponse(BaseModel):
+    results: List[ConsultationSearchHit]
+
+class ConsultationBatchItemResult(BaseModel):
+    index: int
+    status: Literal["created", "error"]
+    id: Optional[int] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+class ConsultationBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[ConsultationBatchItemResult]
+
+class DailyConsultationCount(BaseModel):
+    day: date
+    consultations: int
+
+class AnalyticsDailyResponse(BaseModel):
+    date_from: date
+    date_to: date
     total: int
+    days: List[DailyConsultationCount]
+
+class DoctorConsultationCount(BaseModel):
+    doctor_id: int
+    username: str
+    full_name: str
+    consultations: int
+
+class AnalyticsDoctorsResponse(BaseModel):
+    date_from: date
+    date_to: date
+    doctors: List[DoctorConsultationCount]
+
+class ChapterConsultationCount(BaseModel):
+    chapter: int
+    range: Optional[str] = None
+    title: str
+    consultations: int
+    diagnoses: int
+
+class AnalyticsChaptersResponse(BaseModel):
+    date_from: date
+    date_to: date
+    chapters: List[ChapterConsultationCount]
 
 class ErrorResponse(BaseModel):
     detail: str
@@ -0,0 +1,58 @@
+"""
+Result cache for diagnosis searches
+
+Hot typeahead terms ("E11", "diab", "hyper") are served from the cache. Entries
+are keyed on the catalog version, so the whole cache is dropped when the
+diagnosis codes change.
+
+Configuration:
+- SEARCH_CACHE_BACKEND: memory (default, per worker), redis, or none
+- SEARCH_CACHE_MAX_ENTRIES / SEARCH_CACHE_TTL_SECONDS: size and lifetime of entries
+- SEARCH_CACHE_REDIS_URL: Redis-compatible server for the redis backend
+"""
+from typing import Optional
+from dotenv import load_dotenv
+import logging
+import os
+
+from .cache import CacheBackend, MemoryBackend, RedisBackend, VersionedResultCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory").lower()
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "600"))
+SEARCH_CACHE_REDIS_URL = os.getenv("SEARCH_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def _build_backend() -> CacheBackend:
+    if SEARCH_CACHE_BACKEND == "none":
+        return CacheBackend()
+    if SEARCH_CACHE_BACKEND == "redis":
+        try:
+            return RedisBackend(SEARCH_CACHE_REDIS_URL, prefix="diagnosis-search", ttl=SEARCH_CACHE_TTL_SECONDS)
+        except RuntimeError as e:
+            logger.warning("%s; falling back to the in-memory search cache", e)
+    return MemoryBackend(maxsize=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+
+search_cache = VersionedResultCache(_build_backend())
+
+
+def search_cache_key(search_term: str, limit: int, ranked: bool, usage_version: Optional[str] = None) -> str:
+    """
+    Normalized cache key; only differences that can change the results are kept
+
+    Popularity-boosted searches also depend on the usage counts they were
+    ranked with, so their keys carry usage_version.
+    """
+    term = (search_term or "").lower()
+    if ranked:
+        # Ranked search ignores surrounding whitespace
+        term = term.strip()
+    mode = 'ranked' if ranked else 'plain'
+    if usage_version is not None:
+        mode = f"popular@{usage_version}"
+    return f"{mode}:{limit}:{term}"
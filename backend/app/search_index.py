@@ -0,0 +1,633 @@
+"""
+In-memory search index for ICD-10 diagnosis codes
+
+The index is loaded from the diagnosis_codes table and answers searches without
+touching the database:
+- a trie over normalized codes (lower-cased, dots removed) for code-prefix lookups
+- an n-gram (1 to 3 characters) inverted index over codes and descriptions for
+  substring lookups
+- a word index over descriptions, plus a trigram index over its vocabulary for
+  typo-tolerant matching, used by relevance-ranked search
+
+Every write to diagnosis codes bumps a revision row in catalog_state within the
+same transaction, so any process can detect catalog changes with a primary-key
+lookup. Each loaded snapshot also carries a content hash (catalog_version) used
+for HTTP ETags and cache keys.
+
+Rebuilds triggered from request handlers run in the background: rows are read
+with an async query, the snapshot is built in a worker thread and then swapped
+in, and searches keep reading the previous snapshot in the meantime.
+"""
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import heapq
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) to check the database for catalog changes made by other processes
+INDEX_REFRESH_SECONDS = float(os.getenv("DIAGNOSIS_INDEX_REFRESH_SECONDS", "60"))
+
+# Row in catalog_state tracking diagnosis code changes
+DIAGNOSIS_CATALOG = "diagnosis_codes"
+
+# Longest n-gram stored in the inverted index
+MAX_GRAM = 3
+
+# Relevance tiers used by ranked search (higher is better)
+SCORE_EXACT_CODE = 100.0
+SCORE_CODE_PREFIX = 90.0
+SCORE_WHOLE_WORD = 70.0
+SCORE_WORD_PREFIX = 60.0
+SCORE_SUBSTRING = 50.0
+SCORE_FUZZY = 40.0
+# Description hits gain up to this much for covering more of a short description
+SCORE_COVERAGE_BONUS = 5.0
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    """
+    Split lower-cased text into alphanumeric words
+    """
+    return _WORD_RE.findall(text)
+
+
+def _compact_code(code: str) -> str:
+    """
+    Normalize a code for prefix matching so "E119" and "e11.9" are equivalent
+    """
+    return code.lower().replace(".", "").replace(" ", "")
+
+
+def _max_typos(word: str) -> int:
+    """
+    Number of edits tolerated when fuzzy matching a query word
+    """
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between a and b, or limit + 1 once it exceeds limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class IndexedCode:
+    """
+    Read-only diagnosis code record held by the index
+    """
+    __slots__ = ("id", "code", "description", "code_lower", "description_lower", "words")
+
+    def __init__(self, id: int, code: str, description: str):
+        self.id = id
+        self.code = code
+        self.description = description
+        self.code_lower = code.lower()
+        self.description_lower = description.lower()
+        self.words = tuple(sys.intern(word) for word in _words(self.description_lower))
+
+    def matches(self, term: str) -> bool:
+        """
+        Case-insensitive substring match against code or description (term must be lower-cased)
+        """
+        return term in self.code_lower or term in self.description_lower
+
+
+class SearchHit:
+    """
+    Diagnosis code returned by ranked search, with its relevance score
+    """
+    __slots__ = ("id", "code", "description", "score")
+
+    def __init__(self, entry: IndexedCode, score: float):
+        self.id = entry.id
+        self.code = entry.code
+        self.description = entry.description
+        self.score = score
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: List[int] = []
+
+
+class _Snapshot:
+    """
+    Immutable index contents; searches read a snapshot while a refresh builds the next one
+    """
+    __slots__ = ("entries", "ordered", "trie", "grams", "words", "vocabulary", "vocabulary_grams", "signature", "version")
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str]], signature: Optional[tuple] = None):
+        self.entries: Dict[int, IndexedCode] = {}
+        self.trie = _TrieNode()
+        self.signature = signature
+        grams: Dict[str, set] = {}
+        words: Dict[str, set] = {}
+        content_hash = hashlib.sha256()
+
+        for code_id, code, description in sorted(rows, key=lambda row: row[0]):
+            entry = IndexedCode(code_id, code, description)
+            self.entries[code_id] = entry
+            content_hash.update(f"{code_id}\x1f{code}\x1f{description}\x1e".encode())
+
+            node = self.trie
+            for char in _compact_code(code):
+                node = node.children.setdefault(char, _TrieNode())
+            node.ids.append(code_id)
+
+            for text in (entry.code_lower, entry.description_lower):
+                for gram in _ngrams(text):
+                    grams.setdefault(gram, set()).add(code_id)
+            for word in entry.words:
+                words.setdefault(word, set()).add(code_id)
+
+        self.ordered: List[IndexedCode] = list(self.entries.values())
+        # Same catalog contents give the same version in every process
+        self.version = content_hash.hexdigest()[:16]
+        # Posting lists are sorted id arrays: compact and already in catalog order
+        self.grams: Dict[str, array] = {
+            gram: array("l", sorted(ids)) for gram, ids in grams.items()
+        }
+        self.words: Dict[str, array] = {
+            word: array("l", sorted(ids)) for word, ids in words.items()
+        }
+        # Sorted vocabulary for word-prefix lookups, trigrams of it for fuzzy lookups
+        self.vocabulary: List[str] = sorted(self.words)
+        vocabulary_grams: Dict[str, List[str]] = {}
+        for word in self.vocabulary:
+            for gram in {word[i:i + 3] for i in range(len(word) - 2)}:
+                vocabulary_grams.setdefault(gram, []).append(word)
+        self.vocabulary_grams = vocabulary_grams
+
+    def words_with_prefix(self, prefix: str) -> List[str]:
+        """
+        Vocabulary words starting with prefix
+        """
+        found = []
+        for position in range(bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            word = self.vocabulary[position]
+            if not word.startswith(prefix):
+                break
+            found.append(word)
+        return found
+
+    def similar_words(self, word: str) -> Dict[str, int]:
+        """
+        Vocabulary words within the typo budget of word, mapped to their edit distance
+        """
+        budget = _max_typos(word)
+        if budget == 0:
+            return {}
+        candidates = set()
+        for gram in {word[i:i + 3] for i in range(len(word) - 2)}:
+            candidates.update(self.vocabulary_grams.get(gram, ()))
+        similar = {}
+        for candidate in candidates:
+            distance = _edit_distance(word, candidate, budget)
+            if 0 < distance <= budget:
+                similar[candidate] = distance
+        return similar
+
+
+def _ngrams(text: str) -> set:
+    """
+    All distinct 1 to MAX_GRAM character n-grams of a string
+    """
+    found = set()
+    for size in range(1, MAX_GRAM + 1):
+        for start in range(len(text) - size + 1):
+            found.add(text[start:start + size])
+    return found
+
+
+def bump_catalog_revision(connection: Connection) -> None:
+    """
+    Increment the diagnosis catalog revision within the caller's transaction
+    """
+    table = models.CatalogState.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        update(table)
+        .where(table.c.name == DIAGNOSIS_CATALOG)
+        .values(revision=table.c.revision + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(name=DIAGNOSIS_CATALOG, revision=1, updated_at=now))
+
+
+_REVISION_QUERY = select(models.CatalogState.revision).where(models.CatalogState.name == DIAGNOSIS_CATALOG)
+_TABLE_STATS_QUERY = select(func.count(models.DiagnosisCode.id), func.max(models.DiagnosisCode.id))
+_ROWS_QUERY = select(models.DiagnosisCode.id, models.DiagnosisCode.code, models.DiagnosisCode.description)
+
+
+def _catalog_signature(db: Session) -> tuple:
+    """
+    Cheap fingerprint of the diagnosis_codes table used to detect external changes
+
+    The revision catches every write made through the app or the loader; count and
+    max(id) additionally catch rows added or removed behind its back
+    """
+    revision = db.execute(_REVISION_QUERY).scalar()
+    count, max_id = db.execute(_TABLE_STATS_QUERY).one()
+    return (revision or 0, count, max_id)
+
+
+async def _catalog_signature_async(db: AsyncSession) -> tuple:
+    """
+    _catalog_signature for an async session
+    """
+    revision = await db.scalar(_REVISION_QUERY)
+    count, max_id = (await db.execute(_TABLE_STATS_QUERY)).one()
+    return (revision or 0, count, max_id)
+
+
+class DiagnosisSearchIndex:
+    """
+    Process-local search index over the diagnosis code catalog
+    """
+
+    def __init__(self, refresh_seconds: float = INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def catalog_version(self) -> Optional[str]:
+        """
+        Content hash of the loaded catalog, None before the first load
+        """
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def all_codes(self) -> List[IndexedCode]:
+        """
+        Every indexed code in catalog order
+        """
+        snapshot = self._snapshot
+        return snapshot.ordered if snapshot else []
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.ordered) if snapshot else 0
+
+    def load(self, db: Session) -> None:
+        """
+        (Re)build the index from the diagnosis_codes table, blocking (used at startup)
+        """
+        with self._lock:
+            self._stale = False
+            signature = _catalog_signature(db)
+            self.load_rows(db.execute(_ROWS_QUERY).all(), signature)
+
+    def load_rows(self, rows: Iterable[Tuple[int, str, str]], signature: Optional[tuple] = None) -> None:
+        """
+        Replace the index contents with (id, code, description) rows
+        """
+        self._snapshot = _Snapshot(rows, signature)
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """
+        Mark the index stale so the next refresh rebuilds it
+        """
+        self._stale = True
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and not self._stale
+            and time.monotonic() - self._checked_at < self.refresh_seconds
+        )
+
+    async def refresh(self) -> None:
+        """
+        Start a rebuild if the index was invalidated, never loaded, or the table changed underneath it
+
+        Never blocks the event loop: the check and the row query are async and the
+        snapshot is built in a worker thread. Callers only wait when there is no
+        snapshot yet; otherwise they keep using the current one while the rebuild runs.
+        """
+        if self._is_fresh():
+            return
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._refresh_task = asyncio.create_task(self._rebuild())
+        if self._snapshot is None:
+            await asyncio.shield(task)
+
+    async def _rebuild(self) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                stale = self._stale
+                self._stale = False
+                signature = await _catalog_signature_async(db)
+                snapshot = self._snapshot
+                if not stale and snapshot is not None and signature == snapshot.signature:
+                    self._checked_at = time.monotonic()
+                    return
+                rows = (await db.execute(_ROWS_QUERY)).all()
+            snapshot = await asyncio.to_thread(_Snapshot, rows, signature)
+            # A single attribute assignment: readers see the old or the new snapshot, never a mix
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        except Exception:
+            self._stale = True
+            logger.exception("Diagnosis index rebuild failed; still serving the previous snapshot")
+            if self._snapshot is None:
+                raise
+
+    def get(self, code_id: int) -> Optional[IndexedCode]:
+        """
+        Look up a single indexed code by ID
+        """
+        snapshot = self._snapshot
+        return snapshot.entries.get(code_id) if snapshot else None
+
+    def codes_with_prefix(self, prefix: str) -> List[IndexedCode]:
+        """
+        All codes starting with prefix (case-insensitive), shortest codes first
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+
+        node = snapshot.trie
+        for char in _compact_code(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        results: List[IndexedCode] = []
+        level = [node]
+        while level:
+            next_level = []
+            for current in level:
+                results.extend(snapshot.entries[code_id] for code_id in current.ids)
+                next_level.extend(current.children[char] for char in sorted(current.children))
+            level = next_level
+        return results
+
+    def search(self, search_term: Optional[str] = None, limit: int = 50) -> Tuple[List[IndexedCode], int]:
+        """
+        Case-insensitive substring search over code and description, in catalog order
+
+        Returns the first `limit` matches and the total number of matches
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [], 0
+
+        term = (search_term or "").lower()
+        if not term:
+            return snapshot.ordered[:limit], len(snapshot.ordered)
+
+        matches = self._substring_matches(snapshot, term)
+        return [snapshot.entries[code_id] for code_id in matches[:limit]], len(matches)
+
+    def _substring_matches(self, snapshot: _Snapshot, term: str) -> List[int]:
+        """
+        IDs of all entries containing term, in catalog order
+        """
+        if len(term) <= MAX_GRAM:
+            # The posting list for the whole term is the exact answer
+            return list(snapshot.grams.get(term, ()))
+
+        # Verify candidates from the most selective trigram
+        smallest = None
+        for start in range(len(term) - MAX_GRAM + 1):
+            posting = snapshot.grams.get(term[start:start + MAX_GRAM])
+            if posting is None:
+                return []
+            if smallest is None or len(posting) < len(smallest):
+                smallest = posting
+
+        return [code_id for code_id in smallest if snapshot.entries[code_id].matches(term)]
+
+    def rank(
+        self,
+        search_term: Optional[str] = None,
+        limit: int = 50,
+        boosts: Optional[Dict[int, float]] = None
+    ) -> Tuple[List[SearchHit], int]:
+        """
+        Relevance-ranked search
+
+        Tiers, best first: exact code, code prefix, whole words in the description,
+        word prefixes, substring, then typo-tolerant word matches. Every query word
+        must match for a description hit. boosts (code ID -> points, e.g. usage
+        popularity) are added to the scores of matching codes. Returns the top
+        `limit` hits and the total number of matching codes.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [], 0
+
+        term = (search_term or "").strip().lower()
+        if not term:
+            if not boosts:
+                return [SearchHit(entry, 0.0) for entry in snapshot.ordered[:limit]], len(snapshot.ordered)
+            # Without a term, the most boosted codes come first, then catalog order
+            boosted = heapq.nsmallest(
+                limit,
+                ((code_id, boost) for code_id, boost in boosts.items() if code_id in snapshot.entries),
+                key=lambda item: (-item[1], snapshot.entries[item[0]].code)
+            )
+            hits = [SearchHit(snapshot.entries[code_id], boost) for code_id, boost in boosted]
+            seen = {code_id for code_id, _ in boosted}
+            for entry in snapshot.ordered:
+                if len(hits) >= limit:
+                    break
+                if entry.id not in seen:
+                    hits.append(SearchHit(entry, 0.0))
+            return hits, len(snapshot.ordered)
+
+        scores: Dict[int, float] = {}
+
+        # Code tiers
+        compact = _compact_code(term)
+        if compact and " " not in term:
+            for entry in self.codes_with_prefix(compact):
+                extra = len(_compact_code(entry.code)) - len(compact)
+                if extra == 0:
+                    scores[entry.id] = SCORE_EXACT_CODE
+                else:
+                    scores[entry.id] = SCORE_CODE_PREFIX - min(extra, 9)
+
+        # Description tiers
+        for code_id, score in self._description_scores(snapshot, term).items():
+            if score > scores.get(code_id, 0.0):
+                scores[code_id] = score
+
+        # Plain substring matches (skipped for very short terms, where the code
+        # and word-prefix tiers already cover what a typeahead user means)
+        if len(term) >= MAX_GRAM:
+            for code_id in self._substring_matches(snapshot, term):
+                if code_id not in scores:
+                    scores[code_id] = SCORE_SUBSTRING
+
+        if boosts:
+            for code_id in scores:
+                scores[code_id] += boosts.get(code_id, 0.0)
+
+        best = heapq.nsmallest(
+            limit,
+            scores.items(),
+            key=lambda item: (-item[1], snapshot.entries[item[0]].code)
+        )
+        hits = [SearchHit(snapshot.entries[code_id], round(score, 2)) for code_id, score in best]
+        return hits, len(scores)
+
+    def _description_scores(self, snapshot: _Snapshot, term: str) -> Dict[int, float]:
+        """
+        Score entries whose description words match every query word
+        """
+        query_words = _words(term)
+        if not query_words:
+            return {}
+
+        # For each query word: vocabulary words it matches and the match quality
+        # (1.0 whole word, 0.8 prefix, lower for typos)
+        matchers = []
+        for word in query_words:
+            qualities: Dict[str, float] = {}
+            for similar, distance in snapshot.similar_words(word).items():
+                qualities[similar] = 0.5 - 0.1 * distance
+            for prefixed in snapshot.words_with_prefix(word):
+                qualities[prefixed] = 0.8
+            if word in snapshot.words:
+                qualities[word] = 1.0
+            if not qualities:
+                return {}
+            size = sum(len(snapshot.words[matched]) for matched in qualities)
+            matchers.append((size, qualities))
+
+        # Candidates come from the most selective query word, the rest are checked per entry
+        matchers.sort(key=lambda matcher: matcher[0])
+        candidates = set()
+        for matched in matchers[0][1]:
+            candidates.update(snapshot.words[matched])
+
+        scores: Dict[int, float] = {}
+        for code_id in candidates:
+            entry = snapshot.entries[code_id]
+            worst = 1.0
+            for _, qualities in matchers:
+                quality = max((qualities.get(word, 0.0) for word in entry.words), default=0.0)
+                if quality == 0.0:
+                    break
+                worst = min(worst, quality)
+            else:
+                if worst == 1.0:
+                    score = SCORE_WHOLE_WORD
+                elif worst >= 0.8:
+                    score = SCORE_WORD_PREFIX
+                else:
+                    score = SCORE_FUZZY - 10 * (0.5 - worst)
+                # Prefer short descriptions where the query covers more of the text
+                score += SCORE_COVERAGE_BONUS * len(query_words) / max(len(entry.words), len(query_words))
+                scores[code_id] = score
+        return scores
+
+
+# Shared index for this process
+diagnosis_index = DiagnosisSearchIndex()
+
+
+def _mark_diagnosis_codes_changed(session: Session) -> None:
+    """
+    Flag the transaction and bump the catalog revision once per transaction
+    """
+    session.info["diagnosis_codes_changed"] = True
+    if not session.info.get("catalog_revision_bumped"):
+        session.info["catalog_revision_bumped"] = True
+        bump_catalog_revision(session.connection())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_diagnosis_code_changes(session, flush_context):
+    """
+    Remember that this transaction touched diagnosis codes
+    """
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, models.DiagnosisCode):
+            _mark_diagnosis_codes_changed(session)
+            return
+    # Linking codes to a consultation only touches the relationship collection
+    for obj in session.dirty:
+        if isinstance(obj, models.DiagnosisCode) and session.is_modified(obj, include_collections=False):
+            _mark_diagnosis_codes_changed(session)
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_diagnosis_code_statements(orm_execute_state):
+    """
+    Catch bulk insert/update/delete statements against diagnosis codes
+    """
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is models.DiagnosisCode:
+        _mark_diagnosis_codes_changed(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_index_on_commit(session):
+    session.info.pop("catalog_revision_bumped", None)
+    if session.info.pop("diagnosis_codes_changed", False):
+        diagnosis_index.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session):
+    session.info.pop("catalog_revision_bumped", None)
+    session.info.pop("diagnosis_codes_changed", None)
@@ -0,0 +1,88 @@
+"""
+Benchmark: ICD-10 hierarchy lookups, before vs after the memory-mapped catalog
+
+"before" answers "all codes under <category>" the way the flat catalog allows:
+a scan over the list of code dicts (as in seed_data/icd10_codes.py). "after"
+uses app.catalog (bisect plus a slice of the mapped snapshot). Python heap per
+process is measured with tracemalloc; the mapped snapshot itself lives in the
+page cache, shared by every worker.
+
+Usage:
+    python benchmarks/bench_catalog.py --codes 72000 --iterations 200
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.catalog import Icd10Catalog, write_snapshot
+from benchmarks.dataset import synthetic_icd10_codes
+
+VERSION = "benchmark0000000"
+
+
+def descendants_before(codes, category: str):
+    prefix = category + "."
+    return [code for code in codes if code["code"].startswith(prefix)]
+
+
+def measure(lookup, categories, iterations: int) -> float:
+    started = time.perf_counter()
+    for index in range(iterations):
+        lookup(categories[index % len(categories)])
+    return (time.perf_counter() - started) / iterations
+
+
+def main(count: int, iterations: int) -> None:
+    tracemalloc.start()
+    codes = list(synthetic_icd10_codes(count))
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    directory = tempfile.mkdtemp(prefix="bench-catalog-")
+    catalog = Icd10Catalog(directory)
+    started = time.perf_counter()
+    write_snapshot(
+        catalog.snapshot_path(VERSION), VERSION,
+        ((index + 1, code["code"], code["description"]) for index, code in enumerate(codes))
+    )
+    written = time.perf_counter() - started
+
+    class Index:
+        catalog_version = VERSION
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    catalog.ensure_current(Index)
+    mapped = time.perf_counter() - started
+    catalog_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    categories = [
+        entry.code for summary in catalog.chapters() for entry in catalog.categories(summary.chapter.number)
+    ]
+
+    def descendants_after(category: str):
+        return catalog.descendants(catalog.get(category), limit=count)[0]
+
+    before = measure(lambda category: descendants_before(codes, category), categories, iterations)
+    after = measure(descendants_after, categories, iterations)
+
+    print(f"{count} codes, {len(categories)} categories; snapshot written in {written:.2f}s, mapped in {1000 * mapped:.1f} ms")
+    print(f"  python heap per worker: list of dicts {dict_bytes / 1e6:.1f} MB, mapped catalog {catalog_bytes / 1e6:.3f} MB")
+    for label, seconds in (("before", before), ("after", after)):
+        print(f"  {label:<7} {1e6 * seconds:>9.1f} us per 'all codes under category'")
+    print(f"  speedup {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ICD-10 hierarchy lookups")
+    parser.add_argument("--codes", type=int, default=72000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    main(args.codes, args.iterations)
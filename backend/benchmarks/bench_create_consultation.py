@@ -0,0 +1,136 @@
+"""
+Benchmark: consultation create path, before vs after collapsing diagnosis-id validation
+
+"before" replays the original request flow: one lookup per diagnosis code ID,
+a second IN query for the same codes, commit, refresh and a lazy load of the
+codes for the response. "after" is crud_async.create_consultation.
+
+Usage:
+    python benchmarks/bench_create_consultation.py --iterations 500 --codes 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Use a throwaway database unless one is given explicitly
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+
+from app import crud_async, models, schemas
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+async def create_before(payload: schemas.ConsultationCreate) -> models.Consultation:
+    """
+    Original flow: per-ID validation, re-fetch, commit, refresh, lazy load
+    """
+    async with AsyncSessionLocal() as db:
+        for code_id in payload.diagnosis_code_ids:
+            if await db.get(models.DiagnosisCode, code_id) is None:
+                raise ValueError(f"Diagnosis code with ID {code_id} not found")
+        db.expunge_all()
+        result = await db.execute(
+            select(models.DiagnosisCode).where(models.DiagnosisCode.id.in_(payload.diagnosis_code_ids))
+        )
+        consultation = models.Consultation(
+            patient_name=payload.patient_name,
+            consultation_date=payload.consultation_date,
+            notes=payload.notes,
+            diagnosis_codes=list(result.scalars().all())
+        )
+        db.add(consultation)
+        await db.commit()
+        db.expire(consultation)
+        await db.refresh(consultation)
+        result = await db.execute(
+            select(models.Consultation)
+            .options(selectinload(models.Consultation.diagnosis_codes))
+            .where(models.Consultation.id == consultation.id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().one()
+
+
+async def create_after(payload: schemas.ConsultationCreate) -> models.Consultation:
+    async with AsyncSessionLocal() as db:
+        return await crud_async.create_consultation(db, payload)
+
+
+async def run(label: str, create, payloads, counter: StatementCounter) -> dict:
+    counter.count = 0
+    started = time.perf_counter()
+    for payload in payloads:
+        await create(payload)
+    elapsed = time.perf_counter() - started
+    return {
+        "path": label,
+        "writes_per_second": round(len(payloads) / elapsed, 1),
+        "statements_per_write": round(counter.count / len(payloads), 1),
+    }
+
+
+async def main(iterations: int, codes: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        existing = (await db.execute(select(models.DiagnosisCode.id).limit(codes))).scalars().all()
+        if len(existing) < codes:
+            db.add_all(
+                models.DiagnosisCode(code=f"Z{index:02d}.BENCH", description=f"Benchmark code {index}")
+                for index in range(codes - len(existing))
+            )
+            await db.commit()
+            existing = (await db.execute(select(models.DiagnosisCode.id).limit(codes))).scalars().all()
+
+    payloads = [
+        schemas.ConsultationCreate(
+            patient_name=f"Benchmark Patient {index}",
+            consultation_date="2024-01-01T09:00:00",
+            notes="Benchmark consultation",
+            diagnosis_code_ids=list(existing)
+        )
+        for index in range(iterations)
+    ]
+
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    # Warm up connections and caches
+    await create_after(payloads[0])
+
+    results = [
+        await run("before", create_before, payloads, counter),
+        await run("after", create_after, payloads, counter),
+    ]
+    await async_engine.dispose()
+
+    print(f"{iterations} creates with {codes} diagnosis codes each ({engine.url.get_backend_name()})")
+    for result in results:
+        print(f"  {result['path']:<7} {result['writes_per_second']:>9} writes/sec  "
+              f"{result['statements_per_write']:>5} statements/write")
+    print(f"  speedup {results[1]['writes_per_second'] / results[0]['writes_per_second']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the consultation create path")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--codes", type=int, default=5, help="Diagnosis codes attached to each consultation")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.codes))
@@ -0,0 +1,100 @@
+"""
+Benchmark: consultation list serialization, before vs after the fast JSON path
+
+"before" replays the original response flow: ORM objects validated into
+ConsultationListResponse, dumped to JSON-compatible data and rendered by
+JSONResponse. "after" renders the plain-dict rows from
+crud_async.get_consultation_rows with FastJSONResponse. Only serialization is
+timed; both paths start from data already loaded from the database.
+
+Usage:
+    python benchmarks/bench_serialization.py --records 1000 --codes 3 --iterations 50
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import models, schemas
+from app.responses import FastJSONResponse, orjson
+
+
+def build_page(records: int, codes: int):
+    """
+    The same page as ORM objects and as plain dict rows
+    """
+    diagnosis_codes = [
+        models.DiagnosisCode(id=index + 1, code=f"E11.{index}", description=f"Type 2 diabetes mellitus variant {index}")
+        for index in range(codes)
+    ]
+    started = datetime(2024, 1, 1, 9, 0)
+    objects, rows = [], []
+    for index in range(records):
+        fields = {
+            "id": index + 1,
+            "patient_name": f"Patient {index}",
+            "consultation_date": started + timedelta(minutes=index),
+            "notes": "Follow-up visit; blood glucose reviewed and medication adjusted.",
+            "created_at": started + timedelta(minutes=index, seconds=5),
+        }
+        objects.append(models.Consultation(diagnosis_codes=diagnosis_codes, **fields))
+        rows.append({
+            **fields,
+            "diagnosis_codes": [
+                {"id": code.id, "code": code.code, "description": code.description}
+                for code in diagnosis_codes
+            ]
+        })
+    return objects, rows
+
+
+def render_before(objects) -> bytes:
+    """
+    Original flow: response_model validation + jsonable_encoder + JSONResponse
+    """
+    page = schemas.ConsultationListResponse.model_validate(
+        {"consultations": objects, "total": len(objects), "next_cursor": None},
+        from_attributes=True
+    )
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def render_after(rows) -> bytes:
+    return FastJSONResponse({"consultations": rows, "total": len(rows), "next_cursor": None}).body
+
+
+def measure(render, page, iterations: int) -> float:
+    render(page)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render(page)
+    return (time.perf_counter() - started) / iterations
+
+
+def main(records: int, codes: int, iterations: int) -> None:
+    objects, rows = build_page(records, codes)
+    before = measure(render_before, objects, iterations)
+    after = measure(render_after, rows, iterations)
+    size = len(render_after(rows))
+
+    print(f"{records} consultations with {codes} diagnosis codes each, {size} bytes "
+          f"({'orjson' if orjson is not None else 'stdlib json'})")
+    for label, seconds in (("before", before), ("after", after)):
+        print(f"  {label:<7} {1000 * seconds:>9.2f} ms/page  {records / seconds:>11.0f} records/sec")
+    print(f"  speedup {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark consultation list serialization")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--codes", type=int, default=3, help="Diagnosis codes attached to each consultation")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    main(args.records, args.codes, args.iterations)
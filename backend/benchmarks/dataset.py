@@ -0,0 +1,151 @@
+"""
+Benchmark dataset: synthetic doctors, a full-size ICD-10 catalog and consultations
+
+Everything is deterministic for a given seed and written in bulk
+(consultations come from seed_data/generate_consultations.py), so a dataset
+of millions of consultations can be rebuilt identically for before/after
+comparisons.
+
+Usage:
+    python benchmarks/dataset.py --consultations 1000000
+    python benchmarks/dataset.py --icd10-file icd10cm_order_2025.txt --consultations 5000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+# Use a throwaway database unless one is given explicitly
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "seed_data"))
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from app.auth import get_password_hash
+from app.database import Base, engine
+from app.models import Consultation, Doctor
+from generate_consultations import generate_consultations
+from load_icd10 import load_codes, read_source
+
+# Every synthetic doctor logs in with this password
+BENCHMARK_PASSWORD = "benchmark-password"
+
+_CONDITIONS = [
+    "Acute infection", "Chronic inflammation", "Malignant neoplasm", "Benign neoplasm", "Injury",
+    "Fracture", "Disorder", "Degeneration", "Hemorrhage", "Obstruction", "Ulcer", "Deformity",
+]
+_SITES = [
+    "upper respiratory tract", "lower limb", "colon", "kidney", "liver", "heart", "skin",
+    "spine", "shoulder", "eye", "ear", "pancreas", "thyroid", "bladder", "lung", "brain",
+]
+_QUALIFIERS = ["unspecified", "left side", "right side", "bilateral", "initial encounter", "subsequent encounter"]
+
+
+def doctor_username(index: int) -> str:
+    return f"bench_doctor_{index}"
+
+
+def synthetic_icd10_codes(count: int, seed: int = 0) -> Iterator[Dict[str, str]]:
+    """
+    ICD-10-shaped codes (A00-Z99 categories with 1-3 character subcodes) until count is reached
+    """
+    rng = random.Random(seed)
+    produced = 0
+    letters = [letter for letter in "ABCDEFGHIJKLMNOPQRSTVWXYZ"]
+    # Roughly 72k codes at full size: ~29 codes per category
+    per_category = max(1, count // (len(letters) * 100) + 1)
+    for letter in letters:
+        for category in range(100):
+            base = f"{letter}{category:02d}"
+            for sub in range(per_category):
+                if produced >= count:
+                    return
+                code = base if sub == 0 else f"{base}.{sub - 1:0{1 if sub <= 10 else 3}d}"
+                description = f"{rng.choice(_CONDITIONS)} of {rng.choice(_SITES)}, {rng.choice(_QUALIFIERS)}"
+                yield {"code": code, "description": description}
+                produced += 1
+
+
+def create_doctors(bind: Engine, count: int) -> int:
+    """
+    Insert bench_doctor_<n> accounts that are missing (one bcrypt hash shared by all)
+    """
+    hashed_password = get_password_hash(BENCHMARK_PASSWORD)
+    with bind.begin() as connection:
+        existing = set(connection.execute(
+            select(Doctor.username).where(Doctor.username.like("bench_doctor_%"))
+        ).scalars())
+        rows = [
+            {
+                "username": doctor_username(index),
+                "email": f"{doctor_username(index)}@example.com",
+                "full_name": f"Benchmark Doctor {index}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "created_at": datetime.utcnow(),
+            }
+            for index in range(count)
+            if doctor_username(index) not in existing
+        ]
+        if rows:
+            connection.execute(insert(Doctor.__table__), rows)
+    return count
+
+
+def prepare_dataset(
+    bind: Engine = engine,
+    doctors: int = 50,
+    codes: int = 72000,
+    consultations: int = 100000,
+    icd10_file: Optional[str] = None,
+    seed: int = 0
+) -> Dict[str, float]:
+    """
+    Create the schema and fill it; consultations are only added up to the requested total
+    """
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=bind)
+
+    rows = read_source(Path(icd10_file)) if icd10_file else synthetic_icd10_codes(codes, seed)
+    code_stats = load_codes(rows, bind=bind)
+    create_doctors(bind, doctors)
+
+    with bind.connect() as connection:
+        existing = connection.execute(select(func.count(Consultation.id))).scalar()
+    added = 0
+    if existing < consultations:
+        added = generate_consultations(consultations - existing, bind=bind, seed=seed)["consultations"]
+
+    return {
+        "diagnosis_codes": code_stats["read"] - code_stats["skipped"],
+        "doctors": doctors,
+        "consultations": max(existing, consultations),
+        "consultations_added": added,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the benchmark dataset")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--codes", type=int, default=72000, help="Synthetic ICD-10 codes (ignored with --icd10-file)")
+    parser.add_argument("--icd10-file", help="Load the real catalog from a CMS order file or CSV instead")
+    parser.add_argument("--consultations", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Building dataset in {engine.url.render_as_string(hide_password=True)}")
+    print(prepare_dataset(
+        doctors=args.doctors, codes=args.codes, consultations=args.consultations,
+        icd10_file=args.icd10_file, seed=args.seed
+    ))
@@ -0,0 +1,399 @@
+"""
+Load test: realistic traffic mixes against the EMR API
+
+Virtual users (asyncio tasks) log in as synthetic doctors and then pick
+operations by weight from a traffic mix:
+
+- login: POST /api/auth/login (bcrypt-bound)
+- typeahead: GET /api/diagnosis?search=..., one request per keystroke of a word
+- list: GET /api/consultation, following next_cursor for a few pages
+- detail: GET /api/consultation/{id}
+- create: POST /api/consultation with 1-4 diagnosis codes
+
+The app runs either in-process (httpx ASGITransport, no network) or as a
+uvicorn server in a subprocess. Latency percentiles and throughput are
+measured client-side; queries per request come from the Server-Timing header.
+
+Results can be saved as a baseline and later runs compared against it; the
+comparison exits with status 1 when an operation regresses beyond the tolerance.
+
+Usage:
+    python benchmarks/loadtest.py --consultations 1000000 --duration 60 --save-baseline baseline.json
+    python benchmarks/loadtest.py --mode uvicorn --workers 4 --compare baseline.json
+    DATABASE_URL=postgresql://... python benchmarks/loadtest.py --mix write-heavy
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Use a throwaway database unless one is given explicitly
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/loadtest.db"
+# Queries per request are read from the Server-Timing header, which is off by default
+os.environ.setdefault("SERVER_TIMING", "true")
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+import httpx
+from sqlalchemy import func, select
+
+from app.database import engine
+from app.models import Consultation, DiagnosisCode
+from dataset import BENCHMARK_PASSWORD, doctor_username, prepare_dataset
+
+# Operation weights per traffic mix
+MIXES: Dict[str, Dict[str, int]] = {
+    "default": {"login": 2, "typeahead": 45, "list": 20, "detail": 25, "create": 8},
+    "read-heavy": {"login": 1, "typeahead": 50, "list": 25, "detail": 24, "create": 0},
+    "write-heavy": {"login": 2, "typeahead": 30, "list": 10, "detail": 8, "create": 50},
+    "login": {"login": 100, "typeahead": 0, "list": 0, "detail": 0, "create": 0},
+}
+
+LIST_PAGE_SIZE = 20
+LIST_MAX_PAGES = 3
+SERVER_START_TIMEOUT = 60
+
+_QUERY_COUNT = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class OperationStats:
+    """
+    Client-side latencies, errors and server-reported query counts for one operation
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.queries = 0
+        self.query_samples = 0
+
+    def record(self, seconds: float, response: Optional[httpx.Response]) -> None:
+        self.latencies.append(seconds)
+        if response is None or response.status_code >= 400:
+            self.errors += 1
+            return
+        match = _QUERY_COUNT.search(response.headers.get("server-timing", ""))
+        if match:
+            self.queries += int(match.group(1))
+            self.query_samples += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(1000 * ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+        return {
+            "count": len(ordered),
+            "errors": self.errors,
+            "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "queries_per_request": round(self.queries / self.query_samples, 2) if self.query_samples else None,
+        }
+
+
+class VirtualUser:
+    """
+    One doctor session issuing operations back to back
+    """
+
+    def __init__(self, client: httpx.AsyncClient, index: int, workload: Dict, stats: Dict[str, OperationStats], seed: int):
+        self.client = client
+        self.username = doctor_username(index % workload["doctors"])
+        self.workload = workload
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.headers: Dict[str, str] = {}
+        self.word = ""
+        self.typed = 0
+
+    async def timed(self, operation: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.stats[operation].record(time.perf_counter() - started, response)
+        return response
+
+    async def login(self) -> None:
+        response = await self.timed(
+            "login", "POST", "/api/auth/login",
+            data={"username": self.username, "password": BENCHMARK_PASSWORD}
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def typeahead(self) -> None:
+        # Type a word one keystroke at a time, as the frontend search box does
+        if self.typed >= len(self.word):
+            self.word = self.rng.choice(self.workload["search_words"])
+            self.typed = 0
+        self.typed += 1
+        await self.timed(
+            "typeahead", "GET", "/api/diagnosis",
+            params={"search": self.word[:self.typed], "limit": 20}
+        )
+
+    async def list(self) -> None:
+        params = {"limit": LIST_PAGE_SIZE}
+        for _ in range(self.rng.randint(1, LIST_MAX_PAGES)):
+            response = await self.timed("list", "GET", "/api/consultation", params=params, headers=self.headers)
+            if response is None or response.status_code != 200:
+                return
+            next_cursor = response.json().get("next_cursor")
+            if not next_cursor:
+                return
+            params = {"limit": LIST_PAGE_SIZE, "cursor": next_cursor}
+
+    async def detail(self) -> None:
+        consultation_id = self.rng.randint(1, self.workload["max_consultation_id"])
+        await self.timed("detail", "GET", f"/api/consultation/{consultation_id}", headers=self.headers)
+
+    async def create(self) -> None:
+        consultation_date = datetime(2024, 1, 1) + timedelta(minutes=self.rng.randrange(365 * 24 * 60))
+        await self.timed(
+            "create", "POST", "/api/consultation",
+            headers=self.headers,
+            json={
+                "patient_name": f"Load Test Patient {self.rng.randrange(100000)}",
+                "consultation_date": consultation_date.isoformat(),
+                "notes": "Follow-up visit created by the load test.",
+                "diagnosis_code_ids": self.rng.sample(self.workload["code_ids"], self.rng.randint(1, 4)),
+            }
+        )
+
+    async def run(self, deadline: float) -> None:
+        await self.login()
+        operations = [name for name, weight in self.workload["mix"].items() if weight]
+        weights = [self.workload["mix"][name] for name in operations]
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            await getattr(self, operation)()
+
+
+def load_workload(mix: str, doctors: int, seed: int) -> Dict:
+    """
+    IDs and search words the virtual users draw from, read once from the database
+    """
+    rng = random.Random(seed)
+    with engine.connect() as connection:
+        code_ids = connection.execute(select(DiagnosisCode.id)).scalars().all()
+        descriptions = connection.execute(
+            select(DiagnosisCode.description).order_by(DiagnosisCode.id).limit(5000)
+        ).scalars().all()
+        max_consultation_id = connection.execute(select(func.max(Consultation.id))).scalar() or 1
+
+    words = sorted({word.lower() for description in descriptions for word in re.findall(r"[A-Za-z]{4,}", description)})
+    return {
+        "mix": MIXES[mix],
+        "doctors": doctors,
+        "code_ids": code_ids,
+        "search_words": rng.sample(words, min(len(words), 200)) or ["diabetes"],
+        "max_consultation_id": max_consultation_id,
+    }
+
+
+@asynccontextmanager
+async def inprocess_client():
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            yield client
+
+
+@asynccontextmanager
+async def uvicorn_client(port: int, workers: int, connections: int):
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(command, cwd=Path(__file__).parent.parent, env=os.environ.copy())
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            started = time.perf_counter()
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+                try:
+                    if (await client.get("/api/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - started > SERVER_START_TIMEOUT:
+                    raise RuntimeError("uvicorn did not become healthy in time")
+                await asyncio.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def run_load(args, workload: Dict) -> Dict:
+    stats = {name: OperationStats() for name in workload["mix"]}
+    if args.mode == "inprocess":
+        client_context = inprocess_client()
+    else:
+        client_context = uvicorn_client(args.port, args.workers, args.users)
+
+    async with client_context as client:
+        # Warm caches and connection pools before measuring
+        if args.warmup > 0:
+            warmup_stats = {name: OperationStats() for name in workload["mix"]}
+            warmup_deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(
+                VirtualUser(client, index, workload, warmup_stats, args.seed + index).run(warmup_deadline)
+                for index in range(args.users)
+            ))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            VirtualUser(client, index, workload, stats, args.seed + index).run(deadline)
+            for index in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+
+    if args.mode == "inprocess":
+        from app.database import async_engine
+        await async_engine.dispose()
+
+    operations = {name: operation.summary(elapsed) for name, operation in stats.items() if operation.latencies}
+    total = OperationStats()
+    for operation in stats.values():
+        total.latencies.extend(operation.latencies)
+        total.errors += operation.errors
+        total.queries += operation.queries
+        total.query_samples += operation.query_samples
+
+    return {
+        "meta": {
+            "mode": args.mode,
+            "mix": args.mix,
+            "users": args.users,
+            "duration_s": args.duration,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "database": engine.url.get_backend_name(),
+            "consultations": workload["max_consultation_id"],
+            "diagnosis_codes": len(workload["code_ids"]),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "operations": operations,
+        "total": total.summary(elapsed),
+    }
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Regressions of result against baseline: slower p95/p99, lower throughput,
+    more queries per request or new errors
+    """
+    regressions = []
+    for name, base in baseline["operations"].items():
+        current = result["operations"].get(name)
+        if current is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and current[metric] and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {current[metric]}")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {base['throughput_rps']} -> {current['throughput_rps']}")
+        # Query counts are deterministic, so any increase is a regression
+        if (base["queries_per_request"] is not None and current["queries_per_request"] is not None
+                and current["queries_per_request"] > base["queries_per_request"] + 0.05):
+            regressions.append(
+                f"{name}: queries_per_request {base['queries_per_request']} -> {current['queries_per_request']}"
+            )
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(result: Dict) -> None:
+    meta = result["meta"]
+    print(
+        f"{meta['mode']} / {meta['database']} / mix={meta['mix']} / {meta['users']} users / "
+        f"{meta['duration_s']}s / {meta['consultations']} consultations, {meta['diagnosis_codes']} codes"
+    )
+    print(f"{'operation':<10} {'count':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    rows = list(result["operations"].items()) + [("total", result["total"])]
+    for name, summary in rows:
+        print(
+            f"{name:<10} {summary['count']:>7} {summary['errors']:>6} {summary['throughput_rps']:>8} "
+            f"{summary['p50_ms']!s:>8} {summary['p95_ms']!s:>8} {summary['p99_ms']!s:>8} "
+            f"{summary['queries_per_request']!s:>8}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the EMR API")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--codes", type=int, default=72000)
+    parser.add_argument("--icd10-file", help="Load the real ICD-10 catalog instead of synthetic codes")
+    parser.add_argument("--consultations", type=int, default=100000)
+    parser.add_argument("--skip-dataset", action="store_true", help="Use the database as it is")
+    parser.add_argument("--output", help="Write the result JSON here")
+    parser.add_argument("--save-baseline", help="Write the result JSON as a baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    if not args.skip_dataset:
+        print(f"Dataset: {prepare_dataset(doctors=args.doctors, codes=args.codes, consultations=args.consultations, icd10_file=args.icd10_file, seed=args.seed)}")
+
+    workload = load_workload(args.mix, args.doctors, args.seed)
+    result = asyncio.run(run_load(args, workload))
+    print_report(result)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(result, indent=2) + "\n")
+            print(f"Result written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        for key in ("mode", "mix", "users", "workers", "database"):
+            if baseline["meta"].get(key) != result["meta"][key]:
+                print(f"Warning: baseline {key}={baseline['meta'].get(key)!r}, this run {key}={result['meta'][key]!r}")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,501 @@
+"""
+Synthetic consultation generator for production-scale data
+
+Generates N consultations that look like clinic traffic:
+- dates: weekday-heavy (quiet weekends), clinic hours with a morning peak,
+  more visits in winter, spread over a configurable date range
+- patients: a fixed pool of names (default N / 5) where some patients visit
+  far more often than others
+- notes: 1 to ~30 sentences, log-normally distributed lengths
+- diagnosis codes: 1-4 per consultation, drawn from a Zipf-like popularity
+  distribution over the catalog (a few codes dominate, most are rare)
+- recording doctor: uniformly one of the registered doctors (none if there are none)
+
+Output is deterministic for a given seed, catalog and existing row count.
+Rows are written in batches with COPY on PostgreSQL (psycopg2) and raw
+executemany on SQLite; on SQLite the notes full-text trigger is suspended
+during the load and the new notes are indexed in one statement at the end.
+Diagnosis usage counts (app/diagnosis_usage.py) and the analytics rollups
+(app/analytics.py) are counted in memory and upserted once at the end.
+
+Throughput is reported in consultations/sec for the write phase (drawing,
+writing and counting the rows); a consultation averages ~1.7 diagnosis links,
+so rows/sec would overstate it. Counter upserts, index builds and full-text
+indexing after the last batch are timed separately.
+
+Usage:
+    python seed_data/generate_consultations.py 1000000
+    python seed_data/generate_consultations.py 5000000 --seed 42 --start 2020-01-01 --end 2025-01-01
+"""
+import argparse
+import csv
+import io
+import itertools
+import math
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, time as time_of_day, timedelta
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import analytics, diagnosis_usage, fulltext, icd10
+from app.database import engine
+from app.main import prepare_schema
+from app.models import Consultation, DiagnosisCode, Doctor, consultation_diagnoses
+
+# Rows are drawn and written in batches of this size; changing it changes the generated data
+BATCH_SIZE = 20000
+DEFAULT_START = datetime(2022, 1, 1)
+DEFAULT_END = datetime(2025, 1, 1)
+
+# SQLite settings for the duration of a load: no fsync (a crash loses the whole
+# transaction anyway), a larger page cache and in-memory temporary b-trees
+SQLITE_LOAD_PRAGMAS = {"synchronous": "OFF", "cache_size": -512000, "temp_store": "MEMORY"}
+
+CONSULTATION_COLUMNS = ("id", "patient_name", "consultation_date", "notes", "created_at", "doctor_id")
+LINK_COLUMNS = ("consultation_id", "diagnosis_code_id")
+
+# Relative visit volume by weekday (Monday first) and by hour of day
+WEEKDAY_WEIGHTS = (1.25, 1.1, 1.05, 1.0, 0.95, 0.35, 0.1)
+HOUR_WEIGHTS = {8: 6, 9: 10, 10: 11, 11: 10, 12: 5, 13: 6, 14: 8, 15: 8, 16: 7, 17: 5, 18: 3, 19: 1}
+# Winter months are busier (respiratory season)
+MONTH_WEIGHTS = (1.3, 1.25, 1.1, 1.0, 0.9, 0.85, 0.8, 0.85, 0.95, 1.05, 1.15, 1.3)
+
+# Zipf exponents: code popularity and visits per patient
+CODE_POPULARITY_EXPONENT = 1.1
+PATIENT_VISIT_EXPONENT = 0.7
+# Probability of 1, 2, 3 or 4 diagnosis codes on a consultation
+CODES_PER_CONSULTATION = (0.5, 0.3, 0.13, 0.07)
+# Sentences per note: exp(N(mu, sigma)), median ~3.3
+NOTE_SENTENCES_MU = 1.2
+NOTE_SENTENCES_SIGMA = 0.7
+NOTE_MAX_SENTENCES = 30
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Ahmad", "Siti", "Muhammad", "Nur", "Wei", "Mei", "Raj", "Priya", "Hiroshi", "Yuki",
+    "Carlos", "Maria", "Luis", "Ana", "Omar", "Fatima", "Ivan", "Olga", "Kwame", "Amara",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Tan", "Lim", "Lee", "Wong", "Abdullah", "Ibrahim", "Rahman", "Kumar", "Singh", "Nair",
+    "Sato", "Suzuki", "Kim", "Park", "Nguyen", "Tran", "Ivanov", "Mensah", "Okafor", "Silva",
+]
+NOTE_SENTENCES = [
+    "Patient presents with {symptom} for {days} days.",
+    "Reports {symptom}, worse in the {time_of_day}.",
+    "Denies fever, chills or weight loss.",
+    "History of {condition}, currently stable on medication.",
+    "Blood pressure {systolic}/{diastolic} mmHg, pulse {pulse} bpm.",
+    "Temperature {temperature} C, oxygen saturation {saturation}% on room air.",
+    "On examination, {finding}.",
+    "Lungs clear to auscultation bilaterally.",
+    "Abdomen soft and non-tender.",
+    "Advised rest, fluids and {medication} as needed.",
+    "Started {medication}; review in {weeks} weeks.",
+    "Referred to {specialty} for further assessment.",
+    "Ordered full blood count and {test}.",
+    "Discussed diet, exercise and smoking cessation.",
+    "Follow-up of {condition}; symptoms improving.",
+    "Patient counselled on warning signs and when to return.",
+    "Medication adherence reviewed; no side effects reported.",
+    "Wound inspected, healing well with no signs of infection.",
+]
+NOTE_VALUES = {
+    "symptom": ["cough", "sore throat", "headache", "lower back pain", "abdominal pain", "fatigue",
+                "dizziness", "shortness of breath", "chest tightness", "rash", "joint pain", "nausea"],
+    "time_of_day": ["morning", "evening", "night"],
+    "condition": ["hypertension", "type 2 diabetes", "asthma", "hyperlipidaemia", "migraine",
+                  "osteoarthritis", "hypothyroidism", "depression", "GERD"],
+    "finding": ["mild pharyngeal erythema", "tenderness over the lumbar spine", "no focal neurology",
+                "bilateral wheeze", "a well-demarcated erythematous rash", "reduced range of motion"],
+    "medication": ["paracetamol", "ibuprofen", "amoxicillin", "metformin", "amlodipine",
+                   "salbutamol", "omeprazole", "atorvastatin", "cetirizine"],
+    "specialty": ["cardiology", "endocrinology", "dermatology", "orthopaedics", "physiotherapy", "ENT"],
+    "test": ["HbA1c", "lipid profile", "thyroid function tests", "urinalysis", "chest X-ray", "ECG"],
+}
+# Sentences with placeholders are rendered ahead of time into this many variants each
+NOTE_VARIANTS_PER_SENTENCE = 50
+
+
+def zipf_cumulative_weights(count: int, exponent: float) -> List[float]:
+    """
+    Cumulative weights 1/rank^exponent for ranks 1..count (for random.choices)
+    """
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _lognormal_density(value: float, mu: float, sigma: float) -> float:
+    return math.exp(-((math.log(value) - mu) ** 2) / (2 * sigma ** 2)) / value
+
+
+def patient_names(count: int, rng: random.Random) -> List[str]:
+    """
+    count distinct patient names; a numeric suffix disambiguates once the combinations run out
+    """
+    combinations = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(combinations)
+    names = combinations[:count]
+    for index in range(len(names), count):
+        names.append(f"{combinations[index % len(combinations)]} {index // len(combinations) + 1}")
+    return names
+
+
+def note_sentences(rng: random.Random) -> List[str]:
+    """
+    Rendered sentence variants notes are assembled from
+    """
+    sentences = []
+    for template in NOTE_SENTENCES:
+        if "{" not in template:
+            sentences.append(template)
+            continue
+        for _ in range(NOTE_VARIANTS_PER_SENTENCE):
+            sentences.append(template.format(
+                days=rng.randint(1, 21), weeks=rng.randint(1, 8),
+                systolic=rng.randint(100, 170), diastolic=rng.randint(60, 105), pulse=rng.randint(55, 110),
+                temperature=round(rng.uniform(36.2, 39.4), 1), saturation=rng.randint(92, 100),
+                **{name: rng.choice(values) for name, values in NOTE_VALUES.items()}
+            ))
+    return sentences
+
+
+class ConsultationGenerator:
+    """
+    Deterministic batches of consultation rows and their diagnosis links
+    """
+
+    def __init__(
+        self,
+        code_ids: Sequence[int],
+        seed: int = 0,
+        start: datetime = DEFAULT_START,
+        end: datetime = DEFAULT_END,
+        patients: int = 10000,
+        doctor_ids: Sequence[int] = ()
+    ):
+        if not code_ids:
+            raise ValueError("Load diagnosis codes before generating consultations")
+        if end <= start:
+            raise ValueError("end must be after start")
+        self.rng = random.Random(seed)
+
+        # Which codes are popular is itself random (but seeded)
+        self.code_ids = sorted(code_ids)
+        self.rng.shuffle(self.code_ids)
+        self.code_weights = zipf_cumulative_weights(len(self.code_ids), CODE_POPULARITY_EXPONENT)
+
+        self.patients = patient_names(patients, self.rng)
+        self.patient_weights = zipf_cumulative_weights(len(self.patients), PATIENT_VISIT_EXPONENT)
+
+        self.days = [start + timedelta(days=offset) for offset in range((end - start).days or 1)]
+        self.day_weights = list(itertools.accumulate(
+            WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS[day.month - 1] for day in self.days
+        ))
+        # Appointment slots every 5 minutes, weighted by hour
+        self.slots = [timedelta(hours=hour, minutes=minute) for hour in HOUR_WEIGHTS for minute in range(0, 60, 5)]
+        self.slot_weights = list(itertools.accumulate(HOUR_WEIGHTS[slot.seconds // 3600] for slot in self.slots))
+        self.record_delays = [timedelta(minutes=minutes) for minutes in range(5, 91)]
+        self.code_counts = list(range(1, len(CODES_PER_CONSULTATION) + 1))
+        self.code_count_weights = list(itertools.accumulate(CODES_PER_CONSULTATION))
+        self.sentence_counts = list(range(1, NOTE_MAX_SENTENCES + 1))
+        self.sentence_count_weights = list(itertools.accumulate(
+            _lognormal_density(count, NOTE_SENTENCES_MU, NOTE_SENTENCES_SIGMA) for count in self.sentence_counts
+        ))
+
+        self.sentences = note_sentences(self.rng)
+        self.doctor_ids = sorted(doctor_ids)
+
+    def batch(self, first_id: int, count: int) -> Tuple[List[tuple], List[tuple]]:
+        """
+        Consultation rows (CONSULTATION_COLUMNS order) and (consultation_id, diagnosis_code_id)
+        links for count consultations with ids from first_id
+        """
+        # One choices() call per attribute per batch instead of per row
+        rng = self.rng
+        days = rng.choices(self.days, cum_weights=self.day_weights, k=count)
+        slots = rng.choices(self.slots, cum_weights=self.slot_weights, k=count)
+        delays = rng.choices(self.record_delays, k=count)
+        names = rng.choices(self.patients, cum_weights=self.patient_weights, k=count)
+        sentence_counts = rng.choices(self.sentence_counts, cum_weights=self.sentence_count_weights, k=count)
+        sentences = rng.choices(self.sentences, k=sum(sentence_counts))
+        code_counts = rng.choices(self.code_counts, cum_weights=self.code_count_weights, k=count)
+        codes = rng.choices(self.code_ids, cum_weights=self.code_weights, k=sum(code_counts))
+        # Drawn last so a database without doctors gets the same data as before doctors were tracked
+        doctors = rng.choices(self.doctor_ids, k=count) if self.doctor_ids else [None] * count
+
+        consultations = []
+        links = []
+        sentence_offset = 0
+        code_offset = 0
+        for consultation_id, day, slot, delay, name, sentence_count, code_count, doctor_id in zip(
+            range(first_id, first_id + count), days, slots, delays, names, sentence_counts, code_counts, doctors
+        ):
+            consultation_date = day + slot
+            consultations.append((
+                consultation_id,
+                name,
+                consultation_date,
+                " ".join(sentences[sentence_offset:sentence_offset + sentence_count]),
+                consultation_date + delay,
+                doctor_id,
+            ))
+            sentence_offset += sentence_count
+            # Popular codes can be drawn twice; the duplicate is dropped
+            for code_id in set(codes[code_offset:code_offset + code_count]):
+                links.append((consultation_id, code_id))
+            code_offset += code_count
+        return consultations, links
+
+
+@lru_cache(maxsize=None)
+def _sqlite_date(value: date) -> str:
+    return value.isoformat()
+
+
+@lru_cache(maxsize=None)
+def _sqlite_time(value: time_of_day) -> str:
+    return value.isoformat("microseconds")
+
+
+def _sqlite_datetime(value: datetime) -> str:
+    # Same text format SQLAlchemy's SQLite DateTime type stores; generated dates
+    # repeat a few thousand days and times, so both halves are formatted once
+    return f"{_sqlite_date(value.date())} {_sqlite_time(value.time())}"
+
+
+def _copy_rows(connection: Connection, table_name: str, columns: Sequence[str], rows: List[tuple]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _set_sqlite_pragmas(connection: Connection, pragmas: Dict[str, object]) -> Dict[str, object]:
+    """
+    Apply pragmas outside any transaction, returning their previous values
+    """
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        connection.exec_driver_sql(f"PRAGMA {name}={value}")
+    # End SQLAlchemy's autobegun transaction so the load can begin its own
+    connection.commit()
+    return previous
+
+
+class LoadCounts:
+    """
+    Diagnosis usage and rollup counts of the batches written so far
+
+    Counting consultation by consultation (UsageIncrements.add,
+    RollupIncrements.add) cost as much as writing the rows. Here each batch is
+    tallied a column at a time into per-day Counters, folded into the
+    increments once at the end.
+    """
+
+    def __init__(self, chapters: Dict[int, int]):
+        # ICD-10 chapter by diagnosis code id
+        self.chapters = chapters
+        self.daily: Counter = Counter()
+        self.doctors: Counter = Counter()
+        self.day_codes: Counter = Counter()
+        self.day_chapter_consultations: Counter = Counter()
+
+    def add(self, consultations: List[tuple], links: List[tuple]) -> None:
+        ids, _, dates, _, _, doctor_ids = zip(*consultations)
+        days = list(map(datetime.date, dates))
+        self.daily.update(days)
+        # A generator either has doctors for every row or for none
+        if doctor_ids[0] is not None:
+            self.doctors.update(zip(days, doctor_ids))
+        if not links:
+            return
+        link_ids, code_ids = zip(*links)
+        day_of = dict(zip(ids, days))
+        link_days = list(map(day_of.__getitem__, link_ids))
+        self.day_codes.update(zip(link_days, code_ids))
+        # A consultation counts once per chapter, however many of its codes fall in it
+        self.day_chapter_consultations.update(map(itemgetter(0, 2), set(
+            zip(link_days, link_ids, map(self.chapters.__getitem__, code_ids))
+        )))
+
+    def increments(self) -> Tuple[diagnosis_usage.UsageIncrements, analytics.RollupIncrements]:
+        usage = diagnosis_usage.UsageIncrements()
+        rollups = analytics.RollupIncrements()
+        rollups.daily.update(self.daily)
+        rollups.doctors.update(self.doctors)
+        rollups.chapter_consultations.update(self.day_chapter_consultations)
+        for (day, code_id), count in self.day_codes.items():
+            usage.totals[code_id] += count
+            usage.monthly[(diagnosis_usage.month_start(day), code_id)] += count
+            rollups.chapter_diagnoses[(day, self.chapters[code_id])] += count
+        return usage, rollups
+
+
+def _write_batch(connection: Connection, consultations: List[tuple], links: List[tuple]) -> None:
+    """
+    COPY on PostgreSQL (psycopg2), raw executemany on SQLite, Core executemany elsewhere
+    """
+    dialect = connection.dialect
+    if dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        _copy_rows(connection, Consultation.__tablename__, CONSULTATION_COLUMNS, consultations)
+        _copy_rows(connection, consultation_diagnoses.name, LINK_COLUMNS, links)
+    elif dialect.name == "sqlite":
+        # Skips SQLAlchemy's per-value bind processing, the main cost at this volume
+        placeholders = ", ".join("?" * len(CONSULTATION_COLUMNS))
+        connection.exec_driver_sql(
+            f"INSERT INTO {Consultation.__tablename__} ({', '.join(CONSULTATION_COLUMNS)}) VALUES ({placeholders})",
+            [
+                (i, name, _sqlite_datetime(date), notes, _sqlite_datetime(created), doctor_id)
+                for i, name, date, notes, created, doctor_id in consultations
+            ]
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {consultation_diagnoses.name} ({', '.join(LINK_COLUMNS)}) VALUES (?, ?)", links
+        )
+    else:
+        connection.execute(insert(Consultation.__table__), [dict(zip(CONSULTATION_COLUMNS, row)) for row in consultations])
+        connection.execute(insert(consultation_diagnoses), [dict(zip(LINK_COLUMNS, link)) for link in links])
+
+
+def generate_consultations(
+    count: int,
+    bind: Engine = engine,
+    seed: int = 0,
+    start: datetime = DEFAULT_START,
+    end: datetime = DEFAULT_END,
+    patients: Optional[int] = None
+) -> Dict[str, float]:
+    """
+    Append count synthetic consultations (ids continue after the current maximum)
+
+    Returns generation statistics.
+    """
+    started = time.perf_counter()
+    stats = {"consultations": 0, "diagnosis_links": 0}
+
+    with bind.begin() as connection:
+        codes = dict(connection.execute(select(DiagnosisCode.id, DiagnosisCode.code)).tuples().all())
+        doctor_ids = connection.execute(select(Doctor.id)).scalars().all()
+        first_id = (connection.execute(select(func.max(Consultation.id))).scalar() or 0) + 1
+    generator = ConsultationGenerator(
+        list(codes), seed=seed + first_id, start=start, end=end, patients=patients or max(1, count // 5),
+        doctor_ids=doctor_ids
+    )
+
+    dialect_name = bind.dialect.name
+    fulltext_trigger = f"{fulltext.FTS_TABLE}_ai"
+    # Sorting everything into fresh indexes at the end beats updating them row
+    # by row once the load is at least as large as what is already there
+    bulk_indexes = (
+        sorted(Consultation.__table__.indexes, key=lambda index: index.name)
+        + sorted(consultation_diagnoses.indexes, key=lambda index: index.name)
+    ) if count >= first_id - 1 else []
+
+    with bind.connect() as connection:
+        previous_pragmas = _set_sqlite_pragmas(connection, SQLITE_LOAD_PRAGMAS) if dialect_name == "sqlite" else {}
+        try:
+            with connection.begin():
+                # Indexing the new notes in one statement is far cheaper than a trigger call per row
+                suspend_fulltext = dialect_name == "sqlite" and connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"), {"name": fulltext_trigger}
+                ).first() is not None
+                if suspend_fulltext:
+                    connection.execute(text(f"DROP TRIGGER {fulltext_trigger}"))
+
+                for index in bulk_indexes:
+                    index.drop(connection)
+                # Counted across all batches and written once (a few rows per day and code)
+                counts = LoadCounts({code_id: icd10.chapter_for_code(code) for code_id, code in codes.items()})
+
+                for batch_start in range(first_id, first_id + count, BATCH_SIZE):
+                    consultations, links = generator.batch(batch_start, min(BATCH_SIZE, first_id + count - batch_start))
+                    _write_batch(connection, consultations, links)
+                    counts.add(consultations, links)
+                    stats["consultations"] += len(consultations)
+                    stats["diagnosis_links"] += len(links)
+
+                write_seconds = time.perf_counter() - started
+
+                usage, rollups = counts.increments()
+                for statement, params in usage.statements(dialect_name) + rollups.statements(dialect_name, shard=0):
+                    connection.execute(statement, params)
+                for index in bulk_indexes:
+                    index.create(connection)
+                if suspend_fulltext:
+                    connection.execute(
+                        text(f"INSERT INTO {fulltext.FTS_TABLE}(rowid, notes) SELECT id, notes FROM consultations WHERE id >= :first_id"),
+                        {"first_id": first_id}
+                    )
+                    fulltext.ensure_fulltext_index(connection)
+                if dialect_name == "postgresql":
+                    # Explicit ids bypass the sequence; move it past them
+                    connection.execute(text(
+                        "SELECT setval(pg_get_serial_sequence('consultations', 'id'), "
+                        "(SELECT COALESCE(MAX(id), 1) FROM consultations))"
+                    ))
+        finally:
+            # The connection goes back to the pool: restore its regular settings
+            _set_sqlite_pragmas(connection, previous_pragmas)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    # Drawing and writing the rows; counter upserts, index builds and full-text
+    # indexing are the database's own work afterwards and are reported apart
+    stats["write_seconds"] = round(write_seconds, 3)
+    stats["finish_seconds"] = round(elapsed - write_seconds, 3)
+    stats["consultations_per_second"] = round(stats["consultations"] / write_seconds) if write_seconds > 0 else 0
+    return stats
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    return (
+        f"consultations={stats['consultations']} diagnosis_links={stats['diagnosis_links']} "
+        f"written in {stats['write_seconds']}s ({stats['consultations_per_second']} consultations/sec), "
+        f"indexes and counts {stats['finish_seconds']}s, total {stats['seconds']}s"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic consultations")
+    parser.add_argument("count", type=int, help="Number of consultations to add")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same data)")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=DEFAULT_START, help="First consultation date")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=DEFAULT_END, help="Consultation dates end before this")
+    parser.add_argument("--patients", type=int, help="Distinct patient names (default: count / 5)")
+    args = parser.parse_args(argv)
+
+    # Create or migrate the schema the same way the app does (DB_SCHEMA_MODE)
+    prepare_schema()
+
+    try:
+        stats = generate_consultations(
+            args.count, seed=args.seed, start=args.start, end=args.end,
+            patients=args.patients
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print("Consultations generated: " + format_stats(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Bulk, idempotent ICD-10 loader
+Streams diagnosis codes from a CSV file or a CMS ICD-10-CM order file and
+synchronizes the diagnosis_codes table in batches, touching only changed rows.
+
+Usage:
+    python seed_data/load_icd10.py                                  # bundled 100 codes
+    python seed_data/load_icd10.py codes.csv                        # CSV with code,description
+    python seed_data/load_icd10.py icd10cm_order_2025.txt --billable-only
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.engine import Engine
+
+from app.database import engine
+from app.main import prepare_schema
+from app.models import DiagnosisCode, consultation_diagnoses
+from app.search_index import bump_catalog_revision
+
+DEFAULT_BATCH_SIZE = 5000
+CODE_MAX_LENGTH = DiagnosisCode.__table__.c.code.type.length
+
+
+def format_code(raw_code: str) -> str:
+    """
+    Insert the dot CMS files omit (E119 -> E11.9)
+    """
+    raw_code = raw_code.strip().upper()
+    if "." in raw_code or len(raw_code) <= 3:
+        return raw_code
+    return f"{raw_code[:3]}.{raw_code[3:]}"
+
+
+def read_csv(path: Path) -> Iterator[Dict[str, str]]:
+    """
+    Stream codes from a CSV file with code and description columns (header optional)
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        reader = csv.reader(handle)
+        for row in reader:
+            if len(row) < 2:
+                continue
+            code, description = row[0].strip(), row[1].strip()
+            if code.lower() == "code":
+                continue
+            yield {"code": format_code(code), "description": description}
+
+
+def read_cms_order_file(path: Path, billable_only: bool = False) -> Iterator[Dict[str, str]]:
+    """
+    Stream codes from a CMS ICD-10-CM order file (icd10cm_order_YYYY.txt)
+
+    Fixed-width layout: order number (1-5), code (7-13), billable flag (15),
+    short description (17-76), long description (78-)
+    """
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            line = line.rstrip("\r\n")
+            if len(line) < 17:
+                continue
+            if billable_only and line[14:15] != "1":
+                continue
+            description = line[77:].strip() or line[16:76].strip()
+            yield {"code": format_code(line[6:13]), "description": description}
+
+
+def read_source(path: Path, source_format: Optional[str] = None, billable_only: bool = False) -> Iterator[Dict[str, str]]:
+    """
+    Pick a reader from the explicit format or the file extension
+    """
+    source_format = source_format or ("csv" if path.suffix.lower() == ".csv" else "cms")
+    if source_format == "csv":
+        return read_csv(path)
+    return read_cms_order_file(path, billable_only=billable_only)
+
+
+def load_codes(
+    rows: Iterable[Dict[str, str]],
+    bind: Engine = engine,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    prune: bool = False,
+    dry_run: bool = False
+) -> Dict[str, float]:
+    """
+    Synchronize diagnosis_codes with rows in a single transaction
+
+    Existing codes are read once; new codes are bulk-inserted and changed
+    descriptions bulk-updated in batches, unchanged codes are not touched.
+    With prune=True, codes missing from rows and not used by any consultation
+    are deleted. Returns load statistics.
+    """
+    started = time.perf_counter()
+    table = DiagnosisCode.__table__
+    stats = {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "skipped": 0}
+
+    insert_statement = insert(table)
+    update_statement = update(table)\
+        .where(table.c.code == bindparam("b_code"))\
+        .values(description=bindparam("b_description"))
+
+    with bind.begin() as connection:
+        existing = dict(connection.execute(select(table.c.code, table.c.description)).all())
+        seen = set()
+        inserts: List[dict] = []
+        updates: List[dict] = []
+
+        def flush(final: bool = False):
+            if inserts and (final or len(inserts) >= batch_size):
+                if not dry_run:
+                    connection.execute(insert_statement, inserts)
+                stats["inserted"] += len(inserts)
+                inserts.clear()
+            if updates and (final or len(updates) >= batch_size):
+                if not dry_run:
+                    connection.execute(update_statement, updates)
+                stats["updated"] += len(updates)
+                updates.clear()
+
+        for row in rows:
+            stats["read"] += 1
+            code, description = row["code"], row["description"]
+            if not code or not description or len(code) > CODE_MAX_LENGTH or code in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(code)
+
+            current = existing.get(code)
+            if current is None:
+                inserts.append({"code": code, "description": description})
+            elif current != description:
+                updates.append({"b_code": code, "b_description": description})
+            else:
+                stats["unchanged"] += 1
+            flush()
+        flush(final=True)
+
+        if prune:
+            stale = [code for code in existing if code not in seen]
+            used = select(consultation_diagnoses.c.diagnosis_code_id)
+            for start in range(0, len(stale), batch_size):
+                chunk = stale[start:start + batch_size]
+                if dry_run:
+                    stats["deleted"] += len(chunk)
+                    continue
+                result = connection.execute(
+                    delete(table).where(table.c.code.in_(chunk), table.c.id.not_in(used))
+                )
+                stats["deleted"] += result.rowcount
+
+        # Let running API processes know the catalog changed
+        if not dry_run and (stats["inserted"] or stats["updated"] or stats["deleted"]):
+            bump_catalog_revision(connection)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["read"] / elapsed) if elapsed > 0 else 0
+    return stats
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    return (
+        f"read={stats['read']} inserted={stats['inserted']} updated={stats['updated']} "
+        f"unchanged={stats['unchanged']} deleted={stats['deleted']} skipped={stats['skipped']} "
+        f"in {stats['seconds']}s ({stats['rows_per_second']} rows/sec)"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load ICD-10 diagnosis codes into the database")
+    parser.add_argument("source", nargs="?", help="CSV or CMS order file (defaults to the bundled codes)")
+    parser.add_argument("--format", choices=["csv", "cms"], help="Source format (default: by file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per bulk statement")
+    parser.add_argument("--billable-only", action="store_true", help="CMS files: skip non-billable header codes")
+    parser.add_argument("--prune", action="store_true", help="Delete unused codes missing from the source")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    args = parser.parse_args(argv)
+
+    # Create or migrate the schema the same way the app does (DB_SCHEMA_MODE)
+    prepare_schema()
+
+    if args.source:
+        path = Path(args.source)
+        if not path.exists():
+            print(f"Source file not found: {path}")
+            return 1
+        rows = read_source(path, args.format, billable_only=args.billable_only)
+    else:
+        from icd10_codes import ICD10_CODES
+        rows = iter(ICD10_CODES)
+
+    stats = load_codes(rows, batch_size=args.batch_size, prune=args.prune, dry_run=args.dry_run)
+    print(("[dry run] " if args.dry_run else "") + "ICD-10 load: " + format_stats(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
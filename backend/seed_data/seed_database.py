@@ -8,53 +8,30 @@ from pathlib import Path
 # Add parent directory to path to import app modules
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.database import SessionLocal, engine, Base
+from app.database import SessionLocal
+from app.main import prepare_schema
 from app.models import DiagnosisCode, Doctor
 from app.auth import get_password_hash
 from icd10_codes import ICD10_CODES
+from load_icd10 import load_codes, format_stats
 
 def seed_diagnosis_codes():
-    """Seed the database with ICD-10 diagnosis codes"""
-    db = SessionLocal()
-    
+    """Seed the database with ICD-10 diagnosis codes (idempotent, non-interactive)"""
     try:
-        # Check if data already exists
-        existing_count = db.query(DiagnosisCode).count()
-        
-        if existing_count > 0:
-            print(f"Database already contains {existing_count} diagnosis codes.")
-            response = input("Do you want to clear and re-seed diagnosis codes? (yes/no): ")
-            
-            if response.lower() == 'yes':
-                db.query(DiagnosisCode).delete()
-                db.commit()
-                print("Cleared existing diagnosis codes.")
-            else:
-                print("Skipping diagnosis codes seeding.")
-                return
-        
-        # Insert diagnosis codes
         print(f"Seeding {len(ICD10_CODES)} ICD-10 diagnosis codes...")
-        
-        for code_data in ICD10_CODES:
-            diagnosis_code = DiagnosisCode(
-                code=code_data["code"],
-                description=code_data["description"]
-            )
-            db.add(diagnosis_code)
-        
-        db.commit()
-        print(f"✓ Successfully seeded {len(ICD10_CODES)} diagnosis codes!")
+        stats = load_codes(ICD10_CODES)
+        print(f"✓ Diagnosis codes up to date: {format_stats(stats)}")
         
         # Verify
-        total_count = db.query(DiagnosisCode).count()
-        print(f"Total diagnosis codes in database: {total_count}")
+        db = SessionLocal()
+        try:
+            total_count = db.query(DiagnosisCode).count()
+            print(f"Total diagnosis codes in database: {total_count}")
+        finally:
+            db.close()
         
     except Exception as e:
         print(f"Error seeding diagnosis codes: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 def seed_default_doctor():
     """Create a default doctor account for testing"""
@@ -100,8 +77,8 @@ if __name__ == "__main__":
     print("ClinicCare Mini EMR - Database Seeding")
     print("=" * 50)
     
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    # Create or migrate the schema the same way the app does (DB_SCHEMA_MODE)
+    prepare_schema()
     
     # Seed diagnosis codes
     seed_diagnosis_codes()
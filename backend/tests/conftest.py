@@ -0,0 +1,102 @@
+"""
+Shared fixtures: the API on a throwaway SQLite database with the seed ICD-10 codes
+
+Settings are read from the environment when app modules are imported, so the
+database URL and snapshot directory are set before the first import.
+"""
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+_DATA_DIR = tempfile.mkdtemp(prefix="cliniccare-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DATA_DIR}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["ICD10_CATALOG_DIR"] = os.path.join(_DATA_DIR, "catalog")
+os.environ["DB_SCHEMA_MODE"] = "create_all"
+os.environ["BCRYPT_ROUNDS"] = "4"
+# Off by default; query_count() reads statement counts from the header
+os.environ["SERVER_TIMING"] = "true"
+
+# Add parent directory to path to import app modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+
+from app import models
+from app.database import Base, engine
+from app.main import app
+from seed_data.icd10_codes import ICD10_CODES
+
+_SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+# Tables holding consultations and everything derived from them
+_CONSULTATION_TABLES = (
+    models.consultation_diagnoses,
+    models.DiagnosisUsageMonthly.__table__,
+    models.DiagnosisUsage.__table__,
+    models.ConsultationDailyChapterStats.__table__,
+    models.ConsultationDailyDoctorStats.__table__,
+    models.ConsultationDailyStats.__table__,
+    models.Consultation.__table__,
+)
+
+
+def query_count(response) -> int:
+    """
+    SQL statements run for a request, from its Server-Timing header
+    """
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+@pytest.fixture(scope="session")
+def client():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.DiagnosisCode), ICD10_CODES)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    response = client.post("/api/auth/register", json={
+        "username": "test_doctor",
+        "email": "test_doctor@example.com",
+        "full_name": "Test Doctor",
+        "password": "test-password"
+    })
+    assert response.status_code == 201, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(autouse=True)
+def empty_consultations(client):
+    """
+    Start every test without consultations
+    """
+    with engine.begin() as connection:
+        for table in _CONSULTATION_TABLES:
+            connection.execute(delete(table))
+    yield
+
+
+def create_consultations(client, headers, count: int, codes_per_consultation: int = 2, day: int = 1):
+    """
+    Create count consultations through the batch endpoint, returning their ids
+    """
+    response = client.post("/api/consultation/batch", headers=headers, json={"consultations": [
+        {
+            "patient_name": f"Patient {index}",
+            "consultation_date": f"2024-01-{day:02d}T{8 + index % 10:02d}:{index % 60:02d}:00",
+            "notes": f"Routine follow-up visit number {index}",
+            "diagnosis_code_ids": [1 + (index + offset) % 50 for offset in range(codes_per_consultation)]
+        }
+        for index in range(count)
+    ]})
+    assert response.status_code == 201, response.text
+    return [result["id"] for result in response.json()["results"]]
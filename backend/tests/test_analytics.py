@@ -0,0 +1,193 @@
+"""
+Consultation analytics: the rollup endpoints, sharded increments and the backfill
+"""
+import random
+from collections import Counter
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, literal, select
+
+from app import analytics, icd10, models
+from app.database import SessionLocal, engine
+from seed_data.icd10_codes import ICD10_CODES
+
+from .conftest import create_consultations
+
+JANUARY = "date_from=2024-01-01&date_to=2024-02-01"
+
+
+@pytest.fixture
+def spread_shards(monkeypatch):
+    """
+    Seeded shard choice, so writes land on several shards reproducibly
+    """
+    monkeypatch.setattr(analytics, "random", random.Random(3))
+
+
+@pytest.fixture
+def second_doctor(client):
+    response = client.post("/api/auth/register", json={
+        "username": "analytics_doctor",
+        "email": "analytics_doctor@example.com",
+        "full_name": "Analytics Doctor",
+        "password": "test-password"
+    })
+    assert response.status_code == 201, response.text
+    yield {"Authorization": f"Bearer {response.json()['access_token']}"}
+    with SessionLocal() as db:
+        db.query(models.Doctor).filter(models.Doctor.username == "analytics_doctor").delete()
+        db.commit()
+
+
+def _create_one(client, headers, day, code_ids):
+    response = client.post("/api/consultation", headers=headers, json={
+        "patient_name": "Jane Doe",
+        "consultation_date": f"2024-01-{day:02d}T10:00:00",
+        "notes": "Follow-up",
+        "diagnosis_code_ids": code_ids
+    })
+    assert response.status_code == 201, response.text
+
+
+def _analytics(client, headers, query=JANUARY):
+    return {
+        name: client.get(f"/api/analytics/{name}?{query}", headers=headers).json()
+        for name in ("daily", "doctors", "chapters")
+    }
+
+
+def _expected_chapters():
+    """
+    (chapter, consultations, diagnoses) computed from the base tables with chapter_for_code
+    """
+    with SessionLocal() as db:
+        links = db.execute(
+            select(models.consultation_diagnoses.c.consultation_id, models.DiagnosisCode.code)
+            .join(models.DiagnosisCode, models.DiagnosisCode.id == models.consultation_diagnoses.c.diagnosis_code_id)
+        ).all()
+    diagnoses = Counter(icd10.chapter_for_code(code) for _, code in links)
+    consultations = Counter(chapter for _, chapter in {(cid, icd10.chapter_for_code(code)) for cid, code in links})
+    return [(chapter, consultations[chapter], diagnoses[chapter]) for chapter in sorted(diagnoses)]
+
+
+def test_daily_counts_include_empty_days(client, auth_headers, spread_shards):
+    create_consultations(client, auth_headers, 12, day=3)
+    create_consultations(client, auth_headers, 5, day=4)
+    for _ in range(4):
+        _create_one(client, auth_headers, 4, [1])
+
+    response = client.get("/api/analytics/daily?date_from=2024-01-02&date_to=2024-01-06", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 21
+    assert body["days"] == [
+        {"day": "2024-01-02", "consultations": 0},
+        {"day": "2024-01-03", "consultations": 12},
+        {"day": "2024-01-04", "consultations": 9},
+        {"day": "2024-01-05", "consultations": 0},
+    ]
+
+    # Separate transactions added to different shards of the same day
+    with SessionLocal() as db:
+        shards = db.execute(
+            select(models.ConsultationDailyStats.shard).where(models.ConsultationDailyStats.day == date(2024, 1, 4))
+        ).scalars().all()
+    assert len(shards) > 1
+    assert all(0 <= shard < analytics.ROLLUP_SHARDS for shard in shards)
+
+
+def test_doctor_counts_are_ordered(client, auth_headers, second_doctor):
+    create_consultations(client, auth_headers, 3, day=5)
+    create_consultations(client, second_doctor, 7, day=6)
+
+    doctors = client.get(f"/api/analytics/doctors?{JANUARY}", headers=auth_headers).json()["doctors"]
+    assert [(row["username"], row["consultations"]) for row in doctors] == [("analytics_doctor", 7), ("test_doctor", 3)]
+    assert doctors[0]["full_name"] == "Analytics Doctor"
+
+    only_day_5 = client.get("/api/analytics/doctors?date_from=2024-01-05&date_to=2024-01-06", headers=auth_headers)
+    assert [row["username"] for row in only_day_5.json()["doctors"]] == ["test_doctor"]
+
+
+def test_chapter_counts_match_the_base_tables(client, auth_headers, spread_shards):
+    create_consultations(client, auth_headers, 40, codes_per_consultation=3, day=7)
+    create_consultations(client, auth_headers, 25, codes_per_consultation=4, day=8)
+
+    chapters = client.get(f"/api/analytics/chapters?{JANUARY}", headers=auth_headers).json()["chapters"]
+    assert [(row["chapter"], row["consultations"], row["diagnoses"]) for row in chapters] == _expected_chapters()
+    for row in chapters:
+        assert row["title"] == icd10.chapter_title(row["chapter"])
+        assert row["range"] == icd10.chapter_range(row["chapter"])
+
+
+def test_invalid_ranges_and_authentication(client, auth_headers):
+    for name in ("daily", "doctors", "chapters"):
+        assert client.get(f"/api/analytics/{name}").status_code == 401
+        reversed_range = client.get(f"/api/analytics/{name}?date_from=2024-02-01&date_to=2024-01-01", headers=auth_headers)
+        assert reversed_range.status_code == 400
+        too_long = client.get(f"/api/analytics/{name}?date_from=2000-01-01&date_to=2024-01-01", headers=auth_headers)
+        assert too_long.status_code == 400
+
+
+def test_backfill_matches_the_incremental_counts(client, auth_headers, second_doctor, spread_shards):
+    for day in (2, 9, 30):
+        create_consultations(client, auth_headers, 15, codes_per_consultation=3, day=day)
+        create_consultations(client, second_doctor, 6, day=day)
+        _create_one(client, second_doctor, day, [1, 2, 3])
+    incremental = _analytics(client, auth_headers)
+    assert incremental["daily"]["total"] == 66
+
+    stats = analytics.backfill(engine, chunk_days=7)
+    assert stats["days"] == 29 and stats["chunks"] == 5
+    assert _analytics(client, auth_headers) == incremental
+
+    # The backfill folds each day (and day and chapter) back into shard 0
+    with SessionLocal() as db:
+        for table in (models.ConsultationDailyStats, models.ConsultationDailyChapterStats):
+            assert db.execute(select(func.max(table.shard))).scalar() == 0
+        assert db.execute(select(func.count()).select_from(models.ConsultationDailyStats)).scalar() == 3
+
+
+def test_increments_go_to_one_shard():
+    increments = analytics.RollupIncrements()
+    increments.add([
+        (datetime(2024, 1, 2, 9), 1, ["E11.9", "E10.9", "I10"]),
+        (datetime(2024, 1, 2, 10), None, ["I10"]),
+        (datetime(2024, 1, 1, 10), 2, []),
+    ])
+    daily, doctors, chapters = increments.statements("sqlite", shard=5)
+    assert daily[1] == [
+        {"day": date(2024, 1, 1), "shard": 5, "consultation_count": 1},
+        {"day": date(2024, 1, 2), "shard": 5, "consultation_count": 2},
+    ]
+    assert [(row["day"], row["doctor_id"]) for row in doctors[1]] == [(date(2024, 1, 1), 2), (date(2024, 1, 2), 1)]
+    assert chapters[1] == [
+        {"day": date(2024, 1, 2), "chapter": 4, "shard": 5, "consultation_count": 1, "diagnosis_count": 2},
+        {"day": date(2024, 1, 2), "chapter": 9, "shard": 5, "consultation_count": 2, "diagnosis_count": 2},
+    ]
+
+    shards = {increments.statements("sqlite")[0][1][0]["shard"] for _ in range(200)}
+    assert shards == set(range(analytics.ROLLUP_SHARDS))
+    assert analytics.increment_statements("mysql", [(datetime(2024, 1, 1), 1, ["I10"])]) == []
+
+
+def _boundary_codes():
+    codes = {row["code"] for row in ICD10_CODES}
+    for chapter in icd10.CHAPTERS:
+        codes.update({chapter.first, chapter.last, f"{chapter.first}.0", f"{chapter.last}.9", chapter.last.lower()})
+        # One category either side of each range
+        for bound, step in ((chapter.first, -1), (chapter.last, 1)):
+            letter, number = bound[0], bound[1:]
+            if number.isdigit():
+                codes.add(f"{letter}{int(number) + step:02d}"[:3])
+    codes.update({"", "E", "E1", "00", "123", "ZZZ", "O9A.1", "O9B", "u07.1", " i10", "Ü10"})
+    return sorted(codes)
+
+
+def test_chapter_for_code_matches_chapter_expression(client):
+    codes = _boundary_codes()
+    with engine.connect() as connection:
+        in_sql = {code: connection.scalar(select(icd10.chapter_expression(literal(code)))) for code in codes}
+    assert {code: icd10.chapter_for_code(code) for code in codes} == in_sql
+    assert in_sql["O9A"] == 15 and in_sql["O9B"] == icd10.UNCLASSIFIED_CHAPTER
+    assert (in_sql["u07.1"], in_sql[" i10"]) == (22, 9)
@@ -0,0 +1,99 @@
+"""
+Token and doctor caches behind get_current_doctor
+"""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app import auth, models
+from app.database import SessionLocal
+from app.dependencies import doctor_cache, token_cache
+
+from .conftest import query_count
+
+
+@pytest.fixture
+def doctor_headers(client):
+    """
+    A doctor of its own, so deactivating it does not affect other tests
+    """
+    def register(username):
+        response = client.post("/api/auth/register", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "full_name": username.replace("_", " ").title(),
+            "password": "test-password"
+        })
+        assert response.status_code == 201, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    headers = register("cached_doctor"), register("other_doctor")
+    yield headers
+    with SessionLocal() as db:
+        db.query(models.Doctor).filter(models.Doctor.username.in_(["cached_doctor", "other_doctor"])).delete()
+        db.commit()
+    token_cache.clear()
+    doctor_cache.clear()
+
+
+def _set_active(username, active):
+    with SessionLocal() as db:
+        doctor = db.execute(select(models.Doctor).where(models.Doctor.username == username)).scalar_one()
+        doctor.is_active = active
+        db.commit()
+
+
+def test_repeat_requests_skip_the_database(client, doctor_headers):
+    headers, _ = doctor_headers
+    token_cache.clear()
+    doctor_cache.clear()
+
+    first = client.get("/api/auth/me", headers=headers)
+    assert first.status_code == 200
+    assert query_count(first) == 1
+    token_hits, doctor_hits = token_cache.hits, doctor_cache.hits
+
+    second = client.get("/api/auth/me", headers=headers)
+    assert second.json() == first.json()
+    assert query_count(second) == 0
+    assert (token_cache.hits, doctor_cache.hits) == (token_hits + 1, doctor_hits + 1)
+
+
+def test_deactivating_a_doctor_evicts_it(client, doctor_headers):
+    headers, other_headers = doctor_headers
+    client.get("/api/auth/me", headers=headers)
+    client.get("/api/auth/me", headers=other_headers)
+    assert doctor_cache.get("cached_doctor") is not None
+
+    _set_active("cached_doctor", False)
+    assert doctor_cache.get("cached_doctor") is None
+    # Only the changed doctor is evicted
+    assert doctor_cache.get("other_doctor") is not None
+    assert client.get("/api/auth/me", headers=headers).status_code == 403
+
+    _set_active("cached_doctor", True)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+
+def test_bulk_update_clears_the_doctor_cache(client, doctor_headers):
+    headers, other_headers = doctor_headers
+    client.get("/api/auth/me", headers=headers)
+    client.get("/api/auth/me", headers=other_headers)
+    assert len(doctor_cache) >= 2
+
+    with SessionLocal() as db:
+        db.execute(
+            update(models.Doctor).where(models.Doctor.username == "cached_doctor").values(is_active=False),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    assert len(doctor_cache) == 0
+    assert client.get("/api/auth/me", headers=headers).status_code == 403
+    assert client.get("/api/auth/me", headers=other_headers).status_code == 200
+
+
+def test_expired_token_is_not_cached(client, doctor_headers):
+    expired = auth.create_access_token({"sub": "cached_doctor"}, expires_delta=timedelta(seconds=-1))
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+    assert token_cache.get(expired) is None
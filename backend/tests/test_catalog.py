@@ -0,0 +1,146 @@
+"""
+ICD-10 catalog snapshots: hierarchy lookups, private directory, checksum and per-deployment cleanup
+"""
+import asyncio
+import os
+import stat
+from types import SimpleNamespace
+
+import pytest
+
+from app.catalog import Icd10Catalog, ensure_private_directory, write_snapshot
+
+ROWS = [(1, "E11", "Type 2 diabetes mellitus"), (2, "E11.9", "Without complications"), (3, "J45", "Asthma")]
+
+
+class FakeIndex:
+    def __init__(self, version, rows=ROWS):
+        self.catalog_version = version
+        self.rows = rows
+
+    def all_codes(self):
+        return [SimpleNamespace(id=code_id, code=code, description=description) for code_id, code, description in self.rows]
+
+
+HIERARCHY_ROWS = [
+    (1, "E11", "Type 2 diabetes mellitus"),
+    (2, "E11.6", "With other specified complications"),
+    (3, "E11.65", "With hyperglycemia"),
+    (4, "E11.9", "Without complications"),
+    (5, "E119", "Duplicate spelling of E11.9"),
+    (6, "I10.1", "Subcode whose category is missing"),
+    (7, "E1", "Malformed short code"),
+    (8, "J45", "Asthma"),
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    hierarchy = Icd10Catalog(str(tmp_path))
+    hierarchy.ensure_current(FakeIndex("v1", HIERARCHY_ROWS))
+    return hierarchy
+
+
+def _codes(entries):
+    return [entry.code for entry in entries]
+
+
+def test_parents_and_children(catalog):
+    entry = catalog.get("e1165")
+    assert (entry.id, entry.code, entry.chapter) == (3, "E11.65", 4)
+    assert _codes(catalog.ancestors(entry)) == ["E11.6", "E11"]
+    assert _codes(catalog.children(catalog.get("E11"))) == ["E11.6", "E11.9"]
+    assert _codes(catalog.children(entry)) == []
+    assert catalog.get("E11").descendants == 3
+    assert _codes(catalog.descendants(catalog.get("E11"), offset=1, limit=5)[0]) == ["E11.65", "E11.9"]
+    # The lower id wins among spellings of the same code
+    assert catalog.get("E11.9").id == 4
+    assert catalog.get_by_id(4).code == "E11.9"
+    assert catalog.get_by_id(5) is None
+
+
+def test_missing_category_gets_a_node(catalog):
+    category = catalog.get("I10")
+    assert (category.id, category.description, category.is_category) == (None, "", True)
+    assert _codes(catalog.children(category)) == ["I10.1"]
+    assert _codes(catalog.ancestors(catalog.get("I10.1"))) == ["I10"]
+
+
+def test_chapters_and_categories(catalog):
+    counts = {summary.chapter.number: (summary.categories, summary.codes) for summary in catalog.chapters()}
+    # The added I10 node is a category but not a catalog code
+    assert counts[4] == (1, 4)
+    assert counts[9] == (1, 1)
+    assert counts[10] == (1, 1)
+    assert _codes(catalog.categories(4)) == ["E11"]
+    assert catalog.categories(99) == []
+
+
+def test_short_codes_are_not_categories(catalog):
+    assert catalog.get("E1") is None
+    assert "E1" not in _codes(catalog.categories(4))
+    assert _codes(catalog.ancestors(catalog.get("E11"))) == []
+
+
+def test_refresh_maps_in_a_worker_thread(tmp_path):
+    catalog = Icd10Catalog(str(tmp_path))
+
+    async def scenario():
+        await catalog.refresh(FakeIndex("v1"))
+        assert catalog.version == "v1"
+        # With a snapshot mapped, the update runs in the background
+        await catalog.refresh(FakeIndex("v2"))
+        assert catalog.version == "v1"
+        await catalog._refresh_task
+        assert catalog.version == "v2"
+
+    asyncio.run(scenario())
+
+
+def test_directory_is_created_private(tmp_path):
+    directory = tmp_path / "catalog"
+    Icd10Catalog(str(directory)).ensure_current(FakeIndex("v1"))
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+def test_open_directory_is_restricted(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o777)
+    ensure_private_directory(str(directory))
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+def test_tampered_snapshot_is_rewritten(tmp_path):
+    catalog = Icd10Catalog(str(tmp_path))
+    path = catalog.snapshot_path("v1")
+    write_snapshot(path, "v1", [(1, "E11", "Planted description"), *ROWS[1:]])
+    with open(path, "r+b") as snapshot:
+        snapshot.seek(-3, os.SEEK_END)
+        snapshot.write(b"XYZ")
+
+    catalog.ensure_current(FakeIndex("v1"))
+    assert catalog.get("E11").description == "Type 2 diabetes mellitus"
+    assert catalog.get("J45").description == "Asthma"
+
+
+def test_only_own_stale_snapshots_are_removed(tmp_path):
+    ours = Icd10Catalog(str(tmp_path), deployment="ours")
+    theirs = Icd10Catalog(str(tmp_path), deployment="theirs")
+    theirs.ensure_current(FakeIndex("v1"))
+    ours.ensure_current(FakeIndex("v1"))
+    ours.ensure_current(FakeIndex("v2"))
+
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        os.path.basename(ours.snapshot_path("v2")), os.path.basename(theirs.snapshot_path("v1"))
+    ])
+    assert theirs.get("E11.9").id == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="needs root to create a foreign directory")
+def test_foreign_directory_is_refused(tmp_path):
+    directory = tmp_path / "foreign"
+    directory.mkdir(mode=0o700)
+    os.chown(directory, 65534, 65534)
+    with pytest.raises(PermissionError):
+        ensure_private_directory(str(directory))
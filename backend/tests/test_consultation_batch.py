@@ -0,0 +1,38 @@
+"""
+Batch consultation create reports invalid items like a single create
+"""
+
+def _consultation(code_ids):
+    return {
+        "patient_name": "Jane Doe",
+        "consultation_date": "2024-03-01T09:30:00",
+        "notes": "Follow-up",
+        "diagnosis_code_ids": code_ids
+    }
+
+
+def test_batch_errors_match_single_create(client, auth_headers):
+    invalid = [[1, 1], [999999], [2, 999999, 2]]
+    response = client.post("/api/consultation/batch", headers=auth_headers, json={
+        "consultations": [_consultation([1, 2])] + [_consultation(code_ids) for code_ids in invalid]
+    })
+    assert response.status_code == 201
+    body = response.json()
+    assert body["created"] == 1 and body["failed"] == 3
+    assert body["results"][0]["status"] == "created"
+
+    for code_ids, result in zip(invalid, body["results"][1:]):
+        single = client.post("/api/consultation", headers=auth_headers, json=_consultation(code_ids))
+        assert result["status"] == "error"
+        assert result["status_code"] == single.status_code
+        assert result["error"] == single.json()["detail"]
+
+
+def test_atomic_batch_with_duplicates_creates_nothing(client, auth_headers):
+    response = client.post("/api/consultation/batch", headers=auth_headers, json={
+        "consultations": [_consultation([1]), _consultation([3, 3])],
+        "atomic": True
+    })
+    assert response.status_code == 422
+    listed = client.get("/api/consultation?count=exact", headers=auth_headers).json()
+    assert listed["total"] == 0
@@ -0,0 +1,66 @@
+"""
+Streaming consultation export across several server-side cursor partitions
+"""
+import csv
+import io
+import json
+
+from app import crud_async
+from app.routers import consultation as consultation_router
+from tests.conftest import create_consultations
+
+CHUNK_SIZE = 7
+
+
+def _stream_in_small_chunks(monkeypatch):
+    """
+    Shrink EXPORT_CHUNK_SIZE and record the size of every streamed chunk
+    """
+    chunks = []
+    stream = crud_async.stream_consultation_rows
+
+    async def recording_stream(*args, **kwargs):
+        async for rows in stream(*args, **kwargs):
+            chunks.append(len(rows))
+            yield rows
+
+    monkeypatch.setattr(consultation_router, "EXPORT_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(crud_async, "stream_consultation_rows", recording_stream)
+    return chunks
+
+
+def _expected(client, headers, ids):
+    details = [client.get(f"/api/consultation/{consultation_id}", headers=headers).json() for consultation_id in ids]
+    details.sort(key=lambda item: (item["consultation_date"], item["id"]))
+    return details
+
+
+def test_ndjson_export_spans_partitions(client, auth_headers, monkeypatch):
+    ids = create_consultations(client, auth_headers, 25, codes_per_consultation=3)
+    chunks = _stream_in_small_chunks(monkeypatch)
+
+    response = client.get("/api/consultation/export?format=ndjson", headers=auth_headers)
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+
+    assert chunks == [7, 7, 7, 4]
+    expected = _expected(client, auth_headers, ids)
+    assert [item["id"] for item in exported] == [item["id"] for item in expected]
+    for row, detail in zip(exported, expected):
+        assert sorted(code["code"] for code in row["diagnosis_codes"]) == sorted(code["code"] for code in detail["diagnosis_codes"])
+
+
+def test_csv_export_spans_partitions(client, auth_headers, monkeypatch):
+    ids = create_consultations(client, auth_headers, 15, codes_per_consultation=2)
+    chunks = _stream_in_small_chunks(monkeypatch)
+
+    response = client.get("/api/consultation/export?format=csv", headers=auth_headers)
+    assert response.status_code == 200
+    header, *rows = list(csv.reader(io.StringIO(response.text)))
+
+    assert len(chunks) == 3
+    assert header == consultation_router.EXPORT_CSV_COLUMNS
+    expected = _expected(client, auth_headers, ids)
+    assert [int(row[0]) for row in rows] == [item["id"] for item in expected]
+    for row, detail in zip(rows, expected):
+        assert sorted(row[-1].split(";")) == sorted(code["code"] for code in detail["diagnosis_codes"])
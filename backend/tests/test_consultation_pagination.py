@@ -0,0 +1,44 @@
+"""
+Keyset pagination of the consultation list
+"""
+from tests.conftest import create_consultations, query_count
+
+
+def _page(client, headers, cursor=None, limit=5):
+    url = f"/api/consultation?limit={limit}&count=none"
+    if cursor:
+        url += f"&cursor={cursor}"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_cursor_is_stable_across_inserts(client, auth_headers):
+    create_consultations(client, auth_headers, 20, day=10)
+    first = _page(client, auth_headers).json()
+    expected = [item["id"] for item in _page(client, auth_headers, first["next_cursor"], limit=15).json()["consultations"]]
+
+    # Newer consultations land before the cursor, older ones after the last page
+    create_consultations(client, auth_headers, 5, day=20)
+    create_consultations(client, auth_headers, 3, day=1)
+
+    seen = []
+    cursor = first["next_cursor"]
+    while cursor and len(seen) < len(expected):
+        page = _page(client, auth_headers, cursor).json()
+        seen.extend(item["id"] for item in page["consultations"])
+        cursor = page["next_cursor"]
+
+    assert seen[:len(expected)] == expected
+    assert len(set(seen)) == len(seen)
+
+
+def test_later_pages_run_the_same_statements(client, auth_headers):
+    create_consultations(client, auth_headers, 30)
+    response = _page(client, auth_headers)
+    first_count = query_count(response)
+    cursor = response.json()["next_cursor"]
+    for _ in range(4):
+        response = _page(client, auth_headers, cursor)
+        assert query_count(response) == first_count
+        cursor = response.json()["next_cursor"]
@@ -0,0 +1,41 @@
+"""
+Regression tests: consultation endpoints run a fixed number of SQL statements
+"""
+from sqlalchemy import inspect
+
+from app.database import engine
+from tests.conftest import create_consultations, query_count
+
+
+def test_list_query_count_does_not_grow_with_limit(client, auth_headers):
+    create_consultations(client, auth_headers, 40, codes_per_consultation=3)
+
+    counts = {}
+    for limit in (1, 10, 30):
+        response = client.get(f"/api/consultation?limit={limit}&count=none", headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json()["consultations"]) == limit
+        counts[limit] = query_count(response)
+
+    assert counts[1] > 0
+    assert counts[1] == counts[10] == counts[30], counts
+
+
+def test_detail_query_count_does_not_grow_with_codes(client, auth_headers):
+    few, = create_consultations(client, auth_headers, 1, codes_per_consultation=1)
+    many, = create_consultations(client, auth_headers, 1, codes_per_consultation=8)
+
+    counts = []
+    for consultation_id, codes in ((few, 1), (many, 8)):
+        response = client.get(f"/api/consultation/{consultation_id}", headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json()["diagnosis_codes"]) == codes
+        counts.append(query_count(response))
+
+    assert counts[0] == counts[1], counts
+
+
+def test_association_table_is_indexed(client):
+    indexes = {index["name"] for index in inspect(engine).get_indexes("consultation_diagnoses")}
+    assert "ix_consultation_diagnoses_consultation_id" in indexes
+    assert "ix_consultation_diagnoses_diagnosis_code_id" in indexes
@@ -0,0 +1,40 @@
+"""
+HTTP caching of diagnosis responses: ETag, Cache-Control and If-None-Match -> 304
+"""
+import pytest
+
+from app.search_index import diagnosis_index
+
+CATALOG_URLS = ["/api/diagnosis?search=diab", "/api/diagnosis/chapters", "/api/diagnosis/hierarchy/E11"]
+
+
+@pytest.mark.parametrize("url", CATALOG_URLS)
+def test_etag_is_the_catalog_version(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{diagnosis_index.catalog_version}"'
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+
+@pytest.mark.parametrize("url", CATALOG_URLS)
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_if_none_match_is_not_modified(client, url, if_none_match):
+    etag = client.get(url).headers["etag"]
+    response = client.get(url, headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.parametrize("url", CATALOG_URLS)
+def test_stale_etag_gets_the_full_response(client, url):
+    response = client.get(url, headers={"If-None-Match": '"0000000000000000"'})
+    assert response.status_code == 200
+    assert response.content
+
+
+def test_popular_search_is_not_revalidated(client):
+    etag = client.get("/api/diagnosis?search=diab").headers["etag"]
+    response = client.get("/api/diagnosis?search=diab&popular=true", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
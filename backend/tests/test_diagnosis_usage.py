@@ -0,0 +1,202 @@
+"""
+Precomputed diagnosis usage: counter upserts, rebuilds and popularity boosts
+"""
+from collections import Counter
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+
+from app import models
+from app.database import Base, SessionLocal, engine
+from app.diagnosis_usage import POPULARITY_BOOST, UsageCounts, UsageIncrements, _boosts, increment_statements, rebuild_usage, record_usage
+from app.search_index import (
+    SCORE_CODE_PREFIX,
+    SCORE_COVERAGE_BONUS,
+    SCORE_FUZZY,
+    SCORE_SUBSTRING,
+    SCORE_WHOLE_WORD,
+    SCORE_WORD_PREFIX,
+    DiagnosisSearchIndex,
+    diagnosis_index,
+)
+from seed_data.icd10_codes import ICD10_CODES
+
+from .conftest import create_consultations
+from .test_search_index import ROWS
+
+SEARCH_TERMS = [
+    "e", "e1", "E11", "i10", "j45", "diab", "diabetes", "type 2 diabetes", "mellitus", "hypertension",
+    "hypertensin", "asthma", "pain", "chronic", "unspecified", "infection", "fracture", "tis", "essential"
+]
+
+
+def _usage(bind):
+    with bind.connect() as connection:
+        totals = dict(connection.execute(select(
+            models.DiagnosisUsage.diagnosis_code_id, models.DiagnosisUsage.consultation_count
+        )).all())
+        monthly = {
+            (month, code_id): count
+            for month, code_id, count in connection.execute(select(
+                models.DiagnosisUsageMonthly.month,
+                models.DiagnosisUsageMonthly.diagnosis_code_id,
+                models.DiagnosisUsageMonthly.consultation_count
+            ))
+        }
+    return totals, monthly
+
+
+@pytest.fixture
+def bind(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        connection.execute(insert(models.DiagnosisCode), ICD10_CODES)
+    yield bind
+    bind.dispose()
+
+
+def test_increments_aggregate_and_sort_keys():
+    increments = UsageIncrements()
+    increments.add([(datetime(2024, 2, 3), [3, 1]), (datetime(2024, 1, 31), [1])])
+    increments.add([(datetime(2024, 2, 28, 23, 59), [3])])
+    assert increments.totals == Counter({1: 2, 3: 2})
+    assert increments.monthly == Counter({(date(2024, 2, 1), 1): 1, (date(2024, 2, 1), 3): 2, (date(2024, 1, 1), 1): 1})
+
+    (_, totals), (_, monthly) = increments.statements("sqlite")
+    # Sorted, so concurrent writers lock rows in the same order
+    assert [row["diagnosis_code_id"] for row in totals] == [1, 3]
+    assert [(row["month"], row["diagnosis_code_id"]) for row in monthly] == [
+        (date(2024, 1, 1), 1), (date(2024, 2, 1), 1), (date(2024, 2, 1), 3)
+    ]
+
+    assert UsageIncrements().statements("sqlite") == []
+    assert increment_statements("mysql", [(datetime(2024, 1, 1), [1])]) == []
+
+
+def test_upserts_add_to_existing_counters(bind):
+    with bind.begin() as connection:
+        record_usage(connection, [(datetime(2024, 1, 5), [1, 2]), (datetime(2024, 2, 5), [2])])
+    with bind.begin() as connection:
+        record_usage(connection, [(datetime(2024, 2, 6), [2, 3])])
+
+    totals, monthly = _usage(bind)
+    assert totals == {1: 1, 2: 3, 3: 1}
+    assert monthly == {
+        (date(2024, 1, 1), 1): 1,
+        (date(2024, 1, 1), 2): 1,
+        (date(2024, 2, 1), 2): 2,
+        (date(2024, 2, 1), 3): 1,
+    }
+
+
+def test_rebuild_matches_the_incremental_counts(bind):
+    items = [(datetime(2024, 1 + index % 3, 1 + index % 28, 9), [1 + index % 7, 8 + index % 5]) for index in range(40)]
+    with bind.begin() as connection:
+        for consultation_date, code_ids in items:
+            consultation_id = connection.execute(insert(models.Consultation).values(
+                patient_name="Patient", consultation_date=consultation_date, notes="Visit"
+            )).inserted_primary_key[0]
+            connection.execute(insert(models.consultation_diagnoses), [
+                {"consultation_id": consultation_id, "diagnosis_code_id": code_id} for code_id in code_ids
+            ])
+        record_usage(connection, items)
+    incremental = _usage(bind)
+
+    with bind.begin() as connection:
+        rebuild_usage(connection)
+    assert _usage(bind) == incremental
+    assert sum(incremental[0].values()) == sum(incremental[1].values()) == 80
+
+
+def test_api_inserts_keep_usage_in_step(client, auth_headers):
+    create_consultations(client, auth_headers, 30, codes_per_consultation=3, day=5)
+    single = client.post("/api/consultation", headers=auth_headers, json={
+        "patient_name": "Jane Doe",
+        "consultation_date": "2024-02-01T09:30:00",
+        "notes": "Follow-up",
+        "diagnosis_code_ids": [1, 2]
+    })
+    assert single.status_code == 201
+
+    with SessionLocal() as db:
+        expected = Counter(dict(db.execute(
+            select(models.consultation_diagnoses.c.diagnosis_code_id, func.count())
+            .group_by(models.consultation_diagnoses.c.diagnosis_code_id)
+        ).all()))
+    totals, monthly = _usage(engine)
+    assert totals == expected
+    assert sum(count for (month, _), count in monthly.items() if month == date(2024, 1, 1)) == 90
+    assert monthly[(date(2024, 2, 1), 1)] == 1
+
+    popular = client.get("/api/diagnosis/popular?limit=100").json()["results"]
+    assert {row["id"]: row["consultation_count"] for row in popular} == expected
+    counts = [row["consultation_count"] for row in popular]
+    assert counts == sorted(counts, reverse=True)
+
+    january = client.get("/api/diagnosis/popular?period=month&month=2024-01&limit=100").json()
+    assert sum(row["consultation_count"] for row in january["results"]) == 90
+    assert client.get("/api/diagnosis/popular?period=month&month=2023-12").json()["results"] == []
+
+
+def test_usage_counts_reload_when_counts_change(client, auth_headers):
+    counts = UsageCounts(refresh_seconds=0)
+    with SessionLocal() as db:
+        counts.ensure_fresh(db)
+        assert (counts.boosts, counts.version) == ({}, "0-0")
+
+        create_consultations(client, auth_headers, 4, codes_per_consultation=1)
+        counts.ensure_fresh(db)
+        assert counts.version == "4-4"
+        assert counts.boosts == {1: POPULARITY_BOOST, 2: POPULARITY_BOOST, 3: POPULARITY_BOOST, 4: POPULARITY_BOOST}
+
+
+def test_boosts_are_log_scaled_up_to_the_maximum():
+    boosts = _boosts([(1, 1000), (2, 100), (3, 10), (4, 1), (5, 0)])
+    assert boosts[1] == POPULARITY_BOOST
+    assert boosts[1] > boosts[2] > boosts[3] > boosts[4] > 0
+    assert boosts[2] == pytest.approx(POPULARITY_BOOST * 2 / 3, abs=0.01)
+    # Unused codes get no boost at all
+    assert 5 not in boosts
+    assert _boosts([]) == {} and _boosts([(1, 0)]) == {}
+
+
+def test_boost_is_below_every_tier_margin():
+    # Best score of a tier vs the worst of the tier above (code prefixes lose up to 9 points)
+    margins = [
+        (SCORE_CODE_PREFIX - 9) - (SCORE_WHOLE_WORD + SCORE_COVERAGE_BONUS),
+        SCORE_WHOLE_WORD - (SCORE_WORD_PREFIX + SCORE_COVERAGE_BONUS),
+        SCORE_WORD_PREFIX - SCORE_SUBSTRING,
+        SCORE_SUBSTRING - (SCORE_FUZZY + SCORE_COVERAGE_BONUS),
+    ]
+    assert POPULARITY_BOOST < min(margins) == 5.0
+
+
+@pytest.mark.parametrize("source", ["seed", "rows"])
+def test_boosts_stay_below_the_tier_gaps(client, source):
+    if source == "seed":
+        index = diagnosis_index
+    else:
+        index = DiagnosisSearchIndex()
+        index.load_rows(ROWS)
+    # Lowest score of each tier: exact code, code prefix, whole word, word prefix, substring, fuzzy
+    tier_floors = (100.0, 80.0, 70.0, 60.0, 50.0, 0.0)
+
+    def tier(score):
+        return next(position for position, floor in enumerate(tier_floors) if score >= floor)
+
+    for term in SEARCH_TERMS:
+        hits, _ = index.rank(term, limit=len(index))
+        scores = {}
+        for hit in hits:
+            scores.setdefault(tier(hit.score), []).append(hit.score)
+        present = sorted(scores)
+        # A fully boosted hit never reaches an unboosted hit of the tier above
+        for higher, lower in zip(present, present[1:]):
+            assert min(scores[higher]) - max(scores[lower]) > POPULARITY_BOOST, (term, higher, lower)
+
+        boosts = {hit.id: POPULARITY_BOOST for hit in hits if tier(hit.score) != present[0]}
+        boosted, _ = index.rank(term, limit=len(index), boosts=boosts)
+        tiers = [tier(hit.score - boosts.get(hit.id, 0.0)) for hit in boosted]
+        assert tiers == sorted(tiers), term
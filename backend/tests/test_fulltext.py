@@ -0,0 +1,83 @@
+"""
+Notes full-text search: FTS5 query building and trigger sync on SQLite
+"""
+import pytest
+from sqlalchemy import text
+
+from app import fulltext
+from app.database import engine
+
+from .conftest import create_consultations
+
+
+@pytest.mark.parametrize("search, expected", [
+    ("chest pain", '"chest" "pain"'),
+    ("Chest   PAIN", '"Chest" "PAIN"'),
+    ('"chest pain" fever', '"chest pain" "fever"'),
+    ("diab*", '"diab"*'),
+    ("type-2 diab*", '"type" "2" "diab"*'),
+    # Operators and syntax characters are plain words
+    ("pain AND NOT fever", '"pain" "AND" "NOT" "fever"'),
+    ("NEAR(a b) col:value", '"NEAR" "a" "b" "col" "value"'),
+    ('say "hi', '"say" "hi"'),
+    ("café", '"café"'),
+])
+def test_to_fts5_query(search, expected):
+    assert fulltext.to_fts5_query(search) == expected
+
+
+@pytest.mark.parametrize("search", ["", "   ", "***", '""', "- ( ) :"])
+def test_queries_without_words(search):
+    assert fulltext.to_fts5_query(search) is None
+    assert fulltext.search_statement("sqlite", search, 10) is None
+
+
+def test_search_statement_binds_the_query():
+    statement, params = fulltext.search_statement("sqlite", 'pain "chest x*"', 5)
+    assert params == {"limit": 5, "query": '"pain" "chest x"'}
+    with pytest.raises(NotImplementedError):
+        fulltext.search_statement("mysql", "pain", 5)
+
+
+def _search(client, headers, q):
+    response = client.get("/api/consultation/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [result["id"] for result in response.json()["results"]]
+
+
+def test_search_matches_words_phrases_and_prefixes(client, auth_headers):
+    ids = create_consultations(client, auth_headers, 3)
+    with engine.begin() as connection:
+        for consultation_id, notes in zip(ids, [
+            "Persistent dry cough and mild fever",
+            "Fever resolved, cough persists at night",
+            "Routine diabetes review",
+        ]):
+            connection.execute(text("UPDATE consultations SET notes = :notes WHERE id = :id"), {"notes": notes, "id": consultation_id})
+
+    assert sorted(_search(client, auth_headers, "cough fever")) == ids[:2]
+    assert _search(client, auth_headers, '"dry cough"') == [ids[0]]
+    # Stemming: "persists" and "Persistent" share no stem, "persist*" matches both
+    assert sorted(_search(client, auth_headers, "persist*")) == ids[:2]
+    assert _search(client, auth_headers, "DIABETES") == [ids[2]]
+    # NOT is a word here, not an operator: nothing contains it
+    assert _search(client, auth_headers, "cough NOT") == []
+
+
+def test_triggers_follow_updates_and_deletes(client, auth_headers):
+    first, second = create_consultations(client, auth_headers, 2)
+    assert sorted(_search(client, auth_headers, "routine")) == [first, second]
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE consultations SET notes = 'Suspected asthma' WHERE id = :id"), {"id": first})
+    assert _search(client, auth_headers, "routine") == [second]
+    assert _search(client, auth_headers, "asthma") == [first]
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM consultation_diagnoses WHERE consultation_id = :id"), {"id": second})
+        connection.execute(text("DELETE FROM consultations WHERE id = :id"), {"id": second})
+    assert _search(client, auth_headers, "routine") == []
+
+    # Raises if the index no longer matches the notes
+    with engine.begin() as connection:
+        connection.execute(text(f"INSERT INTO {fulltext.FTS_TABLE}({fulltext.FTS_TABLE}, rank) VALUES ('integrity-check', 1)"))
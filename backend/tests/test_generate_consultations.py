@@ -0,0 +1,75 @@
+"""
+Synthetic consultation generator: bulk load path and derived counts
+"""
+from sqlalchemy import create_engine, func, insert, select
+
+from app import analytics, diagnosis_usage, icd10, models
+from app.database import Base
+from seed_data.generate_consultations import ConsultationGenerator, LoadCounts, generate_consultations
+from seed_data.icd10_codes import ICD10_CODES
+
+
+def _load(path, counts):
+    bind = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        connection.execute(insert(models.DiagnosisCode), ICD10_CODES)
+    for count in counts:
+        generate_consultations(count, bind=bind, seed=7)
+    return bind
+
+
+def _totals(bind):
+    with bind.connect() as connection:
+        return {
+            "consultations": connection.scalar(select(func.count()).select_from(models.Consultation)),
+            "links": connection.scalar(select(func.count()).select_from(models.consultation_diagnoses)),
+            "daily": connection.scalar(select(func.sum(models.ConsultationDailyStats.consultation_count))),
+            "usage": connection.scalar(select(func.sum(models.DiagnosisUsage.consultation_count))),
+            "monthly_usage": connection.scalar(select(func.sum(models.DiagnosisUsageMonthly.consultation_count))),
+            "synchronous": connection.exec_driver_sql("PRAGMA synchronous").scalar(),
+        }
+
+
+def test_bulk_and_incremental_loads_keep_counts_and_indexes(tmp_path):
+    # The first load rebuilds the indexes at the end, the smaller second one updates them in place
+    bind = _load(tmp_path / "generated.db", [3000, 500])
+    totals = _totals(bind)
+
+    assert totals["consultations"] == totals["daily"] == 3500
+    assert totals["links"] == totals["usage"] == totals["monthly_usage"]
+    assert totals["synchronous"] != 0
+    with bind.connect() as connection:
+        present = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+    for table in (models.Consultation.__table__, models.consultation_diagnoses):
+        assert {index.name for index in table.indexes} <= present
+
+
+def test_output_is_deterministic(tmp_path):
+    first = _load(tmp_path / "first.db", [2000])
+    second = _load(tmp_path / "second.db", [2000])
+    query = select(models.Consultation.patient_name, models.Consultation.consultation_date, models.Consultation.notes)\
+        .order_by(models.Consultation.id)
+    with first.connect() as a, second.connect() as b:
+        assert a.execute(query).all() == b.execute(query).all()
+
+
+def test_load_counts_match_the_per_consultation_increments():
+    codes = {index: row["code"] for index, row in enumerate(ICD10_CODES, start=1)}
+    generator = ConsultationGenerator(list(codes), seed=3, patients=50, doctor_ids=[1, 2])
+    counts = LoadCounts({code_id: icd10.chapter_for_code(code) for code_id, code in codes.items()})
+    usage = diagnosis_usage.UsageIncrements()
+    rollups = analytics.RollupIncrements()
+    for first_id in (1, 401):
+        consultations, links = generator.batch(first_id, 400)
+        counts.add(consultations, links)
+        code_ids = {}
+        for consultation_id, code_id in links:
+            code_ids.setdefault(consultation_id, []).append(code_id)
+        usage.add((row[2], code_ids[row[0]]) for row in consultations)
+        rollups.add((row[2], row[5], [codes[code_id] for code_id in code_ids[row[0]]]) for row in consultations)
+
+    load_usage, load_rollups = counts.increments()
+    assert (load_usage.totals, load_usage.monthly) == (usage.totals, usage.monthly)
+    assert vars(load_rollups) == vars(rollups)
+    assert len(rollups.doctors) > 1
@@ -0,0 +1,144 @@
+"""
+ICD-10 loader: source parsing, diffing against the table, pruning and dry runs
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app import models
+from app.database import Base
+from seed_data.load_icd10 import format_code, load_codes, read_cms_order_file, read_csv
+
+INITIAL = [
+    {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications"},
+    {"code": "I10", "description": "Essential (primary) hypertension"},
+    {"code": "J45.909", "description": "Unspecified asthma, uncomplicated"},
+    {"code": "R51.9", "description": "Headache, unspecified"},
+]
+
+
+@pytest.fixture
+def bind(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path / 'codes.db'}")
+    Base.metadata.create_all(bind=bind)
+    yield bind
+    bind.dispose()
+
+
+def _codes(bind):
+    with bind.connect() as connection:
+        return dict(connection.execute(select(models.DiagnosisCode.code, models.DiagnosisCode.description)).all())
+
+
+def _revision(bind):
+    with bind.connect() as connection:
+        return connection.scalar(select(models.CatalogState.revision))
+
+
+def _use_code(bind, code):
+    with bind.begin() as connection:
+        code_id = connection.scalar(select(models.DiagnosisCode.id).where(models.DiagnosisCode.code == code))
+        consultation_id = connection.execute(insert(models.Consultation).values(
+            patient_name="Patient", consultation_date=datetime(2024, 1, 1), notes="Visit"
+        )).inserted_primary_key[0]
+        connection.execute(insert(models.consultation_diagnoses).values(
+            consultation_id=consultation_id, diagnosis_code_id=code_id
+        ))
+
+
+def test_format_code():
+    assert format_code("E119") == "E11.9"
+    assert format_code(" j45909 ") == "J45.909"
+    assert format_code("I10") == "I10"
+    assert format_code("E11.9") == "E11.9"
+
+
+def test_read_csv_skips_header_and_short_rows(tmp_path):
+    path = tmp_path / "codes.csv"
+    path.write_text("code,description\nE119, Type 2 diabetes \nbroken\nI10,Essential hypertension\n", encoding="utf-8")
+    assert list(read_csv(path)) == [
+        {"code": "E11.9", "description": "Type 2 diabetes"},
+        {"code": "I10", "description": "Essential hypertension"},
+    ]
+
+
+def test_read_cms_order_file(tmp_path):
+    def line(order, code, billable, short, long=""):
+        return f"{order:05d} {code:<7} {billable} {short:<60} {long}".rstrip()
+
+    path = tmp_path / "icd10cm_order.txt"
+    path.write_text("\n".join([
+        line(1, "E11", 0, "Type 2 diabetes mellitus", "Type 2 diabetes mellitus"),
+        line(2, "E119", 1, "Type 2 diabetes w/o complications", "Type 2 diabetes mellitus without complications"),
+        line(3, "I10", 1, "Essential (primary) hypertension"),
+        "short",
+    ]) + "\n", encoding="utf-8")
+
+    assert list(read_cms_order_file(path)) == [
+        {"code": "E11", "description": "Type 2 diabetes mellitus"},
+        {"code": "E11.9", "description": "Type 2 diabetes mellitus without complications"},
+        # Falls back to the short description
+        {"code": "I10", "description": "Essential (primary) hypertension"},
+    ]
+    assert [row["code"] for row in read_cms_order_file(path, billable_only=True)] == ["E11.9", "I10"]
+
+
+def test_load_inserts_updates_and_skips(bind):
+    stats = load_codes(INITIAL, bind=bind, batch_size=2)
+    assert (stats["read"], stats["inserted"], stats["updated"], stats["unchanged"]) == (4, 4, 0, 0)
+    assert _codes(bind) == {row["code"]: row["description"] for row in INITIAL}
+    assert _revision(bind) == 1
+
+    # Reloading the same codes touches nothing, so the revision stays put
+    stats = load_codes(INITIAL, bind=bind)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 0, 4)
+    assert _revision(bind) == 1
+
+    rows = INITIAL[:3] + [
+        {"code": "R51.9", "description": "Headache"},
+        {"code": "R05.9", "description": "Cough, unspecified"},
+        # Duplicate, empty and over-long codes are skipped
+        {"code": "R05.9", "description": "Cough"},
+        {"code": "", "description": "No code"},
+        {"code": "Z00.00", "description": ""},
+        {"code": "X" * 11, "description": "Too long"},
+    ]
+    stats = load_codes(rows, bind=bind, batch_size=2)
+    assert (stats["read"], stats["inserted"], stats["updated"], stats["unchanged"], stats["skipped"]) == (9, 1, 1, 3, 4)
+    codes = _codes(bind)
+    assert codes["R51.9"] == "Headache"
+    assert codes["R05.9"] == "Cough, unspecified"
+    assert len(codes) == 5
+    assert _revision(bind) == 2
+
+
+def test_prune_keeps_codes_used_by_consultations(bind):
+    load_codes(INITIAL, bind=bind)
+    _use_code(bind, "I10")
+
+    # Without prune, codes missing from the source stay
+    stats = load_codes(INITIAL[:2], bind=bind)
+    assert stats["deleted"] == 0
+    assert len(_codes(bind)) == 4
+
+    stats = load_codes(INITIAL[:1], bind=bind, prune=True, batch_size=2)
+    assert stats["deleted"] == 2
+    assert set(_codes(bind)) == {"E11.9", "I10"}
+    assert _revision(bind) == 2
+
+
+def test_dry_run_reports_changes_without_writing(bind):
+    load_codes(INITIAL, bind=bind)
+    before = _codes(bind)
+
+    rows = [
+        {"code": "E11.9", "description": "Type 2 diabetes mellitus"},
+        {"code": "I10", "description": INITIAL[1]["description"]},
+        {"code": "R05.9", "description": "Cough, unspecified"},
+    ]
+    stats = load_codes(rows, bind=bind, prune=True, dry_run=True)
+    # Dry runs count every stale code, used or not
+    assert (stats["inserted"], stats["updated"], stats["unchanged"], stats["deleted"]) == (1, 1, 1, 2)
+    assert _codes(bind) == before
+    assert _revision(bind) == 1
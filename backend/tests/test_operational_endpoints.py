@@ -0,0 +1,51 @@
+"""
+Operational endpoints (cache statistics, timings, metrics) are not public,
+and the Server-Timing header is only sent when enabled
+"""
+import pytest
+
+PROTECTED = ["/api/diagnosis/cache-stats", "/api/timings"]
+
+
+@pytest.mark.parametrize("path", PROTECTED)
+def test_requires_authentication(client, path):
+    assert client.get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", PROTECTED)
+def test_available_to_doctors(client, auth_headers, path):
+    assert client.get(path, headers=auth_headers).status_code == 200
+
+
+def test_server_timing_header_is_opt_in(client, monkeypatch):
+    from app import instrumentation
+
+    assert "server-timing" in client.get("/api/health").headers
+    monkeypatch.setattr(instrumentation, "SERVER_TIMING", False)
+    assert "server-timing" not in client.get("/api/health").headers
+
+
+def test_metrics_refused_without_token(client, auth_headers, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    # A doctor's access token is not the metrics token
+    assert client.get("/metrics", headers=auth_headers).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_metrics_refused_when_unconfigured(client):
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+
+def test_metrics_with_token_or_allowed_address(client, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "# TYPE" in response.text
+
+    monkeypatch.setattr(main, "METRICS_ALLOWED_IPS", {"testclient"})
+    assert client.get("/metrics").status_code == 200
@@ -0,0 +1,107 @@
+"""
+Password hashing pool: queue limit and hash upgrades on login
+"""
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+from app import auth, models
+from app.database import SessionLocal
+from app.dependencies import doctor_cache, token_cache
+
+USERNAME = "hashing_doctor"
+PASSWORD = "test-password"
+
+
+@pytest.fixture
+def doctor(client):
+    response = client.post("/api/auth/register", json={
+        "username": USERNAME,
+        "email": f"{USERNAME}@example.com",
+        "full_name": "Hashing Doctor",
+        "password": PASSWORD
+    })
+    assert response.status_code == 201, response.text
+    yield
+    with SessionLocal() as db:
+        db.query(models.Doctor).filter(models.Doctor.username == USERNAME).delete()
+        db.commit()
+    token_cache.clear()
+    doctor_cache.clear()
+
+
+def _stored_hash() -> str:
+    with SessionLocal() as db:
+        return db.execute(select(models.Doctor.hashed_password).where(models.Doctor.username == USERNAME)).scalar_one()
+
+
+def _login(client, password=PASSWORD):
+    return client.post("/api/auth/login", data={"username": USERNAME, "password": password})
+
+
+def test_pool_refuses_work_beyond_the_pending_limit(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_MAX_PENDING", 1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    async def scenario():
+        running = asyncio.create_task(auth._run_in_hash_pool("hash", blocking, "done"))
+        await asyncio.to_thread(started.wait, 5)
+        assert auth.pending_password_hashes() == 1
+        try:
+            with pytest.raises(auth.PasswordHasherBusy):
+                await auth.get_password_hash_async(PASSWORD)
+        finally:
+            release.set()
+        assert await running == "done"
+
+    asyncio.run(scenario())
+    # Refused and finished jobs both release their slot
+    assert auth.pending_password_hashes() == 0
+
+
+def test_login_returns_503_when_the_pool_is_full(client, doctor, monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_MAX_PENDING", 0)
+    response = _login(client)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    monkeypatch.setattr(auth, "PASSWORD_HASH_MAX_PENDING", 32)
+    assert _login(client).status_code == 200
+
+
+def test_login_upgrades_an_outdated_hash(client, doctor, monkeypatch):
+    original = _stored_hash()
+    assert original.startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+
+    # Raise the configured cost; the stored hash is now below the minimum
+    stronger = CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=auth.BCRYPT_ROUNDS + 1,
+        bcrypt__min_rounds=auth.BCRYPT_ROUNDS + 1
+    )
+    monkeypatch.setattr(auth, "pwd_context", stronger)
+    assert stronger.needs_update(original)
+
+    # A failed login leaves the hash alone
+    assert _login(client, "wrong-password").status_code == 401
+    assert _stored_hash() == original
+
+    assert _login(client).status_code == 200
+    upgraded = _stored_hash()
+    assert upgraded.startswith(f"$2b${auth.BCRYPT_ROUNDS + 1:02d}$")
+    assert stronger.verify(PASSWORD, upgraded)
+    assert not stronger.needs_update(upgraded)
+
+    # The upgraded hash is kept on the next login
+    assert _login(client).status_code == 200
+    assert _stored_hash() == upgraded
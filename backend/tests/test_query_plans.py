@@ -0,0 +1,87 @@
+"""
+Consultation queries are served by their indexes
+
+Captures the SQL a request actually sends, runs EXPLAIN on it and looks for
+the expected index in the plan. On PostgreSQL sequential scans are disabled
+for the check so small tables still show whether the index is usable.
+"""
+import pytest
+from sqlalchemy import event
+
+from app.database import async_engine, engine
+from tests.conftest import create_consultations
+
+DATE_INDEX = "ix_consultations_date_id"
+PATIENT_INDEX = "ix_consultations_patient_name_lower_date"
+CONSULTATION_CODES_INDEX = "ix_consultation_diagnoses_consultation_id"
+
+LIST_CASES = [
+    ("patient name prefix", "patient_name=%20%20Smi%20", PATIENT_INDEX),
+    ("patient name prefix + date range", "patient_name=smith&date_from=2024-01-01T00:00:00", PATIENT_INDEX),
+    ("date range", "date_from=2024-01-01T00:00:00&date_to=2024-01-08T00:00:00", DATE_INDEX),
+]
+
+
+def _capture(client, headers, url) -> list:
+    """
+    Request url and return the (statement, parameters) it sent to the database
+    """
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.text
+    return captured
+
+
+def _statement(captured, *fragments):
+    matches = [item for item in captured if all(fragment in item[0] for fragment in fragments)]
+    assert matches, f"no statement containing {fragments}"
+    return matches[0]
+
+
+def _plan(statement: str, parameters) -> str:
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql("SET enable_seqscan = off")
+            prefix = "EXPLAIN "
+        else:
+            prefix = "EXPLAIN QUERY PLAN "
+        rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+@pytest.mark.parametrize("label, query, index", LIST_CASES, ids=[case[0] for case in LIST_CASES])
+def test_filtered_list_and_count_use_index(client, auth_headers, label, query, index):
+    captured = _capture(client, auth_headers, f"/api/consultation?limit=20&count=exact&{query}")
+
+    list_plan = _plan(*_statement(captured, "FROM consultations", "ORDER BY"))
+    count_plan = _plan(*_statement(captured, "count(consultations.id)"))
+    assert index in list_plan, list_plan
+    assert index in count_plan, count_plan
+
+
+def test_cursor_page_uses_date_index(client, auth_headers):
+    create_consultations(client, auth_headers, 3)
+    first = client.get("/api/consultation?limit=2&count=none", headers=auth_headers).json()
+    captured = _capture(
+        client, auth_headers,
+        f"/api/consultation?limit=2&count=none&date_from=2024-01-01T00:00:00&cursor={first['next_cursor']}"
+    )
+
+    plan = _plan(*_statement(captured, "FROM consultations", "ORDER BY"))
+    assert DATE_INDEX in plan, plan
+
+
+def test_page_codes_use_association_index(client, auth_headers):
+    create_consultations(client, auth_headers, 3)
+    captured = _capture(client, auth_headers, "/api/consultation?limit=3&count=none")
+
+    plan = _plan(*_statement(captured, "FROM consultation_diagnoses"))
+    assert CONSULTATION_CODES_INDEX in plan, plan
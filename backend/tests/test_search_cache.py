@@ -0,0 +1,113 @@
+"""
+Diagnosis search result cache: version-keyed invalidation and backend selection
+"""
+import asyncio
+import sys
+
+from app import search_cache as search_cache_module
+from app.cache import CacheBackend, MemoryBackend, RedisBackend, VersionedResultCache
+from app.database import SessionLocal, engine
+from app.search_cache import search_cache, search_cache_key
+from app.search_index import diagnosis_index
+from seed_data.icd10_codes import ICD10_CODES
+from seed_data.load_icd10 import load_codes
+
+
+def _reload_index():
+    """
+    What a worker's background refresh does once it notices the new revision
+    """
+    with SessionLocal() as db:
+        diagnosis_index.load(db)
+
+
+class _FailingBackend(CacheBackend):
+    name = "failing"
+
+    async def get(self, key):
+        raise ConnectionError("cache down")
+
+    async def set(self, key, value):
+        raise ConnectionError("cache down")
+
+
+def _cached(cache, version, key, value):
+    calls = []
+
+    async def compute():
+        calls.append(key)
+        return value
+
+    result = asyncio.run(cache.get_or_compute(version, key, compute))
+    return result, len(calls)
+
+
+def test_entries_are_dropped_when_the_version_changes():
+    cache = VersionedResultCache(MemoryBackend(maxsize=10, ttl=60))
+
+    assert _cached(cache, "v1", "plain:20:diab", ["first"]) == (["first"], 1)
+    assert _cached(cache, "v1", "plain:20:diab", ["ignored"]) == (["first"], 0)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A new catalog version empties the backend and recomputes
+    assert _cached(cache, "v2", "plain:20:diab", ["second"]) == (["second"], 1)
+    assert cache.backend.stats()["size"] == 1
+    # Going back to the old version does not resurrect its entries
+    assert _cached(cache, "v1", "plain:20:diab", ["third"]) == (["third"], 1)
+    assert cache.stats()["version"] == "v1"
+
+
+def test_backend_errors_fall_through_to_compute():
+    cache = VersionedResultCache(_FailingBackend())
+    assert _cached(cache, "v1", "key", {"total": 0}) == ({"total": 0}, 1)
+    assert _cached(cache, "v1", "key", {"total": 0}) == ({"total": 0}, 1)
+    assert (cache.hits, cache.misses, cache.errors) == (0, 2, 4)
+
+
+def test_search_cache_key_normalization():
+    assert search_cache_key("Diab", 20, ranked=False) == "plain:20:diab"
+    # Whitespace only matters to plain substring search
+    assert search_cache_key(" diab ", 20, ranked=False) == "plain:20: diab "
+    assert search_cache_key(" Diab ", 20, ranked=True) == "ranked:20:diab"
+    assert search_cache_key(None, 5, ranked=True) == "ranked:5:"
+    assert search_cache_key("diab", 20, ranked=True, usage_version="abc") == "popular@abc:20:diab"
+
+
+def test_backend_selection_and_memory_fallback(monkeypatch):
+    monkeypatch.setattr(search_cache_module, "SEARCH_CACHE_BACKEND", "none")
+    assert type(search_cache_module._build_backend()) is CacheBackend
+
+    monkeypatch.setattr(search_cache_module, "SEARCH_CACHE_BACKEND", "memory")
+    assert isinstance(search_cache_module._build_backend(), MemoryBackend)
+
+    monkeypatch.setattr(search_cache_module, "SEARCH_CACHE_BACKEND", "redis")
+    assert isinstance(search_cache_module._build_backend(), RedisBackend)
+
+    # Without the redis package the cache stays in process instead of failing startup
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+    backend = search_cache_module._build_backend()
+    assert isinstance(backend, MemoryBackend)
+    assert backend.stats()["maxsize"] == search_cache_module.SEARCH_CACHE_MAX_ENTRIES
+
+
+def test_catalog_changes_invalidate_cached_searches(client):
+    url = "/api/diagnosis?search=zebra"
+    assert client.get(url).json()["total"] == 0
+    version = diagnosis_index.catalog_version
+    hits = search_cache.hits
+    assert client.get(url).json()["total"] == 0
+    assert search_cache.hits == hits + 1
+
+    try:
+        load_codes(ICD10_CODES + [{"code": "W55.21", "description": "Bitten by zebra"}], bind=engine)
+        _reload_index()
+        body = client.get(url).json()
+        assert [result["code"] for result in body["results"]] == ["W55.21"]
+        assert diagnosis_index.catalog_version != version
+        assert search_cache.stats()["version"] == diagnosis_index.catalog_version
+    finally:
+        load_codes(ICD10_CODES, bind=engine, prune=True)
+        _reload_index()
+
+    assert client.get(url).json()["total"] == 0
+    assert diagnosis_index.catalog_version == version
@@ -0,0 +1,139 @@
+"""
+The in-memory diagnosis index: substring search, ranked search and background refresh
+"""
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import models, search_index
+from app.database import ASYNC_DATABASE_URL, SessionLocal
+from app.search_index import (
+    SCORE_CODE_PREFIX,
+    SCORE_EXACT_CODE,
+    SCORE_FUZZY,
+    SCORE_SUBSTRING,
+    SCORE_WHOLE_WORD,
+    SCORE_WORD_PREFIX,
+    DiagnosisSearchIndex,
+    diagnosis_index,
+)
+
+ROWS = [
+    (1, "E11", "Type 2 diabetes mellitus"),
+    (2, "E11.9", "Type 2 diabetes mellitus without complications"),
+    (3, "E10", "Type 1 diabetes mellitus"),
+    (4, "R73.03", "Prediabetes"),
+    (5, "I10", "Essential hypertension"),
+]
+
+
+def _ilike_search(term, limit):
+    """
+    The original query: ILIKE on code or description, first `limit` rows by id
+    """
+    query = select(models.DiagnosisCode.id).order_by(models.DiagnosisCode.id)
+    if term:
+        pattern = f"%{term}%"
+        query = query.where(or_(models.DiagnosisCode.code.ilike(pattern), models.DiagnosisCode.description.ilike(pattern)))
+    with SessionLocal() as db:
+        ids = db.execute(query).scalars().all()
+    return ids[:limit], len(ids)
+
+
+@pytest.fixture
+def index():
+    ranked = DiagnosisSearchIndex()
+    ranked.load_rows(ROWS)
+    return ranked
+
+
+@pytest.mark.parametrize("term", [None, "", "e", "E11", "e11.", "diab", "Type 2", "MELLITUS", "tis", "hypertension", "zzz"])
+@pytest.mark.parametrize("limit", [1, 5, 50])
+def test_search_matches_the_ilike_query(client, term, limit):
+    entries, total = diagnosis_index.search(term, limit=limit)
+    expected_ids, expected_total = _ilike_search(term, limit)
+    assert [entry.id for entry in entries] == expected_ids
+    assert total == expected_total
+
+
+def test_rank_tier_scores(index):
+    def scores(term):
+        hits, _ = index.rank(term)
+        return {hit.code: hit.score for hit in hits}
+
+    assert (SCORE_EXACT_CODE, SCORE_CODE_PREFIX, SCORE_WHOLE_WORD, SCORE_WORD_PREFIX, SCORE_SUBSTRING, SCORE_FUZZY) == (100, 90, 70, 60, 50, 40)
+    # Code tiers: exact, then prefix minus one point per extra character
+    assert scores("E11") == {"E11": 100.0, "E11.9": 89.0}
+    # Whole word, plus up to 5 points for covering more of a short description
+    assert scores("hypertension") == {"I10": 72.5}
+    # "Prediabetes" only contains the term as a substring
+    assert scores("diabetes") == {"E10": 71.25, "E11": 71.25, "E11.9": 70.83, "R73.03": 50.0}
+    # Word prefix
+    assert scores("diab") == {"E10": 61.25, "E11": 61.25, "E11.9": 60.83, "R73.03": 50.0}
+    # Typos: one point less per edit
+    assert scores("hypertensin") == {"I10": 41.5}
+    assert scores("hypertensoin") == {"I10": 40.5}
+
+
+def test_rank_orders_tiers_and_requires_every_word(index):
+    hits, total = index.rank("diab")
+    assert [hit.code for hit in hits] == ["E10", "E11", "E11.9", "R73.03"]
+    assert total == 4
+
+    hits, total = index.rank("type 2 diabetes")
+    assert [hit.code for hit in hits] == ["E11", "E11.9"]
+    assert total == 2
+
+
+def test_rank_boosts_reorder_within_a_tier(index):
+    hits, _ = index.rank("diabetes", boosts={1: 1.0, 4: 9.0, 5: 50.0})
+    # Boosts only apply to matching codes
+    assert [(hit.code, hit.score) for hit in hits] == [("E11", 72.25), ("E10", 71.25), ("E11.9", 70.83), ("R73.03", 59.0)]
+
+    # Without a term the most boosted codes come first, then catalog order
+    hits, total = index.rank(None, limit=3, boosts={5: 2.0, 2: 1.0})
+    assert [hit.code for hit in hits] == ["I10", "E11.9", "E11"]
+    assert total == len(ROWS)
+
+
+def test_refresh_serves_the_old_snapshot_while_rebuilding(client, monkeypatch):
+    index = DiagnosisSearchIndex()
+    started = threading.Event()
+    release = threading.Event()
+    build = search_index._Snapshot
+
+    def slow_build(rows, signature):
+        if index.loaded:
+            started.set()
+            release.wait(5)
+        return build(rows, signature)
+
+    async def scenario():
+        engine = create_async_engine(ASYNC_DATABASE_URL)
+        monkeypatch.setattr(search_index, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+        monkeypatch.setattr(search_index, "_Snapshot", slow_build)
+        try:
+            # The first load has nothing to serve yet, so it waits
+            await index.refresh()
+            first = index._snapshot
+            assert len(index) == len(diagnosis_index)
+
+            index.invalidate()
+            await index.refresh()
+            # The build runs in a worker thread while the loop keeps going
+            await asyncio.to_thread(started.wait, 5)
+            assert index._snapshot is first
+            assert index.search("diabetes")[1] > 0
+
+            release.set()
+            await index._refresh_task
+            assert index._snapshot is not first
+            assert index.catalog_version == first.version
+        finally:
+            release.set()
+            await engine.dispose()
+
+    asyncio.run(scenario())
@@ -24,7 +24,7 @@ export const useApi = () => {
   const searchDiagnosis = async (searchTerm: string = '') => {
     try {
       const url = searchTerm 
-        ? `${apiBase}/diagnosis?search=${encodeURIComponent(searchTerm)}`
+        ? `${apiBase}/diagnosis?search=${encodeURIComponent(searchTerm)}&ranked=true`
         : `${apiBase}/diagnosis`
       
       const response = await $fetch(url)
@@ -30,8 +30,12 @@ export interface DiagnosisCode {
   description: string
 }
 
+export interface DiagnosisSearchResult extends DiagnosisCode {
+  score?: number
+}
+
 export interface DiagnosisSearchResponse {
-  results: DiagnosisCode[]
+  results: DiagnosisSearchResult[]
   total: number
 }
 
@@ -54,5 +58,6 @@ export interface ConsultationCreate {
 
 export interface ConsultationListResponse {
   consultations: Consultation[]
-  total: number
+  total: number | null
+  next_cursor: string | null
 }